@@ -1,17 +1,46 @@
 """
 博客系统后端 API - 主应用入口
 """
-from flask import Flask, jsonify, request
+# 启动计时必须最先导入，才能统计到导入 Flask / SQLAlchemy 的耗时
+from startup import startup_timer, register_startup_timing
+from flask import Flask, Response, jsonify, request
+from sqlalchemy.orm import undefer
 from config import Config
-from models import db, User, Post, Comment
-from auth import login_required, get_current_user, generate_token
-from validators import (
-    validate_username, validate_email, validate_password,
-    validate_post_title, validate_post_content, validate_comment_content
+from models import db, User, Post, Comment, Follow, SchemaVersion
+# 导入 Flask / SQLAlchemy 占启动耗时的绝大部分，单独计时，和业务模块区分开
+startup_timer.mark('导入框架')
+from auth import login_required, claims_required, get_current_user, generate_token
+from validators import PASSWORD
+from schemas import (
+    json_body, REGISTER_FORM, LOGIN_FORM, PASSWORD_FORM, POST_FORM, COMMENT_CREATE, COMMENT_UPDATE
 )
 from responses import success, error
 from exceptions import APIError, BadRequestError, NotFoundError, ForbiddenError, ConflictError
 from logger import setup_logger, register_request_logging
+from compression import register_compression
+from sqlite_profile import register_sqlite_profile
+from cache import list_cache, count_cache, invalidate_post_caches
+from view_counter import view_counter
+from token_epochs import token_epochs
+from tags import set_post_tags, top_tags
+import timeline
+import comment_threads
+import author_stats
+import purge
+import post_html
+import change_feed
+from queries import (
+    parse_post_list_args, cache_params, build_post_list_query, ranked_post_page, post_list_data,
+    fetch_page, known_total, count_posts,
+    parse_batch_args, fetch_batch, batch_data
+)
+from trending import trending
+from suggest import title_index
+from content_store import content_store
+from comment_events import comment_events, parse_last_event_id
+from sharding import shards
+
+startup_timer.mark('导入业务模块')
 # ============================================================================
 # Flask 应用初始化
 # ============================================================================
@@ -21,20 +50,63 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
-    # 初始化数据库
-    db.init_app(app)
+    # 初始化数据库（只创建引擎，不连接数据库、不检查表结构）
+    with startup_timer.phase('初始化数据库'):
+        db.init_app(app)
+        # SQLite 单机部署：每个连接启用 WAL 等调优配置，并串行化写事务
+        with app.app_context():
+            sqlite_tuned = register_sqlite_profile(app, db.engine)
+        # 文章 / 评论按作者分片（未配置 SHARD_DATABASE_URLS 时不分片）
+        shards.init_app(app)
+    
+    # 初始化文章列表缓存和总数缓存
+    list_cache.init_app(app)
+    count_cache.init_app(app)
+    
+    # 初始化浏览量计数器
+    view_counter.init_app(app)
+    
+    # 初始化 Token 版本表
+    token_epochs.init_app(app)
+    
+    # 初始化热门排行榜
+    trending.init_app(app)
+    
+    # 初始化标题自动补全索引
+    title_index.init_app(app)
+    
+    # 初始化文章内容压缩存储
+    content_store.init_app(app)
+    
+    # 初始化评论实时推送
+    comment_events.init_app(app)
+    
+    # 初始化后台删除（评论很多的文章）
+    purge.post_purger.init_app(app)
     
     # 初始化日志系统
-    setup_logger(app)
-    register_request_logging(app)
+    with startup_timer.phase('初始化日志'):
+        setup_logger(app)
+        register_request_logging(app)
+        register_startup_timing(app, startup_timer)
+    
+    if sqlite_tuned:
+        with app.app_context():
+            app.logger.info(f'SQLite 调优配置已启用: {db.engine.url.database}')
+    if shards.enabled:
+        app.logger.info(f"文章 / 评论分片: {', '.join(shards.names)}")
+    
+    # 注册响应压缩（gzip）
+    register_compression(app)
     
     # 注册全局错误处理
     register_error_handlers(app)
     
     # 注册路由
-    register_routes(app)
+    with startup_timer.phase('注册路由'):
+        register_routes(app)
     
-    app.logger.info('Flask 应用初始化完成')
+    app.logger.info(f'Flask 应用初始化完成（{startup_timer.summary()}）')
     
     return app
 
@@ -88,38 +160,26 @@ def register_routes(app):
     def register():
         """用户注册"""
         try:
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
-            
             # ---- 输入验证 ----
-            valid, msg = validate_username(data.get('username', ''))
-            if not valid:
-                raise BadRequestError(msg)
-            
-            valid, msg = validate_email(data.get('email', ''))
-            if not valid:
-                raise BadRequestError(msg)
-            
-            valid, msg = validate_password(data.get('password', ''))
-            if not valid:
-                raise BadRequestError(msg)
+            form = REGISTER_FORM.load()
             
             # ---- 唯一性检查 ----
-            if User.query.filter_by(username=data['username'].strip()).first():
+            if User.query.filter_by(username=form.username).first():
                 raise ConflictError('用户名已被注册')
             
-            if User.query.filter_by(email=data['email'].strip()).first():
+            if User.query.filter_by(email=form.email).first():
                 raise ConflictError('邮箱已被注册')
             
             # ---- 创建用户 ----
             new_user = User(
-                username=data['username'].strip(),
-                email=data['email'].strip()
+                username=form.username,
+                email=form.email
             )
-            new_user.set_password(data['password'])
+            new_user.set_password(form.password)
             
             db.session.add(new_user)
+            db.session.flush()  # 生成用户ID
+            author_stats.create(new_user.id)
             db.session.commit()
             
             app.logger.info(f'新用户注册: {new_user.username} (ID:{new_user.id})')
@@ -144,23 +204,14 @@ def register_routes(app):
     def login():
         """用户登录"""
         try:
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
-            
             # 支持邮箱或用户名登录
-            email = data.get('email')
-            username = data.get('username')
-            password = data.get('password')
-            
-            if not password:
-                raise BadRequestError('缺少必填字段: password')
+            form = LOGIN_FORM.load()
             
             # 根据邮箱或用户名查找用户
-            if email:
-                user = User.query.filter_by(email=email).first()
-            elif username:
-                user = User.query.filter_by(username=username).first()
+            if form.email:
+                user = User.query.filter_by(email=form.email).first()
+            elif form.username:
+                user = User.query.filter_by(username=form.username).first()
             else:
                 raise BadRequestError('请提供邮箱或用户名')
             
@@ -168,11 +219,11 @@ def register_routes(app):
                 raise NotFoundError('用户不存在')
             
             # 使用哈希密码验证
-            if not user.check_password(password):
+            if not user.check_password(form.password):
                 raise BadRequestError('密码不正确')
             
             # 生成 JWT Token
-            token = generate_token(user.id)
+            token = generate_token(user.id, user.username, user.token_version)
             
             app.logger.info(f'用户登录: {user.username} (ID:{user.id})')
             
@@ -225,6 +276,49 @@ def register_routes(app):
             app.logger.error(f'获取当前用户失败: {str(e)}')
             return error(f'获取当前用户失败: {str(e)}', status_code=500)
 
+    # ==================== 用户主页 ====================
+    @app.route('/api/users/<int:user_id>', methods=['GET'])
+    @shards.by_author('user_id')
+    def get_user_profile(user_id):
+        """
+        获取用户公开主页：基本信息、文章数、评论数、最近活跃时间和最新文章
+        
+        统计数据来自增量维护的 author_stats 表（按主键取一行），
+        最新文章走 (author_id, id) 索引只取前几条，耗时与作者的文章总数无关。
+        """
+        try:
+            user = db.session.get(User, user_id)
+            if not user:
+                raise NotFoundError('用户不存在')
+            
+            stats = author_stats.get(user_id)
+            latest_posts = db.session.execute(
+                db.select(Post)
+                .options(undefer(Post.content_blob))
+                .where(Post.author_id == user_id)
+                .order_by(Post.id.desc())
+                .limit(app.config.get('PROFILE_LATEST_POSTS', 5))
+            ).scalars().all()
+            
+            return success('获取用户主页成功', data={
+                'user': {
+                    'id': user.id,
+                    'username': user.username,
+                    'created_at': user.created_at.isoformat() if user.created_at else None,
+                    'follower_count': user.follower_count,
+                    'following_count': user.following_count
+                },
+                'stats': stats.to_dict(),
+                'latest_posts': [post.to_dict() for post in latest_posts]
+            })
+
+        except APIError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'获取用户主页失败: {str(e)}')
+            return error(f'获取用户主页失败: {str(e)}', status_code=500)
+
     # ==================== 修改密码 ====================
     @app.route('/api/users/password', methods=['PUT'])
     @login_required
@@ -234,20 +328,9 @@ def register_routes(app):
             # 获取当前用户
             current_user = request.current_user
             
-            # 获取请求数据
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
-            
-            # 获取新旧密码
-            old_password = data.get('old_password')
-            new_password = data.get('new_password')
-            
-            # 验证字段是否提供
-            if not old_password:
-                raise BadRequestError('请输入原密码')
-            if not new_password:
-                raise BadRequestError('请输入新密码')
+            # 获取新旧密码（验证字段是否提供）
+            form = PASSWORD_FORM.load()
+            old_password, new_password = form.old_password, form.new_password
             
             # 验证原密码是否正确
             if not current_user.check_password(old_password):
@@ -257,18 +340,19 @@ def register_routes(app):
             if old_password == new_password:
                 raise BadRequestError('新密码不能与原密码相同')
             
-            # 复用验证器检查新密码强度
-            valid, msg = validate_password(new_password)
-            if not valid:
-                raise BadRequestError(msg)
+            # 复用密码规则检查新密码强度
+            PASSWORD.check(new_password)
             
-            # 更新密码
+            # 更新密码，并让之前签发的所有 Token 失效
             current_user.set_password(new_password)
+            token_epochs.bump(current_user, commit=False)
             db.session.commit()
             
             app.logger.info(f'用户 {current_user.username} 修改密码成功')
             
-            return success('密码修改成功')
+            # 旧 Token 已失效，返回新 Token
+            token = generate_token(current_user.id, current_user.username, current_user.token_version)
+            return success('密码修改成功', data={'token': token})
         
         except APIError:
             raise
@@ -276,36 +360,126 @@ def register_routes(app):
             db.session.rollback()
             app.logger.error(f'修改密码失败: {str(e)}')
             return error('修改密码失败，请稍后重试', status_code=500)
+    # ==================== 关注 / 取消关注 ====================
+    @app.route('/api/users/<int:user_id>/follow', methods=['POST'])
+    @claims_required
+    @shards.by_author('user_id')
+    def follow_user(user_id):
+        """关注用户（需要登录）"""
+        try:
+            current_user = request.current_user
+            
+            if user_id == current_user.id:
+                raise BadRequestError('不能关注自己')
+            
+            followee = db.session.get(User, user_id)
+            if not followee:
+                raise NotFoundError('用户不存在')
+            
+            if db.session.get(Follow, (current_user.id, user_id)):
+                raise ConflictError('已经关注过该用户')
+            
+            timeline.follow(current_user.id, followee)  # 并发的重复关注同样返回 409
+            db.session.commit()
+            
+            app.logger.info(f'关注: {current_user.username} -> {followee.username}')
+            
+            return success('关注成功', status_code=201)
+
+        except APIError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'关注失败: {str(e)}')
+            return error(f'关注失败: {str(e)}', status_code=500)
+
+    @app.route('/api/users/<int:user_id>/follow', methods=['DELETE'])
+    @claims_required
+    @shards.by_author('user_id')
+    def unfollow_user(user_id):
+        """取消关注（需要登录）"""
+        try:
+            current_user = request.current_user
+            
+            if not db.session.get(Follow, (current_user.id, user_id)):
+                raise NotFoundError('尚未关注该用户')
+            
+            timeline.unfollow(current_user.id, user_id)
+            db.session.commit()
+            
+            app.logger.info(f'取消关注: {current_user.username} -> #{user_id}')
+            
+            return success('取消关注成功')
+
+        except APIError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'取消关注失败: {str(e)}')
+            return error(f'取消关注失败: {str(e)}', status_code=500)
+
+    # ==================== 首页时间线 ====================
+    @app.route('/api/timeline', methods=['GET'])
+    @claims_required
+    def get_timeline():
+        """
+        获取关注的作者（和自己）的最新文章（需要登录）
+        
+        查询参数：
+            cursor - 上一页返回的 next_cursor（不传表示第一页）
+            limit  - 每页数量（默认 20，最大 100）
+        """
+        try:
+            current_user = request.current_user
+            
+            cursor = request.args.get('cursor', type=int)
+            limit = request.args.get('limit', 20, type=int)
+            limit = min(max(limit, 1), 100)
+            
+            posts, next_cursor = timeline.read_timeline(current_user.id, cursor=cursor, limit=limit)
+            
+            return success('获取时间线成功', data={
+                'posts': [post.to_dict() for post in posts],
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            })
+
+        except APIError:
+            raise
+        except Exception as e:
+            app.logger.error(f'获取时间线失败: {str(e)}')
+            return error(f'获取时间线失败: {str(e)}', status_code=500)
     # ==================== 创建文章 ====================
     @app.route('/api/posts', methods=['POST'])
-    @login_required
+    @claims_required
+    @shards.by_current_user
     def create_post():
         """创建文章 API（需要登录）"""
         try:
             current_user = request.current_user
             
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
-            
             # ---- 输入验证 ----
-            valid, msg = validate_post_title(data.get('title', ''))
-            if not valid:
-                raise BadRequestError(msg)
-            
-            valid, msg = validate_post_content(data.get('content', ''))
-            if not valid:
-                raise BadRequestError(msg)
+            form = POST_FORM.load()
             
             # ---- 创建文章 ----
             new_post = Post(
-                title=data['title'].strip(),
-                content=data['content'].strip(),
-                author_id=current_user.id
+                title=form.title,
+                content=form.content,
+                author_id=current_user.id,
+                fanned_out=timeline.pushes_to_followers(current_user.id)  # 推还是拉，记在文章上
             )
             
             db.session.add(new_post)
+            if form.tags:
+                set_post_tags(new_post, form.tags)
+            db.session.flush()  # 生成文章ID，推送时间线需要
+            timeline.fanout_post(new_post)
+            post_html.render_post(new_post)
+            author_stats.record_post(current_user.id)
+            change_feed.record('post', new_post.id, 'create')
             db.session.commit()
+            invalidate_post_caches(author_id=new_post.author_id)
+            title_index.add(new_post.id, new_post.title)
             
             app.logger.info(f'文章创建: "{new_post.title}" by {current_user.username}')
             
@@ -319,16 +493,79 @@ def register_routes(app):
             db.session.rollback()
             app.logger.error(f'创建文章失败: {str(e)}')
             return error(f'创建文章失败: {str(e)}', status_code=500)
+    # ==================== 批量获取文章 ====================
+    @app.route('/api/posts/batch', methods=['GET'])
+    def get_posts_batch():
+        """
+        按ID列表批量获取文章（一条 IN 查询，代替逐篇请求详情）
+        
+        查询参数：
+            ids            - 文章ID列表（逗号分隔或重复传参，最多 BATCH_MAX_IDS 个）
+            include_author - 是否包含作者信息（1 / true）
+        
+        返回的文章按请求顺序排列，不存在的ID放在 missing 中。
+        """
+        try:
+            ids, include_author = parse_batch_args(request.args, app.config.get('BATCH_MAX_IDS', 200))
+            posts = fetch_batch(ids, include_author)
+            
+            return success('获取文章成功', data=batch_data(posts, ids, include_author))
+
+        except APIError:
+            raise
+        except Exception as e:
+            app.logger.error(f'批量获取文章失败: {str(e)}')
+            return error(f'批量获取文章失败: {str(e)}', status_code=500)
+    
+    # ==================== 标题自动补全 ====================
+    @app.route('/api/posts/suggest', methods=['GET'])
+    def suggest_posts():
+        """
+        按标题前缀返回候选文章（用于搜索框自动补全，只查内存索引）
+        
+        查询参数：
+            q     - 用户输入的前缀（不区分大小写，也可以从标题中任意一个词开始匹配）
+            limit - 最多返回几条（默认 10，最大 20）
+        """
+        try:
+            q = request.args.get('q', '')
+            limit = request.args.get('limit', 10, type=int)
+            if limit > 20:
+                limit = 20
+            if limit < 1:
+                limit = 10
+            
+            return success('获取建议成功', data={
+                'q': q,
+                'suggestions': title_index.suggest(q, limit)
+            })
+
+        except Exception as e:
+            app.logger.error(f'获取标题建议失败: {str(e)}')
+            return error(f'获取标题建议失败: {str(e)}', status_code=500)
+    
     # ==================== 获取文章详情 ====================
     @app.route('/api/posts/<int:post_id>', methods=['GET'])
+    @shards.by_post('post_id')
     def get_post_detail(post_id):
-        """获取文章详情（包含作者信息和评论）"""
+        """
+        获取文章详情（包含作者信息和评论）
+        
+        format=html 时 content 返回预渲染的 HTML（写文章时已渲染好）
+        """
         try:
-            post = db.session.get(Post, post_id)
+            content_format = post_html.parse_format(request.args)
+            
+            post = db.session.get(Post, post_id, options=[undefer(Post.content_blob)])
             if not post:
                 raise NotFoundError('文章不存在')
             
-            return success('获取文章成功', data=post.to_dict(include_author=True, include_comments=True))
+            html = post_html.get_html(post) if content_format == 'html' else None
+            
+            # 浏览量只在内存累加，由后台线程批量写回
+            view_counter.incr(post.id)
+            
+            return success('获取文章成功', data=post.to_dict(include_author=True, include_comments=True, html=html))
         
         except APIError:
             raise
@@ -338,24 +575,15 @@ def register_routes(app):
     
     # ==================== 更新文章 ====================
     @app.route('/api/posts/<int:post_id>', methods=['PUT'])
-    @login_required
+    @claims_required
+    @shards.by_post('post_id')
     def update_post(post_id):
         """更新文章 API（需要登录，只能更新自己的文章）"""
         try:
             current_user = request.current_user
             
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
-            
             # ---- 输入验证 ----
-            valid, msg = validate_post_title(data.get('title', ''))
-            if not valid:
-                raise BadRequestError(msg)
-            
-            valid, msg = validate_post_content(data.get('content', ''))
-            if not valid:
-                raise BadRequestError(msg)
+            form = POST_FORM.load()
             
             # ---- 查找文章 ----
             post = db.session.get(Post, post_id)
@@ -367,9 +595,16 @@ def register_routes(app):
                 raise ForbiddenError('无权修改此文章')
             
             # ---- 更新文章 ----
-            post.title = data['title'].strip()
-            post.content = data['content'].strip()
+            post.title = form.title
+            post.content = form.content
+            if form.tags is not None:
+                set_post_tags(post, form.tags)  # 不传 tags 时保留原有标签
+            post_html.render_post(post)  # 内容没变时不会重新渲染
+            author_stats.touch(current_user.id)
+            change_feed.record('post', post.id, 'update')
             db.session.commit()
+            invalidate_post_caches(author_id=post.author_id)
+            title_index.add(post.id, post.title)
             
             app.logger.info(f'文章更新: "{post.title}" (ID:{post.id}) by {current_user.username}')
             
@@ -385,7 +620,8 @@ def register_routes(app):
             return error(f'更新文章失败: {str(e)}', status_code=500)
     # ==================== 删除文章 ====================
     @app.route('/api/posts/<int:post_id>', methods=['DELETE'])
-    @login_required
+    @claims_required
+    @shards.by_post('post_id')
     def delete_post(post_id):
         """删除文章 API（需要登录，只能删除自己的文章）"""
         try:
@@ -399,12 +635,18 @@ def register_routes(app):
                 raise ForbiddenError('无权删除此文章')
             
             post_title = post.title
-            db.session.delete(post)
-            db.session.commit()
             
-            app.logger.info(f'文章删除: "{post_title}" (ID:{post_id}) by {current_user.username}')
+            # 评论超过一批时不占用请求线程：登记后台删除任务（持久化）后返回 202，由后台线程分批删除
+            if purge.has_many_comments(post_id):
+                purge.post_purger.submit(post_id)
+                app.logger.info(f'文章转入后台删除: "{post_title}" (ID:{post_id}) by {current_user.username}')
+                return success('文章评论较多，已转入后台删除', data={'post_id': post_id}, status_code=202)
+            
+            comment_count = purge.delete_post(post_id)
             
-            return success('删除文章成功')
+            app.logger.info(f'文章删除: "{post_title}" (ID:{post_id})，评论 {comment_count} 条 by {current_user.username}')
+            
+            return success('删除文章成功', data={'deleted_comments': comment_count})
 
         except APIError:
             raise
@@ -422,118 +664,146 @@ def register_routes(app):
             per_page - 每页数量（默认 10，最大 100）
             keyword  - 搜索关键字（搜索标题和内容）
             author_id - 按作者ID过滤
-            sort     - 排序字段（created_at / updated_at / title，默认 created_at）
+            tag      - 按标签过滤（多个标签用逗号分隔或重复传参）
+            tag_mode - 多标签匹配方式（all 同时包含 / any 包含任一，默认 all）
+            sort     - 排序字段（created_at / updated_at / title / view_count / trending，默认 created_at）
+                       trending 按近期评论活跃度（随时间衰减）排序，只包含排行榜内的文章
             order    - 排序方向（desc 降序 / asc 升序，默认 desc）
+            count    - 总数计算方式（exact / cached / estimate / none，默认见 POST_COUNT_MODE）
         """
         try:
-            # ============ 1. 获取分页参数 ============
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
+            # ============ 1. 解析查询参数 ============
+            params = parse_post_list_args(request.args, app.config.get('POST_COUNT_MODE', 'exact'))
             
-            # 限制 per_page 范围，防止一次查太多
-            if per_page > 100:
-                per_page = 100
-            if per_page < 1:
-                per_page = 10
+            # ---- 热门排序：直接对内存排行榜切片，不走数据库排序和列表缓存 ----
+            if params['sort'] == 'trending':
+                posts, total = ranked_post_page(trending.ranked_ids(), params)
+                return success('获取文章成功', data=post_list_data(posts, total, params))
             
-            # ============ 2. 构建查询 ============
-            query = Post.query
-            
-            # ---- 过滤：按关键字搜索（标题或内容包含关键字） ----
-            keyword = request.args.get('keyword', '').strip()
-            if keyword:
-                query = query.filter(
-                    db.or_(
-                        Post.title.contains(keyword),
-                        Post.content.contains(keyword)
-                    )
-                )
-            
-            # ---- 过滤：按作者ID ----
-            author_id = request.args.get('author_id', type=int)
-            if author_id:
-                query = query.filter(Post.author_id == author_id)
-            
-            # ============ 3. 排序 ============
-            sort_field = request.args.get('sort', 'created_at')
-            order = request.args.get('order', 'desc')
-            
-            # 允许的排序字段（防止注入）
-            allowed_sort = {
-                'created_at': Post.created_at,
-                'updated_at': Post.updated_at,
-                'title': Post.title
-            }
-            
-            sort_column = allowed_sort.get(sort_field, Post.created_at)
-            
-            if order == 'asc':
-                query = query.order_by(sort_column.asc())
-            else:
-                query = query.order_by(sort_column.desc())
+            # ---- 匿名请求先查缓存（参数相同的请求直接返回） ----
+            cache_key = None
+            if not request.headers.get('Authorization'):
+                cache_key = list_cache.make_key(cache_params(params), author_id=params['author_id'])
+                cached = list_cache.get(cache_key)
+                if cached is not None:
+                    return success('获取文章成功', data=cached)
             
-            # ============ 4. 执行分页查询 ============
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
-            )
+            # ============ 2. 构建查询（过滤 + 排序） ============
+            stmt = build_post_list_query(params)
+            
+            # ============ 3. 执行分页查询（多取一条判断是否有下一页；分片时并行查询后归并） ============
+            posts, has_next = fetch_page(stmt, params)
+            
+            # ============ 4. 计算总数（能直接算出时不执行 COUNT） ============
+            total = known_total(posts, has_next, params)
+            if total is None:
+                total = count_posts(stmt, params)
             
             # ============ 5. 返回结果 ============
-            return success('获取文章成功', data={
-                'posts': [post.to_dict() for post in pagination.items],
-                'pagination': {
-                    'total': pagination.total,
-                    'page': page,
-                    'per_page': per_page,
-                    'total_pages': pagination.pages,
-                    'has_next': pagination.has_next,
-                    'has_prev': pagination.has_prev
-                },
-                'filters': {
-                    'keyword': keyword if keyword else None,
-                    'author_id': author_id,
-                    'sort': sort_field,
-                    'order': order
-                }
-            })
+            data = post_list_data(posts, total, params, has_next=has_next)
+            if cache_key is not None:
+                list_cache.set(cache_key, data)
+            
+            return success('获取文章成功', data=data)
 
         except Exception as e:
             app.logger.error(f'获取文章列表失败: {str(e)}')
             return error(f'获取文章失败: {str(e)}', status_code=500)
+    # ==================== 标签列表（标签云） ====================
+    @app.route('/api/tags', methods=['GET'])
+    def get_tags():
+        """
+        获取标签列表，按文章数降序
+        
+        查询参数：
+            limit - 返回数量（默认 50，最大 200）
+        """
+        try:
+            limit = request.args.get('limit', 50, type=int)
+            limit = min(max(limit, 1), 200)
+            
+            # post_count 增量维护且有索引，不需要 GROUP BY 统计
+            tags = top_tags(limit)
+            
+            return success('获取标签成功', data={
+                'tags': tags,
+                'count': len(tags)
+            })
+
+        except Exception as e:
+            app.logger.error(f'获取标签失败: {str(e)}')
+            return error(f'获取标签失败: {str(e)}', status_code=500)
+    # ==================== 增量变更 ====================
+    @app.route('/api/changes', methods=['GET'])
+    def get_changes():
+        """
+        按提交顺序获取文章和评论的变更（镜像站 / 搜索索引增量同步）
+        
+        查询参数：
+            since - 游标，传上一次返回的 next_cursor（默认 0，从头开始）
+            limit - 最多返回的变更数（默认 100，最大 1000）
+            types - 只返回指定类型（post / comment，逗号分隔，默认全部）
+        """
+        try:
+            params = change_feed.parse_changes_args(request.args)
+            data = change_feed.fetch_changes(params['since'], params['limit'], params['types'])
+            return success('获取变更成功', data=data)
+
+        except APIError:
+            raise
+        except Exception as e:
+            app.logger.error(f'获取变更失败: {str(e)}')
+            return error(f'获取变更失败: {str(e)}', status_code=500)
     # ==================== 创建评论 ====================
     @app.route('/api/posts/<int:post_id>/comments', methods=['POST'])
-    @login_required
+    @claims_required
+    @shards.by_post('post_id')
     def create_comment(post_id):
-        """创建评论 API（需要登录）"""
+        """
+        创建评论 API（需要登录）
+        
+        请求体可选 parent_id：回复某条评论（必须是同一篇文章下的评论）
+        """
         try:
             current_user = request.current_user
             
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
+            data = json_body()
             
             post = db.session.get(Post, post_id)
             if not post:
                 raise NotFoundError('文章不存在')
             
-            valid, msg = validate_comment_content(data.get('content', ''))
-            if not valid:
-                raise BadRequestError(msg)
+            form = COMMENT_CREATE.parse(data)
+            
+            parent = None
+            if form.parent_id is not None:
+                parent = db.session.get(Comment, form.parent_id)
+                if not parent:
+                    raise NotFoundError('父评论不存在')
+                if parent.post_id != post_id:
+                    raise BadRequestError('父评论不属于该文章')
+                if parent.depth + 1 > comment_threads.max_depth():
+                    raise BadRequestError(f'回复层级不能超过 {comment_threads.max_depth()} 层')
             
             comment = Comment(
-                content=data['content'].strip(),
+                content=form.content,
                 author_id=current_user.id,
                 post_id=post_id
             )
             
             db.session.add(comment)
+            db.session.flush()  # 先拿到评论ID，用于生成物化路径
+            comment_threads.attach_reply(comment, parent)
+            author_stats.record_comments({current_user.id: 1})
+            change_feed.record('comment', comment.id, 'create', post_id)
             db.session.commit()
+            trending.record_comment(post_id, comment.created_at)
+            comment_events.publish(post_id)
             
             app.logger.info(f'评论创建: 文章#{post_id} by {current_user.username}')
             
             return success('创建评论成功', data={
-                'comment': comment.to_dict(include_author=True)
+                'comment': comment.to_dict(include_author=True, author=current_user)
             }, status_code=201)
 
         except APIError:
@@ -545,6 +815,7 @@ def register_routes(app):
 
     # ==================== 获取文章评论 ====================
     @app.route('/api/posts/<int:post_id>/comments', methods=['GET'])
+    @shards.by_post('post_id')
     def get_comments_for_post(post_id):
         """获取文章的评论列表"""
         try:
@@ -566,21 +837,131 @@ def register_routes(app):
         except Exception as e:
             app.logger.error(f'获取评论失败: {str(e)}')
             return error(f'获取评论失败: {str(e)}', status_code=500)
+    # ==================== 评论实时推送（SSE） ====================
+    @app.route('/api/posts/<int:post_id>/comments/stream', methods=['GET'])
+    @shards.by_post('post_id')
+    def stream_comments(post_id):
+        """
+        订阅文章的评论变化（text/event-stream）
+        
+        事件：
+            comment      - 评论新增 / 修改 / 删除（data.action 为 create / update / delete）
+            reset        - 断线太久错过的事件太多，需要重新拉取评论列表
+            post_deleted - 文章已删除，推送后连接结束
+        
+        断线重连时浏览器自动带 Last-Event-ID 请求头，从断开的位置继续推送；
+        首次连接也可以用 last_event_id 查询参数指定位置。
+        """
+        try:
+            post = db.session.get(Post, post_id)
+            if not post:
+                raise NotFoundError('文章不存在')
+            
+            last_event_id = parse_last_event_id(
+                request.headers.get('Last-Event-ID'), request.args.get('last_event_id')
+            )
+            subscription, backlog = comment_events.open(post_id, last_event_id)
+            
+            # 事件流不使用请求上下文，返回后数据库连接即归还连接池
+            return Response(
+                comment_events.stream(subscription, backlog),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+        except APIError:
+            raise
+        except Exception as e:
+            app.logger.error(f'订阅评论失败: {str(e)}')
+            return error(f'订阅评论失败: {str(e)}', status_code=500)
+
+    # ==================== 获取评论线程 ====================
+    @app.route('/api/posts/<int:post_id>/comments/threads', methods=['GET'])
+    @shards.by_post('post_id')
+    def get_comment_threads(post_id):
+        """
+        按顶层评论分页获取评论线程（回复嵌套在 replies 中）
+        
+        查询参数：
+            page     - 页码（默认 1）
+            per_page - 每页顶层评论数（默认 10，最大 50）
+            depth    - 每个线程最多展开几层回复（默认不限，0 表示只返回顶层评论）
+        """
+        try:
+            post = db.session.get(Post, post_id)
+            if not post:
+                raise NotFoundError('文章不存在')
+            
+            page = request.args.get('page', 1, type=int)
+            per_page = request.args.get('per_page', 10, type=int)
+            if per_page > 50:
+                per_page = 50
+            if per_page < 1:
+                per_page = 10
+            depth = request.args.get('depth', type=int)
+            if depth is not None and depth < 0:
+                raise BadRequestError('depth 不能为负数')
+            
+            threads, pagination = comment_threads.load_threads(post_id, page, per_page, depth)
+            
+            return success('获取评论成功', data={
+                'threads': threads,
+                'pagination': {
+                    'total': pagination.total,
+                    'page': pagination.page,
+                    'per_page': pagination.per_page,
+                    'total_pages': pagination.pages,
+                    'has_next': pagination.has_next,
+                    'has_prev': pagination.has_prev
+                },
+                'post_id': post_id
+            })
+
+        except APIError:
+            raise
+        except Exception as e:
+            app.logger.error(f'获取评论失败: {str(e)}')
+            return error(f'获取评论失败: {str(e)}', status_code=500)
+
+    # ==================== 获取评论回复 ====================
+    @app.route('/api/posts/comments/<int:comment_id>/replies', methods=['GET'])
+    @shards.by_comment('comment_id')
+    def get_comment_replies(comment_id):
+        """
+        获取一条评论及其所有回复（一次范围查询取出整个子树）
+        
+        查询参数：
+            depth - 最多向下展开几层（默认不限）
+        """
+        try:
+            comment = db.session.get(Comment, comment_id)
+            if not comment:
+                raise NotFoundError('评论不存在')
+            
+            depth = request.args.get('depth', type=int)
+            if depth is not None and depth < 0:
+                raise BadRequestError('depth 不能为负数')
+            
+            return success('获取回复成功', data={
+                'comment': comment_threads.load_subtree(comment, depth)
+            })
+
+        except APIError:
+            raise
+        except Exception as e:
+            app.logger.error(f'获取回复失败: {str(e)}')
+            return error(f'获取回复失败: {str(e)}', status_code=500)
+
     # ==================== 更新评论 ====================
     @app.route('/api/posts/comments/<int:comment_id>', methods=['PUT'])
-    @login_required
+    @claims_required
+    @shards.by_comment('comment_id')
     def update_comment(comment_id):
         """更新评论 API（需要登录，只能更新自己的评论）"""
         try:
             current_user = request.current_user
             
-            data = request.get_json()
-            if not data:
-                raise BadRequestError('请求体不能为空')
-            
-            valid, msg = validate_comment_content(data.get('content', ''))
-            if not valid:
-                raise BadRequestError(msg)
+            form = COMMENT_UPDATE.load()
             
             comment = db.session.get(Comment, comment_id)
             if not comment:
@@ -589,13 +970,16 @@ def register_routes(app):
             if comment.author_id != current_user.id:
                 raise ForbiddenError('无权修改此评论')
             
-            comment.content = data['content'].strip()
+            comment.content = form.content
+            author_stats.touch(current_user.id)
+            change_feed.record('comment', comment.id, 'update', comment.post_id)
             db.session.commit()
+            comment_events.publish(comment.post_id)
             
             app.logger.info(f'评论更新: #{comment_id} by {current_user.username}')
             
             return success('更新评论成功', data={
-                'comment': comment.to_dict(include_author=True)
+                'comment': comment.to_dict(include_author=True, author=current_user)
             })
 
         except APIError:
@@ -606,9 +990,10 @@ def register_routes(app):
             return error(f'更新评论失败: {str(e)}', status_code=500)
     # ==================== 删除评论 ====================
     @app.route('/api/posts/comments/<int:comment_id>', methods=['DELETE'])
-    @login_required
+    @claims_required
+    @shards.by_comment('comment_id')
     def delete_comment(comment_id):
-        """删除评论 API（需要登录，只能删除自己的评论）"""
+        """删除评论 API（需要登录，只能删除自己的评论，评论下的所有回复一并删除）"""
         try:
             current_user = request.current_user
             
@@ -619,12 +1004,21 @@ def register_routes(app):
             if comment.author_id != current_user.id:
                 raise ForbiddenError('无权删除此评论')
             
-            db.session.delete(comment)
+            post_id = comment.post_id
+            deleted = comment_threads.delete_subtree(comment)
+            comment_counts = {}
+            for _, author_id, _ in deleted:
+                comment_counts[author_id] = comment_counts.get(author_id, 0) + 1
+            author_stats.record_comments(comment_counts, -1)
+            change_feed.record_deletes('comment', [deleted_id for deleted_id, _, _ in deleted], post_id)
             db.session.commit()
+            for _, _, created_at in deleted:
+                trending.remove_comment(post_id, created_at)
+            comment_events.publish(post_id)
             
-            app.logger.info(f'评论删除: #{comment_id} by {current_user.username}')
+            app.logger.info(f'评论删除: #{comment_id}（共 {len(deleted)} 条） by {current_user.username}')
             
-            return success('删除评论成功')
+            return success('删除评论成功', data={'deleted_count': len(deleted)})
 
         except APIError:
             raise
@@ -649,13 +1043,17 @@ def init_db(app, force=False):
         
         inspector = inspect(db.engine)
         existing_tables = inspector.get_table_names()
-        expected_tables = ['users', 'posts', 'comments']
+        expected_tables = [table.name for table in db.metadata.sorted_tables]
+        created = False
         
         if force:
             # 强制模式：删除所有表后重新创建（仅用于开发环境）
             print("⚠️  强制模式：删除所有表...")
             db.drop_all()
             db.create_all()
+            shards.drop_schema()
+            shards.create_schema()
+            created = True
             print("✅ 数据库表重新创建成功！")
         else:
             # 智能模式：只创建缺失的表
@@ -664,30 +1062,189 @@ def init_db(app, force=False):
             if missing_tables:
                 print(f"📝 发现缺失的表: {', '.join(missing_tables)}")
                 db.create_all()  # 只创建缺失的表（幂等操作）
+                created = True
                 print("✅ 数据库表创建成功！")
             else:
                 print("✅ 所有表已存在，跳过创建")
+            
+            # 已存在的表：补齐模型中新增的列（create_all 不会修改已有表）
+            add_missing_columns(inspector, existing_tables)
+            add_missing_indexes(inspector, existing_tables)
+            
+            # 分片：创建缺失的分片表，已有的表同样补齐新增的列和索引
+            for name, table_names in shards.create_schema().items():
+                print(f"📝 分片 {name} 新建表: {', '.join(table_names)}")
+            for name in shards.names:
+                engine = shards.engine(name)
+                shard_inspector = inspect(engine)
+                shard_tables = shard_inspector.get_table_names()
+                add_missing_columns(shard_inspector, shard_tables, engine)
+                add_missing_indexes(shard_inspector, shard_tables, engine)
+            
+            # 老用户补建作者统计
+            backfilled = author_stats.backfill()
+            if backfilled:
+                print(f"📝 补建作者统计: {backfilled} 个用户")
+            
+            # 大 V 的旧文章补齐拉模式标记
+            backfilled = timeline.backfill()
+            if backfilled:
+                print(f"📝 补齐时间线拉模式标记: {backfilled} 个作者")
+            
+            # 旧评论补齐回复层级信息
+            backfilled = 0
+            for key in shards.targets:
+                with shards.use(key):
+                    backfilled += comment_threads.backfill_paths()
+            if backfilled:
+                print(f"📝 补齐评论层级信息: {backfilled} 条")
+            
+            # 变更日志为空时为已有的文章和评论补建记录
+            backfilled = change_feed.backfill()
+            if backfilled:
+                print(f"📝 补建变更日志: {backfilled} 条")
         
-        # 显示所有表的状态（重新检查，因为可能刚创建了表）
-        final_tables = inspector.get_table_names()
+        # 记下本次补齐对应的模型结构，之后启动时只比较指纹
+        version = db.session.get(SchemaVersion, 1) or SchemaVersion(id=1)
+        version.fingerprint = schema_fingerprint()
+        db.session.add(version)
+        db.session.commit()
+        
+        # 显示所有表的状态（只有刚创建过表才需要重新检查；inspector 有缓存，必须新建）
+        final_tables = inspect(db.engine).get_table_names() if created else existing_tables
         print("📊 当前数据库表：")
         for table in expected_tables:
             status = "✓" if table in final_tables else "✗"
             print(f"   {status} {table}")
 
+def schema_fingerprint():
+    """
+    模型表结构的指纹（表名、列名、索引名的 sha256）
+    
+    新增表、列或索引后指纹随之改变，init_db 据此补齐的内容都会被覆盖到。
+    """
+    import hashlib
+    
+    parts = []
+    for table in sorted(db.metadata.tables.values(), key=lambda t: t.name):
+        columns = ','.join(sorted(column.name for column in table.columns))
+        indexes = ','.join(sorted(index.name for index in table.indexes))
+        parts.append(f'{table.name}({columns})[{indexes}]')
+    return hashlib.sha256(';'.join(parts).encode('utf-8')).hexdigest()
+
+
+def ensure_schema(app):
+    """
+    启动时检查表结构是否跟得上代码（只读 schema_version 的一行，不读取数据库元数据）
+    
+    指纹不一致（首次部署，或升级后模型新增了表、列、索引）时：
+    SCHEMA_AUTO_MIGRATE=1（默认）自动执行 init_db 补齐；否则直接报错，不带着旧表结构启动，
+    避免之后的请求在运行时才因为缺列、缺数据而失败。
+    
+    返回:
+        bool: 是否执行了 init_db
+    
+    异常:
+        RuntimeError: 表结构落后且未开启自动补齐
+    """
+    from sqlalchemy.exc import DatabaseError
+    
+    with app.app_context():
+        try:
+            stored = db.session.scalar(db.select(SchemaVersion.fingerprint).where(SchemaVersion.id == 1))
+        except DatabaseError:
+            # schema_version 表还不存在（首次部署或从旧版本升级）
+            db.session.rollback()
+            stored = None
+        finally:
+            db.session.remove()
+    if stored == schema_fingerprint():
+        return False
+    if not app.config['SCHEMA_AUTO_MIGRATE']:
+        raise RuntimeError('数据库表结构落后于代码，请先执行 python app.py --init-db')
+    init_db(app)
+    return True
+
+
+def add_missing_columns(inspector, existing_tables, engine=None):
+    """
+    为已存在的表补齐模型中新增的列（只做 ADD COLUMN，不删除、不修改已有列）
+    
+    参数:
+        inspector: SQLAlchemy Inspector 对象
+        existing_tables: 数据库中已存在的表名列表
+        engine: 目标数据库（默认主库；分片时逐个分片调用）
+    """
+    engine = engine if engine is not None else db.engine
+    dialect = engine.dialect
+    statements = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+            if column.server_default is not None:
+                default = column.server_default.arg
+                default = default.text if hasattr(default, 'text') else f"'{default}'"
+                ddl += f' NOT NULL DEFAULT {default}' if not column.nullable else f' DEFAULT {default}'
+            
+            statements.append(ddl)
+            print(f"📝 新增列: {table.name}.{column.name}")
+    if statements:
+        with engine.begin() as conn:
+            for ddl in statements:
+                conn.execute(db.text(ddl))
+
+def add_missing_indexes(inspector, existing_tables, engine=None):
+    """
+    为已存在的表补齐模型中新增的索引（create_all 不会给已有表加索引）
+    
+    参数:
+        inspector: SQLAlchemy Inspector 对象
+        existing_tables: 数据库中已存在的表名列表
+        engine: 目标数据库（默认主库）
+    """
+    engine = engine if engine is not None else db.engine
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            
+            index.create(bind=engine)
+            print(f"📝 新增索引: {table.name}.{index.name}")
+
 # ============================================================================
 # 主程序
 # ============================================================================
 
 if __name__ == '__main__':
+    import sys
+    
     # 创建应用
     app = create_app()
     
     # 初始化数据库（智能检查，不会重复创建）
+    # 完整检查表结构需要读取数据库元数据，默认只比较 schema_version 中的指纹，
+    # 表结构落后时才执行 init_db；--init-db（或 INIT_DB_ON_START=1）强制完整检查
     print("=" * 60)
     print("博客系统后端 API - 初始化")
     print("=" * 60)
-    init_db(app)  # 只在表不存在时创建，不会重复创建或删除数据
+    if '--init-db' in sys.argv or app.config['INIT_DB_ON_START']:
+        with startup_timer.phase('检查表结构'):
+            init_db(app)  # 只在表不存在时创建，不会重复创建或删除数据
+    else:
+        with startup_timer.phase('检查表结构版本'):
+            if not ensure_schema(app):
+                print("⏭️  表结构与代码一致，跳过完整检查（需要时使用 --init-db）")
     
     print("\n✅ API 服务启动中...")
     print("📝 可用接口：")
@@ -697,18 +1254,26 @@ if __name__ == '__main__':
     print("   GET    /api/users/all        - 获取所有用户")
     print("   GET    /api/users/me         - 获取当前用户信息（需登录）")
     print("   PUT    /api/users/password   - 修改密码（需登录）")
+    print("   POST   /api/users/<id>/follow - 关注用户（需登录）")
+    print("   DELETE /api/users/<id>/follow - 取消关注（需登录）")
+    print("   GET    /api/timeline         - 首页时间线（需登录）")
     print("   GET    /api/posts            - 获取文章列表（分页+过滤+排序）")
     print("   POST   /api/posts            - 创建文章（需登录）")
     print("   GET    /api/posts/<id>       - 获取文章详情")
     print("   PUT    /api/posts/<id>       - 更新文章（需登录）")
     print("   DELETE /api/posts/<id>       - 删除文章（需登录）")
+    print("   GET    /api/tags             - 标签列表（按文章数排序）")
+    print("   GET    /api/changes          - 文章/评论增量变更（since 游标）")
     print("   POST   /api/posts/<id>/comments  - 创建评论（需登录）")
     print("   GET    /api/posts/<id>/comments  - 获取文章评论")
+    print("   GET    /api/posts/<id>/comments/stream - 评论实时推送（SSE）")
     print("   PUT    /api/posts/comments/<id>  - 更新评论（需登录）")
     print("   DELETE /api/posts/comments/<id>  - 删除评论（需登录）")
     print("\n📋 日志文件: logs/app.log, logs/error.log")
+    print(f"\n⏱️  启动耗时: {startup_timer.summary()}")
     print("\n🚀 服务运行在: http://127.0.0.1:5000")
     print("=" * 60)
     
     # 启动 Flask 应用
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # 仅用于开发调试，生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000)
@@ -0,0 +1,513 @@
+"""
+ASGI 异步服务模式
+
+功能：
+    1. 提供一个基于 asyncio 的服务入口，和 Flask 同步模式共用同一套路由和 JSON 结构
+    2. 读接口（健康检查、文章列表、文章详情、批量获取文章、评论列表、用户列表）使用异步 SQLAlchemy 引擎，
+       等待数据库时不占用线程，可以同时挂起成千上万个空闲连接
+    3. 评论实时推送（SSE）原生异步输出，每个连接只是一个协程，不占用线程
+    4. 其他接口（注册登录、写操作等）交给原来的 Flask 应用，在线程池中执行，
+       密码哈希之类的 CPU 密集操作不会阻塞事件循环
+    5. 启用分片时（见 sharding.py）文章和评论的读接口也交给 Flask 应用，由它按分片路由
+
+数据库驱动：
+    本地 SQLite 使用 aiosqlite，生产 MySQL 使用 aiomysql。
+    默认根据 SQLALCHEMY_DATABASE_URI 自动换成对应的异步驱动，也可以用 ASYNC_DATABASE_URL 单独指定。
+
+启动方式：
+    pip install -r requirements-async.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import gzip
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload, undefer
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from app import create_app, ensure_schema
+from models import db, User, Post, Comment, PostRender
+from exceptions import APIError, NotFoundError
+from comment_events import comment_events, parse_last_event_id
+from cache import list_cache, count_cache
+from view_counter import view_counter
+from trending import trending
+import post_html
+from compression import accepts_gzip
+from sqlite_profile import apply_pragmas
+from sharding import shards
+from queries import (
+    parse_post_list_args, cache_params, build_post_list_query, post_list_data,
+    page_statement, split_page, known_total, has_filters,
+    count_statement, estimate_statement, count_cache_key,
+    parse_batch_args, build_batch_query, batch_data
+)
+
+
+# 同步驱动 -> 异步驱动
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'mysql+pymysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite'
+}
+
+
+def to_async_url(url):
+    """
+    把同步数据库连接串换成对应的异步驱动
+
+    参数:
+        url: 同步连接串，例如 mysql+pymysql://... 或 sqlite:///...
+
+    返回:
+        URL: 异步连接串
+    """
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        return url
+    return url.set(drivername=driver)
+
+
+class AsyncRequest:
+    """原生异步路由使用的轻量请求对象"""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else None
+
+
+class BlogASGI:
+    """
+    ASGI 应用
+
+    读接口走原生异步实现，其余请求转发给 Flask 应用（线程池中执行）。
+    路由匹配直接复用 Flask 的 url_map，保证两种模式下 URL 规则完全一致。
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.url_adapter = flask_app.url_map.bind('localhost')
+        self.executor = ThreadPoolExecutor(
+            max_workers=flask_app.config.get('ASYNC_WSGI_THREADS', 32),
+            thread_name_prefix='wsgi'
+        )
+        self.engine = None
+        self.session_factory = None
+
+        # endpoint 名称 -> (异步处理函数, 500 错误提示)
+        self.handlers = {
+            'health_check': (self.health_check, '健康检查失败'),
+            'get_all_users': (self.get_all_users, '获取用户失败'),
+            'get_posts': (self.get_posts, '获取文章失败'),
+            'get_post_detail': (self.get_post_detail, '获取文章失败'),
+            'get_posts_batch': (self.get_posts_batch, '批量获取文章失败'),
+            'get_comments_for_post': (self.get_comments_for_post, '获取评论失败')
+        }
+        # 异步引擎只连接主库，分片后文章和评论不在主库中
+        if shards.enabled:
+            for endpoint in ('get_posts', 'get_post_detail', 'get_posts_batch', 'get_comments_for_post'):
+                del self.handlers[endpoint]
+
+    # ==================== ASGI 入口 ====================
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        handler = None
+        endpoint = None
+        view_args = {}
+        if scope['method'] == 'GET':
+            try:
+                endpoint, view_args = self.url_adapter.match(scope['path'], method='GET')
+                handler = self.handlers.get(endpoint)
+            except HTTPException:
+                handler = None
+            # 热门排序依赖进程内的排行榜（同步读写数据库），交给 Flask 在线程池中处理
+            if handler is not None and endpoint == 'get_posts':
+                query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+                if query.get('sort') == 'trending':
+                    handler = None
+            # 评论推送是长连接，原生异步输出
+            if endpoint == 'stream_comments':
+                await self.stream_comments(scope, receive, send, **view_args)
+                return
+
+        if handler is None:
+            await self.call_wsgi(scope, receive, send)
+        else:
+            await self.call_native(handler, view_args, scope, send)
+
+    async def lifespan(self, receive, send):
+        """处理启动/关闭事件：创建和释放异步引擎"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                # 关闭前把内存中的浏览量和热度增量写回数据库
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, view_counter.flush)
+                await loop.run_in_executor(self.executor, trending.flush)
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def startup(self):
+        """创建异步数据库引擎（没有 lifespan 支持的服务器会在第一次请求时调用）"""
+        if self.engine is not None:
+            return
+        config = self.flask_app.config
+        url = config.get('ASYNC_DATABASE_URL') or to_async_url(config['SQLALCHEMY_DATABASE_URI'])
+        self.engine = create_async_engine(url, pool_pre_ping=True)
+        if self.engine.dialect.name == 'sqlite' and config.get('SQLITE_TUNED', True):
+            # 异步模式只承担读接口，只需要 PRAGMA 调优（写操作仍由 Flask 应用执行）
+            apply_pragmas(self.engine.sync_engine, config)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.flask_app.logger.info(f'ASGI 异步引擎已创建: {self.engine.url.drivername}')
+
+    # ==================== 原生异步路由 ====================
+
+    async def call_native(self, handler, view_args, scope, send):
+        """执行原生异步路由，并处理异常、压缩和请求日志"""
+        func_, error_message = handler
+        start = time.time()
+        request = AsyncRequest(scope)
+        self.startup()
+
+        try:
+            status, payload = await func_(request, **view_args)
+        except APIError as e:
+            self.flask_app.logger.warning(f'业务异常: {e.message} (HTTP {e.status_code})')
+            status, payload = e.status_code, e.to_dict()
+        except Exception as e:
+            self.flask_app.logger.error(f'{error_message}: {str(e)}')
+            status, payload = 500, {'error': f'{error_message}: {str(e)}'}
+
+        await self.send_json(request, status, payload, send)
+        duration_ms = round((time.time() - start) * 1000, 2)
+        self.flask_app.logger.info(
+            f'{request.method} {request.path} - {status} - {duration_ms}ms - IP:{request.remote_addr}'
+        )
+
+    async def send_json(self, request, status, payload, send):
+        """发送 JSON 响应（与 compression.py 相同的压缩规则）"""
+        body = (self.flask_app.json.dumps(payload) + '\n').encode('utf-8')
+        headers = [(b'content-type', b'application/json')]
+
+        config = self.flask_app.config
+        if config.get('COMPRESS_ENABLED', True):
+            headers.append((b'vary', b'Accept-Encoding'))
+            if (len(body) >= config.get('COMPRESS_MIN_SIZE', 500)
+                    and accepts_gzip(request.headers.get('accept-encoding', ''))):
+                body = gzip.compress(body, compresslevel=config.get('COMPRESS_LEVEL', 6))
+                headers.append((b'content-encoding', b'gzip'))
+
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def health_check(self, request):
+        """健康检查接口"""
+        return 200, {
+            'status': 'ok',
+            'message': '博客系统 API 运行正常'
+        }
+
+    async def get_all_users(self, request):
+        """获取所有用户"""
+        async with self.session_factory() as session:
+            users = (await session.execute(select(User))).scalars().all()
+        return 200, {'message': '获取用户成功', 'data': {
+            'count': len(users),
+            'users': [user.to_dict() for user in users]
+        }}
+
+    async def get_posts(self, request):
+        """获取文章列表（参数、缓存、返回结构与同步路由一致）"""
+        params = parse_post_list_args(request.args, self.flask_app.config.get('POST_COUNT_MODE', 'exact'))
+
+        cache_key = None
+        if not request.headers.get('authorization'):
+            cache_key = list_cache.make_key(cache_params(params), author_id=params['author_id'])
+            cached = list_cache.get(cache_key)
+            if cached is not None:
+                return 200, {'message': '获取文章成功', 'data': cached}
+
+        stmt = build_post_list_query(params)
+
+        async with self.session_factory() as session:
+            rows = (await session.execute(page_statement(stmt, params))).scalars().all()
+            posts, has_next = split_page(rows, params)
+            total = known_total(posts, has_next, params)
+            if total is None:
+                total = await self.count_posts(session, stmt, params)
+
+        data = post_list_data(posts, total, params, has_next=has_next)
+        if cache_key is not None:
+            list_cache.set(cache_key, data)
+        return 200, {'message': '获取文章成功', 'data': data}
+
+    async def count_posts(self, session, stmt, params):
+        """queries.count_posts 的异步版本（计算方式和缓存完全相同）"""
+        mode = params['count']
+        if mode == 'none':
+            return None
+
+        if mode == 'estimate' and not has_filters(params):
+            estimate = estimate_statement(self.engine.dialect.name)
+            if estimate is not None:
+                return (await session.execute(estimate)).scalar() or 0
+        if mode in ('cached', 'estimate'):
+            key = count_cache_key(params)
+            total = count_cache.get(key)
+            if total is None:
+                total = (await session.execute(count_statement(stmt))).scalar()
+                count_cache.set(key, total)
+            return total
+
+        return (await session.execute(count_statement(stmt))).scalar()
+
+    async def get_post_detail(self, request, post_id):
+        """获取文章详情（作者和评论一次性预加载，避免异步模式下的懒加载）"""
+        content_format = post_html.parse_format(request.args)
+        async with self.session_factory() as session:
+            post = await session.get(
+                Post, post_id,
+                options=[selectinload(Post.author), selectinload(Post.comments), undefer(Post.content_blob)]
+            )
+            if not post:
+                raise NotFoundError('文章不存在')
+            render = await session.get(PostRender, post_id) if content_format == 'html' else None
+
+        html = None
+        if content_format == 'html':
+            if post_html.is_fresh(render, self.flask_app.config):
+                html = render.html
+            else:
+                # 没有渲染结果或已过期：在线程池中渲染（不保存，由批量重新渲染保存）
+                loop = asyncio.get_running_loop()
+                html = await loop.run_in_executor(
+                    self.executor, post_html.render_html, post.content, self.flask_app.config
+                )
+
+        view_counter.incr(post.id)
+        return 200, {
+            'message': '获取文章成功',
+            'data': post.to_dict(include_author=True, include_comments=True, html=html)
+        }
+
+    async def get_posts_batch(self, request):
+        """按ID列表批量获取文章（参数和返回结构与同步路由一致）"""
+        ids, include_author = parse_batch_args(
+            request.args, self.flask_app.config.get('BATCH_MAX_IDS', 200)
+        )
+        async with self.session_factory() as session:
+            # tags 是 selectin 关系，会在同一次 execute 中预加载
+            posts = (await session.execute(build_batch_query(ids, include_author))).scalars().all()
+
+        return 200, {'message': '获取文章成功', 'data': batch_data(posts, ids, include_author)}
+
+    async def get_comments_for_post(self, request, post_id):
+        """获取文章的评论列表"""
+        async with self.session_factory() as session:
+            post = await session.get(Post, post_id)
+            if not post:
+                raise NotFoundError('文章不存在')
+
+            stmt = (
+                select(Comment)
+                .where(Comment.post_id == post_id)
+                .order_by(Comment.created_at.desc())
+                .options(selectinload(Comment.author))
+            )
+            comments = (await session.execute(stmt)).scalars().all()
+
+        return 200, {'message': '获取评论成功', 'data': {
+            'comments': [comment.to_dict(include_author=True) for comment in comments],
+            'count': len(comments),
+            'post_id': post_id
+        }}
+
+    # ==================== 评论实时推送（SSE） ====================
+
+    async def stream_comments(self, scope, receive, send, post_id):
+        """订阅文章的评论变化：补发和实时事件都在事件循环中输出，客户端断开时立即取消订阅"""
+        start = time.time()
+        request = AsyncRequest(scope)
+        self.startup()
+        loop = asyncio.get_running_loop()
+
+        try:
+            if shards.enabled:
+                exists = await loop.run_in_executor(self.executor, self.post_exists, post_id)
+            else:
+                async with self.session_factory() as session:
+                    exists = await session.get(Post, post_id) is not None
+            if not exists:
+                raise NotFoundError('文章不存在')
+            last_event_id = parse_last_event_id(request.headers.get('last-event-id'), request.args.get('last_event_id'))
+            subscription, backlog = await loop.run_in_executor(
+                self.executor, self.open_subscription, post_id, last_event_id, loop
+            )
+        except APIError as e:
+            self.flask_app.logger.warning(f'业务异常: {e.message} (HTTP {e.status_code})')
+            await self.send_json(request, e.status_code, e.to_dict(), send)
+            return
+        except Exception as e:
+            self.flask_app.logger.error(f'订阅评论失败: {str(e)}')
+            await self.send_json(request, 500, {'error': f'订阅评论失败: {str(e)}'}, send)
+            return
+
+        self.flask_app.logger.info(
+            f'{request.method} {request.path} - 200 - SSE 开始 - IP:{request.remote_addr}'
+        )
+
+        async def pump():
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]})
+            async for chunk in comment_events.stream_async(subscription, backlog):
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(wait_disconnect())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            comment_events.close(subscription)
+            duration = round(time.time() - start, 1)
+            self.flask_app.logger.info(f'{request.method} {request.path} - SSE 结束 - {duration}s')
+
+    def post_exists(self, post_id):
+        """文章是否存在（启用分片时在线程池中到文章所在的分片查询）"""
+        with self.flask_app.app_context():
+            key = shards.post_shard(post_id)
+            if key is None:
+                return False
+            with shards.use(key):
+                return db.session.get(Post, post_id) is not None
+
+    def open_subscription(self, post_id, last_event_id, loop):
+        """在线程池中登记订阅并读取补发的事件（使用 Flask 应用的数据库会话）"""
+        with self.flask_app.app_context():
+            return comment_events.open(post_id, last_event_id, loop)
+
+    # ==================== 转发给 Flask（WSGI） ====================
+
+    async def call_wsgi(self, scope, receive, send):
+        """把请求转发给 Flask 应用，在线程池中执行，响应按块流式返回"""
+        loop = asyncio.get_running_loop()
+
+        # 读取完整请求体
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        environ = self.build_environ(scope, body)
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+
+        def run_app():
+            result = self.flask_app(environ, start_response)
+            return result, iter(result)
+
+        result, iterator = await loop.run_in_executor(self.executor, run_app)
+        try:
+            started = False
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if not started:
+                    await send({
+                        'type': 'http.response.start',
+                        'status': response_start['status'],
+                        'headers': response_start['headers']
+                    })
+                    started = True
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+    @staticmethod
+    def build_environ(scope, body):
+        """根据 ASGI scope 构建 WSGI environ"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+                continue
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+
+def create_asgi_app():
+    """创建 ASGI 应用（内部包含一个完整的 Flask 应用），启动前检查表结构版本"""
+    flask_app = create_app()
+    ensure_schema(flask_app)
+    return BlogASGI(flask_app)
+
+
+app = create_asgi_app()
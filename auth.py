@@ -1,30 +1,38 @@
 """
 认证工具模块 - c
 """
-import jwt
 from functools import wraps
 from datetime import datetime, timedelta, timezone
 from flask import request, current_app
 from models import User, db
 from responses import error
+from exceptions import UnauthorizedError
+from token_epochs import token_epochs
 
 
-def generate_token(user_id):
+def generate_token(user_id, username=None, token_version=0):
     """
     生成 JWT Token
     
     参数:
-        user_id: 用户ID
+        user_id:       用户ID
+        username:      用户名（可选，写入 Token 后 @claims_required 的路由无需再查用户表）
+        token_version: 用户当前的 Token 版本（修改密码后递增，旧版本 Token 失效）
         
     返回:
         str: JWT Token 字符串
     """
+    import jwt  # 延迟导入：只有签发/校验 Token 时才需要，加快启动
+    
     now = datetime.now(timezone.utc)
     payload = {
         'user_id': user_id,
         'exp': now + timedelta(days=7),  # Token 7天后过期
-        'iat': now  # 签发时间
+        'iat': now,  # 签发时间
+        'ver': token_version  # Token 版本
     }
+    if username:
+        payload['username'] = username
     token = jwt.encode(
         payload,
         current_app.config['SECRET_KEY'],
@@ -43,6 +51,8 @@ def verify_token(token):
     返回:
         dict: Token 载荷（包含 user_id），验证失败返回 None
     """
+    import jwt
+    
     try:
         payload = jwt.decode(
             token,
@@ -56,12 +66,12 @@ def verify_token(token):
         return None  # Token 无效
 
 
-def get_current_user():
+def get_token_payload():
     """
-    从请求头中获取当前登录用户
+    从请求头中取出并验证 Token
     
     返回:
-        User: 用户对象，未登录返回 None
+        dict: Token 载荷（包含 user_id），未登录或 Token 无效返回 None
     """
     # 从请求头获取 Token
     auth_header = request.headers.get('Authorization')
@@ -76,18 +86,73 @@ def get_current_user():
     
     # 验证 Token
     payload = verify_token(token)
-    if not payload:
+    if not payload or not payload.get('user_id'):
         return None
     
-    # 获取用户
-    user_id = payload.get('user_id')
-    if not user_id:
+    # 检查 Token 版本（内存表，O(1)），修改密码前签发的 Token 在这里失效
+    if not token_epochs.is_current(payload['user_id'], payload.get('ver', 0)):
+        return None
+    
+    return payload
+
+
+def get_current_user():
+    """
+    从请求头中获取当前登录用户
+    
+    返回:
+        User: 用户对象，未登录返回 None
+    """
+    payload = get_token_payload()
+    if not payload:
         return None
     
-    user = db.session.get(User, user_id)
+    # 获取用户（已经加载了用户行，顺便用数据库中的版本号再校验一次）
+    user = db.session.get(User, payload['user_id'])
+    if user and payload.get('ver', 0) < (user.token_version or 0):
+        return None
     return user
 
 
+class ClaimsUser:
+    """
+    由 Token 声明构造的当前用户
+    
+    id、username 直接取自已签名的 Token，不查询数据库；
+    路由访问其他字段（如 email、check_password）时才加载完整的 User 对象。
+    
+    注意：只用到 id / username 的路由信任 Token 本身，不确认用户是否仍然存在。
+    Token 失效（修改密码）要等 Token 版本表下一次轮询才在本进程生效；
+    用户被删除后，这类路由仍会以该用户ID尝试写入（由 author_id 等外键拒绝），直到 Token 过期或版本被吊销；
+    访问其他字段时发现用户不存在则返回 401。
+    """
+    
+    def __init__(self, user_id, username=None):
+        self._user = None
+        self.id = user_id
+        if username is not None:
+            self.username = username
+    
+    def _load(self):
+        """
+        按需加载完整的 User 对象
+        
+        异常:
+            UnauthorizedError: 用户已被删除（与 @login_required 一样返回 401）
+        """
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+            if self._user is None:
+                raise UnauthorizedError('需要登录', detail='用户不存在，请重新登录')
+        return self._user
+    
+    def __getattr__(self, name):
+        # 只有实例上没有的属性才会走到这里
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+
 def login_required(f):
     """
     登录验证装饰器
@@ -114,3 +179,32 @@ def login_required(f):
         return f(*args, **kwargs)
     
     return decorated_function
+
+
+def claims_required(f):
+    """
+    登录验证装饰器（只校验 Token，不查询用户表）
+    
+    适用于只需要 current_user.id / current_user.username 的写操作，
+    每个请求比 @login_required 少一次数据库查询。
+    访问其他用户字段时会自动加载完整的 User 对象。
+    
+    使用示例:
+        @app.route('/api/posts', methods=['POST'])
+        @claims_required
+        def create_post():
+            current_user = request.current_user
+            # current_user.id, current_user.username
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        payload = get_token_payload()
+        
+        if not payload:
+            return error('需要登录', detail='请先登录后再进行操作', status_code=401)
+        
+        request.current_user = ClaimsUser(payload['user_id'], payload.get('username'))
+        
+        return f(*args, **kwargs)
+    
+    return decorated_function
@@ -0,0 +1,178 @@
+"""
+作者统计模块
+
+功能：
+    1. 文章/评论的写操作对 author_stats 做增量更新（UPDATE ... SET post_count = post_count ± n）
+    2. 统计行在注册时创建；缺少统计行的老用户在第一次更新时用 COUNT 补建一次，
+       之后都是增量维护
+    3. init_db 时为所有缺少统计行的用户一次性补建
+
+所有函数都不提交事务，和文章/评论的写操作在同一个事务中提交。
+调用时本次的文章/评论变更必须已经 flush（补建统计行时 COUNT 的结果才包含本次变更）。
+启用分片时统计行在主库，补建时逐个分片 COUNT（作者的评论可能分布在所有分片上）。
+"""
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Post, Comment, AuthorStats
+from sharding import shards
+
+
+def create(user_id):
+    """注册时创建空的统计行"""
+    db.session.add(AuthorStats(user_id=user_id, post_count=0, comment_count=0))
+
+
+def record_post(author_id, delta=1):
+    """发文（delta=1）或删文（delta=-1）"""
+    _adjust(author_id, posts=delta, active=delta > 0)
+
+
+def record_comments(author_counts, delta=1):
+    """
+    新增或删除评论
+
+    参数:
+        author_counts: {评论者ID: 评论数}
+        delta:         1 表示新增，-1 表示删除
+    """
+    for author_id, count in author_counts.items():
+        _adjust(author_id, comments=delta * count, active=delta > 0)
+
+
+def touch(user_id):
+    """更新最近活跃时间（编辑文章/评论时调用）"""
+    _adjust(user_id, active=True)
+
+
+def get(user_id):
+    """
+    读取用户的统计行（按主键取一行），缺少统计行的老用户补建后返回
+
+    返回:
+        AuthorStats: 统计对象
+    """
+    stats = db.session.get(AuthorStats, user_id)
+    if stats is None:
+        _create_from_counts(user_id)
+        db.session.commit()
+        stats = db.session.get(AuthorStats, user_id)
+    return stats
+
+
+def _adjust(user_id, posts=0, comments=0, active=False):
+    """对单个用户的统计行做增量更新，统计行不存在时补建"""
+    values = {}
+    if posts:
+        values['post_count'] = AuthorStats.post_count + posts
+    if comments:
+        values['comment_count'] = AuthorStats.comment_count + comments
+    if active:
+        values['last_active_at'] = datetime.now()
+    if not values:
+        return
+
+    result = db.session.execute(
+        db.update(AuthorStats).where(AuthorStats.user_id == user_id).values(**values),
+        execution_options={'synchronize_session': False}
+    )
+    if result.rowcount == 0:
+        _create_from_counts(user_id)
+
+
+def _create_from_counts(user_id):
+    """
+    用 COUNT 补建统计行（只在老用户第一次更新时执行一次）
+
+    本次变更已经 flush，COUNT 的结果已经包含本次变更，不需要再叠加增量。
+    """
+    post_count = db.select(db.func.count()).where(Post.author_id == user_id)
+    comment_count = db.select(db.func.count()).where(Comment.author_id == user_id)
+    if shards.enabled:
+        # 统计行在主库、文章和评论在分片上，不能用子查询，先逐个分片算出来
+        with shards.use(shards.for_author(user_id)):
+            post_count = db.session.execute(post_count).scalar()
+        counts = []
+        for key in shards.targets:
+            with shards.use(key):
+                counts.append(db.session.execute(comment_count).scalar())
+        comment_count = sum(counts)
+    else:
+        post_count, comment_count = post_count.scalar_subquery(), comment_count.scalar_subquery()
+    try:
+        # 使用 SAVEPOINT：并发补建同一用户时只回滚这一条插入
+        with db.session.begin_nested():
+            db.session.execute(db.insert(AuthorStats).values(
+                user_id=user_id,
+                post_count=post_count,
+                comment_count=comment_count,
+                last_active_at=datetime.now()
+            ))
+    except IntegrityError:
+        pass
+
+
+def backfill():
+    """
+    为所有缺少统计行的用户补建统计行（init_db 时调用）
+
+    返回:
+        int: 补建的用户数
+    """
+    if shards.enabled:
+        return _backfill_sharded()
+
+    post_count = (
+        db.select(db.func.count()).where(Post.author_id == User.id)
+        .correlate(User).scalar_subquery()
+    )
+    comment_count = (
+        db.select(db.func.count()).where(Comment.author_id == User.id)
+        .correlate(User).scalar_subquery()
+    )
+    last_post = (
+        db.select(db.func.max(Post.created_at)).where(Post.author_id == User.id)
+        .correlate(User).scalar_subquery()
+    )
+    missing = (
+        db.select(User.id, post_count, comment_count, last_post)
+        .where(~db.exists().where(AuthorStats.user_id == User.id))
+    )
+    result = db.session.execute(
+        db.insert(AuthorStats).from_select(
+            ['user_id', 'post_count', 'comment_count', 'last_active_at'], missing
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _backfill_sharded():
+    """backfill 的分片版本：每个分片按作者 GROUP BY 一次，在内存中合并后插入主库"""
+    missing = set(db.session.execute(
+        db.select(User.id).where(~db.exists().where(AuthorStats.user_id == User.id))
+    ).scalars())
+    if not missing:
+        return 0
+
+    stats = {user_id: {'user_id': user_id, 'post_count': 0, 'comment_count': 0, 'last_active_at': None}
+             for user_id in missing}
+    for key in shards.targets:
+        with shards.use(key):
+            for author_id, count, last_post in db.session.execute(
+                db.select(Post.author_id, db.func.count(), db.func.max(Post.created_at)).group_by(Post.author_id)
+            ):
+                row = stats.get(author_id)
+                if row is None:
+                    continue
+                row['post_count'] += count
+                if last_post and (row['last_active_at'] is None or last_post > row['last_active_at']):
+                    row['last_active_at'] = last_post
+            for author_id, count in db.session.execute(
+                db.select(Comment.author_id, db.func.count()).group_by(Comment.author_id)
+            ):
+                if author_id in stats:
+                    stats[author_id]['comment_count'] += count
+
+    db.session.execute(db.insert(AuthorStats), list(stats.values()))
+    db.session.commit()
+    return len(stats)
@@ -0,0 +1,417 @@
+"""
+数据库导出 / 导入脚本（备份与环境复制，MySQL 和 SQLite 之间通用）
+
+导出：
+    python backup.py export <目录> [--tables users posts ...] [--batch 5000]
+
+    每张表导出为一个 <表名>.ndjson.gz，每行一个 JSON 对象（日期为 ISO 格式，二进制为 base64）。
+    按主键顺序分批读取（WHERE 主键 > 上一批最后一行 ORDER BY 主键 LIMIT n），边读边压缩写出，
+    内存占用和数据量无关；所有表在同一个只读事务（快照）中读取，导出的数据相互一致。
+    最后写入 manifest.json（表、列、行数），没有 manifest.json 的目录是未完成的导出，不能导入。
+    post_renders 默认不导出（导入后执行 python post_html.py 重新生成）。
+
+导入：
+    python backup.py import <目录> [--batch 5000]
+
+    1. 创建缺失的表；要导入的表必须为空（断点续传除外）
+    2. 关闭外键检查（SQLite: PRAGMA foreign_keys=OFF，MySQL: FOREIGN_KEY_CHECKS=0 / UNIQUE_CHECKS=0），
+       删除二级索引，按批 executemany 插入，每批单独提交
+    3. 每批提交后更新检查点文件（<目录>/import-checkpoint.json）；中断后重新执行同一条命令即可继续：
+       以目标表中已有的最大主键为准，跳过已导入的行
+    4. 全部导入后重建索引，SQLite 执行 PRAGMA foreign_key_check 报告外键问题，补建派生数据，删除检查点
+
+启用分片（SHARD_DATABASE_URLS）时不支持导出和导入：文章和评论分布在多个数据库中，
+需要时关闭分片导出 / 导入单库，再用 python sharding.py rebalance 分发到各分片。
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import time
+from datetime import datetime, date
+from models import db
+from sharding import shards
+import author_stats
+import change_feed
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+CHECKPOINT = 'import-checkpoint.json'
+
+# 可以随时重新生成的表，默认不导出
+DERIVED_TABLES = ('post_renders',)
+
+# 描述目标库自身状态的表，从不导出（schema_version 由导入时的 init_db 写入）
+LOCAL_TABLES = ('schema_version',)
+
+
+def table_file(name):
+    """表对应的导出文件名"""
+    return f'{name}.ndjson.gz'
+
+
+def _write_json(path, data):
+    """原子写入 JSON 文件（先写临时文件再改名，中断时不会留下半个文件）"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _encode(value):
+    """json.dumps 无法直接序列化的类型"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f'无法导出的类型: {type(value).__name__}')
+
+
+def _decoder(column):
+    """按列类型把 JSON 值还原成数据库写入的值"""
+    if isinstance(column.type, db.DateTime):
+        return datetime.fromisoformat
+    if isinstance(column.type, db.Date):
+        return date.fromisoformat
+    if isinstance(column.type, db.LargeBinary):
+        return base64.b64decode
+    return None
+
+
+def _after(pk_columns, last):
+    """
+    主键大于 last 的条件（游标分页）
+
+    复合主键展开成 a > x OR (a = x AND b > y)，比行构造器比较更容易用上主键索引。
+    """
+    condition = None
+    for i in reversed(range(len(pk_columns))):
+        clause = pk_columns[i] > last[i]
+        if condition is not None:
+            clause = db.or_(clause, db.and_(pk_columns[i] == last[i], condition))
+        condition = clause
+    return condition
+
+
+# ==================== 导出 ====================
+
+def _begin_snapshot(conn):
+    """在连接上开启一个一致性快照读事务"""
+    conn.begin()
+    dialect = conn.dialect.name
+    if dialect == 'mysql':
+        conn.exec_driver_sql('START TRANSACTION WITH CONSISTENT SNAPSHOT')
+    elif dialect == 'sqlite':
+        # pysqlite 默认不会为 SELECT 开启事务（开启了 SQLite 调优配置时已经由 BEGIN 开启）
+        dbapi_connection = conn.connection.dbapi_connection
+        if not dbapi_connection.in_transaction:
+            dbapi_connection.execute('BEGIN')
+
+
+def export_table(conn, table, path, batch_size):
+    """
+    按主键顺序把一张表写入 gzip 压缩的 NDJSON 文件
+
+    返回:
+        int: 导出的行数
+    """
+    pk_columns = list(table.primary_key.columns)
+    names = [column.name for column in table.columns]
+    rows = 0
+    last = None
+
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+        while True:
+            stmt = db.select(*table.columns).order_by(*pk_columns).limit(batch_size)
+            if last is not None:
+                stmt = stmt.where(_after(pk_columns, last))
+            batch = conn.execute(stmt).all()
+            if not batch:
+                break
+            for row in batch:
+                f.write(json.dumps(dict(zip(names, row)), ensure_ascii=False,
+                                   separators=(',', ':'), default=_encode))
+                f.write('\n')
+            rows += len(batch)
+            last = tuple(getattr(batch[-1], column.name) for column in pk_columns)
+    os.replace(tmp, path)
+    return rows
+
+
+def export_database(out_dir, tables=None, batch_size=5000):
+    """
+    导出数据库
+
+    参数:
+        out_dir:    导出目录
+        tables:     要导出的表名（默认除 DERIVED_TABLES 外的所有表；LOCAL_TABLES 总是跳过）
+        batch_size: 每批读取的行数
+
+    返回:
+        dict: manifest
+    """
+    if shards.enabled:
+        raise ValueError('启用分片时不支持导出（请关闭 SHARD_DATABASE_URLS 导出单库）')
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)  # 覆盖旧的导出：先作废旧的 manifest
+
+    selected = [
+        table for table in db.metadata.sorted_tables
+        if table.name not in LOCAL_TABLES
+        and (table.name in tables if tables else table.name not in DERIVED_TABLES)
+    ]
+    manifest = {
+        'format': 'blog-export',
+        'version': FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'source': db.engine.dialect.name,
+        'tables': []
+    }
+
+    with db.engine.connect() as conn:
+        _begin_snapshot(conn)
+        for table in selected:
+            started = time.perf_counter()
+            path = os.path.join(out_dir, table_file(table.name))
+            rows = export_table(conn, table, path, batch_size)
+            manifest['tables'].append({
+                'name': table.name,
+                'file': table_file(table.name),
+                'rows': rows,
+                'columns': [column.name for column in table.columns],
+                'primary_key': [column.name for column in table.primary_key.columns]
+            })
+            print(f"   ✓ {table.name}: {rows} 行，{os.path.getsize(path):,} 字节，"
+                  f"{time.perf_counter() - started:.1f} 秒")
+        conn.rollback()
+
+    _write_json(manifest_path, manifest)
+    return manifest
+
+
+# ==================== 导入 ====================
+
+def _read_rows(path):
+    """逐行读取导出文件"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _last_key(conn, table):
+    """目标表中最大的主键（断点续传的位置），空表返回 None"""
+    pk_columns = list(table.primary_key.columns)
+    row = conn.execute(
+        db.select(*pk_columns).order_by(*[column.desc() for column in pk_columns]).limit(1)
+    ).first()
+    return tuple(row) if row is not None else None
+
+
+def _disable_constraints(conn):
+    """关闭当前连接的外键检查（SQLite 的 PRAGMA 必须在事务外执行）"""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        conn.connection.dbapi_connection.execute('PRAGMA foreign_keys=OFF')
+    elif dialect == 'mysql':
+        conn.exec_driver_sql('SET FOREIGN_KEY_CHECKS=0, UNIQUE_CHECKS=0')
+        conn.commit()
+
+
+def import_table(conn, table, path, entry, batch_size, checkpoint, checkpoint_path):
+    """
+    把一个导出文件批量写入目标表，从目标表已有的最大主键之后继续
+
+    返回:
+        int: 本次写入的行数
+    """
+    columns = {column.name: column for column in table.columns}
+    unknown = [name for name in entry['columns'] if name not in columns]
+    if unknown:
+        raise ValueError(f'{table.name} 表没有这些列: {", ".join(unknown)}（请先升级目标库的表结构）')
+
+    decoders = [(name, decoder) for name, decoder in
+                ((name, _decoder(columns[name])) for name in entry['columns']) if decoder]
+    pk_names = entry['primary_key']
+    last = _last_key(conn, table)
+    conn.commit()
+
+    insert = table.insert()
+    progress = checkpoint['tables'].setdefault(table.name, {'rows': 0, 'done': False})
+    written = 0
+    batch = []
+
+    def flush():
+        nonlocal written
+        conn.execute(insert, batch)
+        conn.commit()
+        written += len(batch)
+        progress['rows'] = progress.get('rows', 0) + len(batch)
+        _write_json(checkpoint_path, checkpoint)
+        batch.clear()
+
+    for row in _read_rows(path):
+        if last is not None:
+            # 文件按主键有序：跳过已经导入的行，直到越过断点
+            if tuple(row[name] for name in pk_names) <= last:
+                continue
+            last = None
+        for name, decoder in decoders:
+            if row[name] is not None:
+                row[name] = decoder(row[name])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    progress['done'] = True
+    _write_json(checkpoint_path, checkpoint)
+    return written
+
+
+def import_database(in_dir, batch_size=5000):
+    """
+    导入 export_database 导出的数据
+
+    参数:
+        in_dir:     导出目录
+        batch_size: 每批写入的行数
+
+    返回:
+        dict: {表名: 本次写入的行数}
+    """
+    from sqlalchemy import inspect
+
+    if shards.enabled:
+        raise ValueError('启用分片时不支持导入（请先导入单库，再执行 python sharding.py rebalance）')
+    manifest_path = os.path.join(in_dir, MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f'{in_dir} 中没有 {MANIFEST}（导出未完成或目录不对）')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != 'blog-export' or manifest.get('version') != FORMAT_VERSION:
+        raise ValueError('不支持的导出格式')
+
+    checkpoint_path = os.path.join(in_dir, CHECKPOINT)
+    checkpoint = None
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('export_created_at') != manifest['created_at']:
+            raise ValueError(f'检查点属于另一次导出，请删除 {checkpoint_path} 后重新导入')
+        print(f"📝 从检查点继续导入")
+    resuming = checkpoint is not None
+    if checkpoint is None:
+        checkpoint = {'export_created_at': manifest['created_at'], 'tables': {}}
+
+    tables = db.metadata.tables
+    entries = [entry for entry in manifest['tables'] if entry['name'] in tables]
+    skipped = [entry['name'] for entry in manifest['tables'] if entry['name'] not in tables]
+    if skipped:
+        print(f"⚠️  目标库没有这些表，跳过: {', '.join(skipped)}")
+
+    db.create_all()
+    results = {}
+    with db.engine.connect() as conn:
+        try:
+            # 新导入要求目标表为空，避免和已有数据混在一起
+            if not resuming:
+                for entry in entries:
+                    if _last_key(conn, tables[entry['name']]) is not None:
+                        raise ValueError(f"目标表 {entry['name']} 不为空")
+                conn.commit()
+
+            _disable_constraints(conn)
+
+            # 删除二级索引，全部导入后再重建（逐行维护索引比一次性建索引慢得多）
+            existing = set()
+            for entry in entries:
+                existing.update(index['name'] for index in inspect(conn).get_indexes(entry['name']))
+            for entry in entries:
+                for index in tables[entry['name']].indexes:
+                    if index.name in existing:
+                        index.drop(bind=conn)
+            conn.commit()
+
+            for entry in entries:
+                if checkpoint['tables'].get(entry['name'], {}).get('done'):
+                    continue
+                started = time.perf_counter()
+                written = import_table(
+                    conn, tables[entry['name']], os.path.join(in_dir, entry['file']), entry,
+                    batch_size, checkpoint, checkpoint_path
+                )
+                results[entry['name']] = written
+                elapsed = time.perf_counter() - started
+                print(f"   ✓ {entry['name']}: 写入 {written} 行，{elapsed:.1f} 秒"
+                      f"（{written / elapsed if elapsed else 0:,.0f} 行/秒）")
+
+            started = time.perf_counter()
+            for entry in entries:
+                for index in tables[entry['name']].indexes:
+                    index.create(bind=conn)
+            conn.commit()
+            print(f"   ✓ 重建索引，{time.perf_counter() - started:.1f} 秒")
+
+            if conn.dialect.name == 'sqlite':
+                problems = conn.exec_driver_sql('PRAGMA foreign_key_check').all()
+                if problems:
+                    print(f"⚠️  外键检查发现 {len(problems)} 行引用了不存在的记录，例如: {problems[:5]}")
+        finally:
+            # 连接上关闭了外键检查，不能放回连接池给别的代码使用
+            conn.rollback()
+            conn.invalidate()
+
+    # 旧版本的导出没有作者统计、变更日志时补建
+    imported = {entry['name'] for entry in entries}
+    if 'author_stats' not in imported:
+        backfilled = author_stats.backfill()
+        if backfilled:
+            print(f"📝 补建作者统计: {backfilled} 个用户")
+    if 'change_log' not in imported:
+        backfilled = change_feed.backfill()
+        if backfilled:
+            print(f"📝 补建变更日志: {backfilled} 条")
+
+    # 导出中没有目标库认识的表时不会写检查点
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return results
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='数据库流式导出 / 批量导入')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help='导出为 gzip 压缩的 NDJSON')
+    export_parser.add_argument('directory', help='导出目录')
+    export_parser.add_argument('--tables', nargs='+', help=f'只导出指定的表（默认除 {", ".join(DERIVED_TABLES)} 外全部导出）')
+    export_parser.add_argument('--batch', type=int, default=5000, help='每批读取的行数')
+    import_parser = sub.add_parser('import', help='从导出目录导入（中断后重新执行即可续传）')
+    import_parser.add_argument('directory', help='导出目录')
+    import_parser.add_argument('--batch', type=int, default=5000, help='每批写入的行数')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            if args.command == 'export':
+                print(f"📦 导出到 {args.directory}")
+                manifest = export_database(args.directory, args.tables, args.batch)
+                total = sum(entry['rows'] for entry in manifest['tables'])
+                print(f"✅ 导出完成: {len(manifest['tables'])} 张表，{total} 行，"
+                      f"耗时 {time.perf_counter() - started:.1f} 秒")
+            else:
+                print(f"📥 从 {args.directory} 导入")
+                results = import_database(args.directory, args.batch)
+                print(f"✅ 导入完成: {sum(results.values())} 行，耗时 {time.perf_counter() - started:.1f} 秒")
+        except ValueError as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
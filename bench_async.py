@@ -0,0 +1,139 @@
+"""
+同步（Flask）与异步（ASGI）服务模式对比压测脚本
+
+只依赖标准库：用 asyncio 直接建立 HTTP/1.1 keep-alive 连接发请求。
+测试期间可以额外挂起一批空闲连接，观察服务端在大量空闲连接下的吞吐和延迟。
+
+使用方式：
+    # 终端 1：同步模式
+    python app.py
+    # 终端 2：异步模式
+    uvicorn asgi:app --port 8000
+    # 终端 3：对比压测
+    python bench_async.py --target wsgi=http://127.0.0.1:5000 --target asgi=http://127.0.0.1:8000 \\
+        --path /api/posts --concurrency 50 --requests 2000 --idle 1000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(reader, writer, host, path):
+    """在已建立的连接上发送一次 GET 请求，返回 (状态码, 连接是否可复用)"""
+    writer.write(
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: gzip\r\n\r\n'.encode('latin-1')
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('连接被关闭')
+    status = int(status_line.split()[1])
+
+    length = 0
+    keep_alive = not status_line.startswith(b'HTTP/1.0')
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            keep_alive = value == 'keep-alive'
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def worker(host, port, path, count, latencies, errors):
+    """单个并发连接：顺序发送 count 个请求"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                status, keep_alive = await fetch(reader, writer, f'{host}:{port}', path)
+                if status >= 400:
+                    errors.append(status)
+                if not keep_alive:
+                    # 服务端不支持长连接（如 Werkzeug 开发服务器），每次请求重新建连
+                    writer.close()
+                    reader, writer = await asyncio.open_connection(host, port)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append('conn')
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def open_idle(host, port, n):
+    """建立 n 个只连接不发请求的空闲连接"""
+    conns = []
+    for _ in range(n):
+        try:
+            conns.append(await asyncio.open_connection(host, port))
+        except OSError:
+            break
+    return conns
+
+
+async def bench(url, path, concurrency, total, idle):
+    """对一个服务地址压测，返回统计结果"""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+
+    idle_conns = await open_idle(host, port, idle)
+    latencies, errors = [], []
+    per_worker = max(total // concurrency, 1)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        worker(host, port, path, per_worker, latencies, errors) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    for _, writer in idle_conns:
+        writer.close()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+
+    return {
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50': pct(0.50),
+        'p99': pct(0.99),
+        'mean': statistics.mean(latencies) * 1000 if latencies else 0,
+        'errors': len(errors),
+        'idle': len(idle_conns)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步 / 异步服务模式对比压测')
+    parser.add_argument('--target', action='append', required=True, help='名称=地址，例如 asgi=http://127.0.0.1:8000')
+    parser.add_argument('--path', default='/api/posts')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--idle', type=int, default=0, help='压测期间额外挂起的空闲连接数')
+    args = parser.parse_args()
+
+    print(f'{"模式":<8}{"req/s":>10}{"p50(ms)":>10}{"p99(ms)":>10}{"mean(ms)":>10}{"错误":>8}{"空闲连接":>10}')
+    for target in args.target:
+        name, _, url = target.partition('=')
+        result = asyncio.run(bench(url, args.path, args.concurrency, args.requests, args.idle))
+        print(
+            f'{name:<8}{result["rps"]:>10.1f}{result["p50"]:>10.2f}{result["p99"]:>10.2f}'
+            f'{result["mean"]:>10.2f}{result["errors"]:>8}{result["idle"]:>10}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+SQLite 调优配置压测脚本
+
+对比默认 SQLite 配置（SQLITE_TUNED=0）和 sqlite_profile.py 的调优配置（SQLITE_TUNED=1）
+在并发读写下的吞吐、延迟和 "database is locked" 错误数。
+
+每种配置使用一个全新的数据库文件，启动 --processes 个进程、每个进程 --threads 个线程，
+直接通过 Flask test_client 调用接口（不经过网络），按 --write-ratio 的比例混合：
+    写：POST /api/posts/<id>/comments
+    读：GET /api/posts?page=N（带 Token，跳过匿名列表缓存）和 GET /api/posts/<id>/comments
+
+使用方式：
+    python bench_sqlite.py --processes 4 --threads 8 --duration 10 --write-ratio 0.2
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import threading
+
+PROFILES = {
+    'default': '0',
+    'tuned': '1'
+}
+
+
+def load_app(db_path, tuned):
+    """按指定配置导入应用（配置在导入时读取环境变量，所以必须在子进程中设置）"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['SQLITE_TUNED'] = tuned
+    os.environ['LOG_LEVEL'] = 'ERROR'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import logging
+    logging.disable(logging.INFO)
+    from app import create_app
+    return create_app()
+
+
+def setup(db_path, tuned, posts, queue):
+    """建表并准备数据：一个用户 + 若干文章，返回 Token"""
+    app = load_app(db_path, tuned)
+    from app import init_db
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db(app)
+
+    client = app.test_client()
+    client.post('/api/users/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Bench123456'
+    })
+    token = client.post('/api/users/login', json={
+        'username': 'bench', 'password': 'Bench123456'
+    }).get_json()['data']['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    for i in range(posts):
+        client.post('/api/posts', json={
+            'title': f'压测文章 {i}', 'content': '压测内容' * 20
+        }, headers=headers)
+    queue.put(token)
+
+
+def run_worker(db_path, tuned, token, threads, duration, write_ratio, posts, queue):
+    """单个进程：多个线程在 duration 秒内持续发请求"""
+    app = load_app(db_path, tuned)
+    headers = {'Authorization': f'Bearer {token}'}
+    deadline = time.monotonic() + duration
+    results = []
+
+    def loop():
+        client = app.test_client()
+        reads, writes, errors, latencies = 0, 0, 0, []
+        rng = random.Random()
+        while time.monotonic() < deadline:
+            post_id = rng.randint(1, posts)
+            is_write = rng.random() < write_ratio
+            start = time.perf_counter()
+            if is_write:
+                response = client.post(f'/api/posts/{post_id}/comments', json={'content': '压测评论'}, headers=headers)
+            elif rng.random() < 0.5:
+                response = client.get(f'/api/posts?page={rng.randint(1, 5)}&count=exact', headers=headers)
+            else:
+                response = client.get(f'/api/posts/{post_id}/comments')
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+            elif is_write:
+                writes += 1
+            else:
+                reads += 1
+        results.append((reads, writes, errors, latencies))
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    reads = sum(r[0] for r in results)
+    writes = sum(r[1] for r in results)
+    errors = sum(r[2] for r in results)
+    latencies = [latency for r in results for latency in r[3]]
+    queue.put((reads, writes, errors, latencies))
+
+
+def bench(name, args):
+    """压测一种配置，返回结果汇总"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench_sqlite_', dir=args.dir), f'{name}.db')
+    tuned = PROFILES[name]
+
+    process = ctx.Process(target=setup, args=(db_path, tuned, args.posts, queue))
+    process.start()
+    token = queue.get()
+    process.join()
+
+    processes = [
+        ctx.Process(target=run_worker, args=(
+            db_path, tuned, token, args.threads, args.duration, args.write_ratio, args.posts, queue
+        ))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for r in results for latency in r[3])
+    return {
+        'reads': sum(r[0] for r in results) / args.duration,
+        'writes': sum(r[1] for r in results) / args.duration,
+        'errors': sum(r[2] for r in results),
+        'p50': statistics.median(latencies) * 1000 if latencies else 0,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 默认配置与调优配置的并发读写压测')
+    parser.add_argument('--processes', type=int, default=4, help='进程数')
+    parser.add_argument('--threads', type=int, default=8, help='每个进程的线程数')
+    parser.add_argument('--duration', type=float, default=10, help='每种配置的压测时长（秒）')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='写请求比例')
+    parser.add_argument('--posts', type=int, default=200, help='预先创建的文章数')
+    parser.add_argument('--profile', action='append', choices=list(PROFILES), help='只压测指定配置（可重复）')
+    parser.add_argument('--dir', default=None, help='数据库文件所在目录（默认系统临时目录；tmpfs 上测不出 fsync 的差别）')
+    args = parser.parse_args()
+
+    print(f'{args.processes} 进程 × {args.threads} 线程，写比例 {args.write_ratio}，每种配置 {args.duration} 秒')
+    print(f'{"配置":<10}{"读/秒":>10}{"写/秒":>10}{"错误":>8}{"p50(ms)":>10}{"p99(ms)":>10}')
+    for name in args.profile or list(PROFILES):
+        result = bench(name, args)
+        print(f'{name:<10}{result["reads"]:>10.0f}{result["writes"]:>10.0f}{result["errors"]:>8}'
+              f'{result["p50"]:>10.1f}{result["p99"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+进程内缓存模块
+
+功能：
+    1. 匿名文章列表查询的响应缓存（按查询参数元组做 key，带 TTL）
+       以及文章列表总数的缓存（按过滤条件做 key，count=cached 模式使用）
+    2. 使用“代数（generation）计数器”整体失效：
+       - 任何文章写操作都会让全局代数 +1，所有未按作者过滤的缓存自动作废
+       - 每个作者还有自己的代数，按 author_id 过滤的列表只看该作者的代数，
+         其他作者发文不会让它失效
+    3. 超出容量时按 LRU 淘汰，内存有上限
+
+说明：
+    缓存是进程内的，多进程部署时其他进程要等 TTL 过期才能看到更新，
+    所以 TTL 应该设置得比较短（默认 30 秒）。
+
+使用方式：
+    from cache import list_cache
+
+    key = list_cache.make_key(params, author_id=author_id)
+    data = list_cache.get(key)
+    if data is None:
+        data = ...  # 查询数据库
+        list_cache.set(key, data)
+
+    # 文章写操作提交之后（同时让列表缓存和总数缓存失效）
+    invalidate_post_caches(author_id=post.author_id)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ListCache:
+    """带 TTL、LRU 容量上限和代数失效的进程内缓存"""
+
+    def __init__(self, ttl=30, max_entries=1024, config_prefix='LIST_CACHE'):
+        """
+        参数:
+            ttl:           缓存有效期（秒）
+            max_entries:   最多缓存的条目数
+            config_prefix: 配置项前缀（读取 <前缀>_TTL / <前缀>_MAX_ENTRIES / <前缀>_ENABLED）
+        """
+        self.config_prefix = config_prefix
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self._data = OrderedDict()
+        self._generation = 0
+        self._author_generations = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """从应用配置读取缓存参数"""
+        prefix = self.config_prefix
+        self.ttl = app.config.get(f'{prefix}_TTL', self.ttl)
+        self.max_entries = app.config.get(f'{prefix}_MAX_ENTRIES', self.max_entries)
+        self.enabled = app.config.get(f'{prefix}_ENABLED', True)
+        app.extensions[prefix.lower()] = self
+
+    def make_key(self, params, author_id=None):
+        """
+        生成缓存 key
+
+        参数:
+            params:    规范化后的查询参数元组
+            author_id: 按作者过滤时传入，使用该作者的代数
+
+        返回:
+            tuple: 缓存 key（包含当前代数，代数变化后旧 key 自然不再命中）
+        """
+        with self._lock:
+            if author_id:
+                generation = ('author', author_id, self._author_generations.get(author_id, 0))
+            else:
+                generation = ('all', self._generation)
+        return (generation, params)
+
+    def get(self, key):
+        """读取缓存，不存在或已过期返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, author_id=None):
+        """
+        文章写操作后调用：全局代数 +1，并让对应作者的代数 +1
+
+        参数:
+            author_id: 被修改文章的作者ID
+        """
+        with self._lock:
+            self._generation += 1
+            if author_id:
+                self._author_generations[author_id] = self._author_generations.get(author_id, 0) + 1
+
+    def clear(self):
+        """清空所有缓存"""
+        with self._lock:
+            self._data.clear()
+
+
+# 全局单例，在 create_app 中调用 list_cache.init_app(app) / count_cache.init_app(app)
+list_cache = ListCache()
+count_cache = ListCache(ttl=60, max_entries=4096, config_prefix='COUNT_CACHE')
+
+
+def invalidate_post_caches(author_id=None):
+    """文章写操作提交之后调用：列表缓存和总数缓存一起失效"""
+    list_cache.invalidate(author_id=author_id)
+    count_cache.invalidate(author_id=author_id)
@@ -0,0 +1,265 @@
+"""
+增量变更流模块（GET /api/changes?since=<游标>）
+
+镜像站、搜索索引之类的下游不再需要翻遍整个文章列表找变化：
+    1. 创建 / 修改 / 删除文章和评论时，在同一个事务里向 change_log 插入一行；自增 ID 就是游标。
+       未启用分片时变更记录和数据修改一起提交或一起回滚；启用分片时 change_log 在主库、数据在分片，
+       先提交分片再提交主库（见 sharding.ShardedSession.commit），主库提交失败会漏记这次修改，
+       但变更记录不会指向从未提交的数据
+    2. 删除是硬删除，change_log 中的 delete 记录就是墓碑；删除文章时它的每条评论也各有一条墓碑
+    3. 轮询只做一次主键范围扫描（WHERE id > since ORDER BY id LIMIT n），代价只和变化量有关
+    4. 未删除的对象附带当前数据（一次 IN 查询批量加载）；对象已经不存在（之后被删除）时 data 为 null
+
+提交顺序：
+    SQLite 的写事务由数据库锁串行化，ID 顺序就是提交顺序。MySQL 等数据库的并发事务可能
+    先分配到小 ID 却后提交，读取时表现为 ID 序列中的空洞：从游标开始 ID 连续的记录直接返回
+    （它们之前的 ID 都已提交），遇到空洞就停下，下次轮询再从这里继续。
+    空洞也可能是回滚的事务留下的、永远不会被填上，所以空洞之后的记录插入超过 CHANGE_FEED_SETTLE_SECONDS 秒后
+    不再等待：分配到 ID 之后超过这个时间才提交的事务会被跳过，这个时间要大于最长的写事务。
+
+浏览量、回复数等计数的变化不记录。
+升级时 init_db 为已有的文章和评论补建 create 记录，下游从 since=0 开始即可完整同步。
+启用分片时 change_log 在主库，对象的当前数据按所在的分片分组加载。
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import selectinload, undefer
+from models import db, ChangeLog, Post, Comment
+from exceptions import BadRequestError
+from sharding import shards, merge
+
+ENTITIES = ('post', 'comment')
+
+# 每次轮询返回的最大记录数
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def settle_seconds():
+    """ID 空洞最多等待的时间（未配置时 SQLite 为 0，其他数据库为 30 秒）"""
+    value = current_app.config.get('CHANGE_FEED_SETTLE_SECONDS')
+    if value is None:
+        return 0 if db.engine.dialect.name == 'sqlite' else 30
+    return value
+
+
+# ==================== 记录 ====================
+
+def record(entity, entity_id, action, post_id=None):
+    """
+    记录一次变更（调用方负责提交事务）
+
+    参数:
+        entity:    post / comment
+        entity_id: 文章或评论ID
+        action:    create / update / delete
+        post_id:   评论所属的文章ID（文章不用传）
+    """
+    db.session.add(ChangeLog(
+        entity=entity, entity_id=entity_id, action=action,
+        post_id=post_id if post_id is not None else entity_id
+    ))
+
+
+def record_deletes(entity, ids, post_id):
+    """批量记录删除（调用方负责提交事务）"""
+    if ids:
+        now = datetime.now()
+        db.session.execute(db.insert(ChangeLog), [
+            {'entity': entity, 'entity_id': entity_id, 'action': 'delete', 'post_id': post_id, 'created_at': now}
+            for entity_id in ids
+        ])
+
+
+def backfill():
+    """
+    change_log 为空时为已有的文章和评论补建 create 记录（init_db 时调用）
+
+    返回:
+        int: 补建的记录数
+    """
+    if db.session.execute(db.select(ChangeLog.id).limit(1)).first() is not None:
+        return 0
+    columns = ['entity', 'entity_id', 'action', 'post_id', 'created_at']
+    now = datetime.now()
+    if shards.enabled:
+        return _backfill_sharded(columns, now)
+    total = 0
+    # 先文章后评论，回放时评论所属的文章总是已经出现过
+    for entity, table in (('post', Post.__table__), ('comment', Comment.__table__)):
+        post_id = table.c.id if entity == 'post' else table.c.post_id
+        result = db.session.execute(db.insert(ChangeLog).from_select(columns, (
+            db.select(db.literal(entity), table.c.id, db.literal('create'), post_id,
+                      db.func.coalesce(table.c.created_at, now))
+            .order_by(table.c.id)
+        )))
+        total += result.rowcount
+    db.session.commit()
+    return total
+
+
+def _backfill_sharded(columns, now):
+    """backfill 的分片版本：逐个分片读出文章和评论，按ID归并后插入主库"""
+    total = 0
+    for entity, model in (('post', Post), ('comment', Comment)):
+        post_id = model.id if entity == 'post' else model.post_id
+        results = []
+        for key in shards.targets:
+            with shards.use(key):
+                results.append(db.session.execute(
+                    db.select(model.id, post_id, model.created_at).order_by(model.id)
+                ).all())
+        rows = [
+            dict(zip(columns, (entity, entity_id, 'create', owner_id, created_at or now)))
+            for entity_id, owner_id, created_at in merge(results, key=lambda row: row[0])
+        ]
+        if rows:
+            db.session.execute(db.insert(ChangeLog), rows)
+        total += len(rows)
+    db.session.commit()
+    return total
+
+
+# ==================== 读取 ====================
+
+def parse_changes_args(args):
+    """
+    解析 GET /api/changes 的查询参数
+
+    返回:
+        dict: since / limit / types
+    """
+    since = args.get('since', '0')
+    if not since.isdigit():
+        raise BadRequestError('since 必须是非负整数（上一次返回的 next_cursor）')
+
+    limit = args.get('limit', DEFAULT_LIMIT, type=int)
+    limit = min(max(limit, 1), MAX_LIMIT)
+
+    types = ENTITIES
+    if args.get('types'):
+        types = tuple(name.strip() for name in args.get('types').split(',') if name.strip())
+        if not types or any(name not in ENTITIES for name in types):
+            raise BadRequestError('types 只能是 post、comment，多个用逗号分隔')
+    return {'since': int(since), 'limit': limit, 'types': types}
+
+
+def _load_data(changes):
+    """批量加载变更对象的当前数据：{(类型, ID): dict}，已经不存在的对象不在结果中"""
+    wanted = {entity: {c.entity_id for c in changes if c.entity == entity and c.action != 'delete'}
+              for entity in ENTITIES}
+    # 评论按所属文章定位分片（变更记录中带有 post_id）
+    comments_by_post = {}
+    for c in changes:
+        if c.entity == 'comment' and c.entity_id in wanted['comment']:
+            comments_by_post.setdefault(c.post_id, set()).add(c.entity_id)
+
+    def load_posts(post_ids):
+        posts = db.session.execute(
+            db.select(Post).where(Post.id.in_(post_ids))
+            .options(selectinload(Post.tags), undefer(Post.content_blob))
+        ).scalars()
+        return [(('post', post.id), post.to_dict()) for post in posts]
+
+    def load_comments(post_ids):
+        comment_ids = set().union(*(comments_by_post[post_id] for post_id in post_ids))
+        comments = db.session.execute(
+            db.select(Comment).where(Comment.id.in_(comment_ids))
+        ).scalars()
+        return [(('comment', comment.id), comment.to_dict()) for comment in comments]
+
+    data = {}
+    for items in shards.fan_out_posts(wanted['post'], load_posts):
+        data.update(items)
+    for items in shards.fan_out_posts(comments_by_post, load_comments):
+        data.update(items)
+    return data
+
+
+def _readable(rows, after, cutoff):
+    """
+    rows（(ID, 插入时间)，按 ID 升序）中可以读取的前几条：遇到 ID 空洞且空洞之后的记录还没过等待时间就停下
+
+    参数:
+        rows:   (ID, created_at) 列表
+        after:  rows 之前最后一个已读的 ID
+        cutoff: 插入早于这个时间的记录之前的空洞不再等待
+
+    返回:
+        int: 可以读取的条数
+    """
+    expected = after + 1
+    for i, (change_id, created_at) in enumerate(rows):
+        if change_id != expected and created_at > cutoff:
+            return i
+        expected = change_id + 1
+    return len(rows)
+
+
+def read_log(since, limit):
+    """
+    按 ID 顺序读取游标之后的变更记录，停在还没提交的 ID 空洞之前
+
+    返回:
+        (list, bool): (ChangeLog 列表, 现在是否还有更多可读的记录)
+    """
+    rows = db.session.execute(
+        db.select(ChangeLog).where(ChangeLog.id > since).order_by(ChangeLog.id).limit(limit + 1)
+    ).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    settle = settle_seconds()
+    if settle and rows:
+        cutoff = datetime.now() - timedelta(seconds=settle)
+        count = _readable([(row.id, row.created_at) for row in rows], since, cutoff)
+        if count < len(rows):
+            # 空洞之后的记录要等下一次轮询，has_more 为 False 表示现在没有更多可读的了
+            return rows[:count], False
+    return rows, has_more
+
+
+def settled_head():
+    """
+    当前可以读到的最新位置：从这里开始读取不会跳过已提交或在等待时间内提交的记录
+
+    只看最近的 200 条记录（更早的空洞视为已经过了等待时间），不扫描全表。
+    """
+    rows = db.session.execute(
+        db.select(ChangeLog.id, ChangeLog.created_at).order_by(ChangeLog.id.desc()).limit(200)
+    ).all()
+    if not rows:
+        return 0
+    rows.reverse()
+    cutoff = datetime.now() - timedelta(seconds=settle_seconds())
+    return rows[_readable(rows[1:], rows[0].id, cutoff)].id
+
+
+def fetch_changes(since, limit, types=ENTITIES):
+    """
+    读取游标之后的变更
+
+    types 只过滤返回结果，游标照样越过其他类型的记录，只订阅一种类型时也不会重复扫描。
+
+    参数:
+        since: 上一次返回的 next_cursor（0 表示从头开始）
+        limit: 最多扫描的记录数
+        types: 要返回的对象类型
+
+    返回:
+        dict: changes / next_cursor / has_more
+    """
+    rows, has_more = read_log(since, limit)
+    next_cursor = rows[-1].id if rows else since
+    rows = [row for row in rows if row.entity in types]
+    data = _load_data(rows)
+
+    changes = []
+    for row in rows:
+        change = row.to_dict()
+        # 删除记录没有数据；create / update 的对象已被删除时也没有（墓碑在之后的记录里）
+        change['data'] = None
+        if row.action != 'delete':
+            change['data'] = data.get((row.entity, row.entity_id))
+        changes.append(change)
+    return {'changes': changes, 'next_cursor': next_cursor, 'has_more': has_more}
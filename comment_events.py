@@ -0,0 +1,401 @@
+"""
+评论实时推送模块（Server-Sent Events）
+
+GET /api/posts/<id>/comments/stream 保持一个长连接，新评论、评论修改和删除实时推送给页面，
+评论区不再需要反复轮询整个评论列表。
+
+事件来源：
+    1. 评论的写操作在同一个事务里写入 change_log（见 change_feed.py），记录 ID 就是 SSE 的事件 ID，
+       所有进程共用同一套 ID，断线后带 Last-Event-ID 重连到任何一个进程都能接着推送
+    2. 每个进程一个后台分发线程：按 ID 增量读取 change_log（每个周期一条主键范围查询，和订阅数无关），
+       只为有订阅者的文章加载评论数据，放进各订阅者的队列
+    3. 本进程的写操作提交后调用 publish() 立即唤醒分发线程；其他进程写入的评论
+       在 SSE_POLL_INTERVAL 秒内被轮询到。多个 worker 之间不需要额外的消息服务，
+       数据库中的 change_log 就是它们共用的消息代理
+    4. 没有订阅者时分发线程自动退出，不产生任何查询
+
+连接管理：
+    - 每个进程最多 SSE_MAX_SUBSCRIBERS 个连接，超出返回 503（未配置时的默认值见下）
+    - 空闲时每 SSE_HEARTBEAT_INTERVAL 秒发送一行注释（": ping"），防止代理断开空闲连接，也能及时发现已断开的客户端
+    - 连接最长保持 SSE_MAX_DURATION 秒，之后由浏览器自动带 Last-Event-ID 重连（释放 WSGI 线程）
+    - 断线期间错过的事件超过 SSE_REPLAY_LIMIT 条时发送 reset 事件，页面应重新拉取评论列表
+
+WSGI（gunicorn gthread）模式下每个连接占用一个线程，未配置 SSE_MAX_SUBSCRIBERS 时上限为 WEB_THREADS - 1，
+至少留一个线程处理普通请求（WEB_THREADS 为 1 时不接受推送连接）；ASGI 模式（asgi.py 原生异步推送，
+不占用线程）下默认 1000。连接数较多时使用 ASGI 模式。
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from sqlalchemy.orm import selectinload
+from models import db, ChangeLog, Comment
+from exceptions import BadRequestError, ServiceUnavailableError
+from sharding import shards
+import change_feed
+
+# 每次分发最多读取的变更记录数
+DISPATCH_BATCH = 500
+
+# ASGI 模式下默认的最大连接数（每个连接只是一个协程）
+ASYNC_MAX_SUBSCRIBERS = 1000
+
+
+def format_event(event):
+    """把事件编码成 SSE 文本"""
+    data = json.dumps(event['data'], ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+def parse_last_event_id(header, query=None):
+    """
+    解析断线续传的位置（浏览器重连时带 Last-Event-ID 请求头，首次连接可以用 last_event_id 查询参数）
+
+    返回:
+        int 或 None: 最后收到的事件 ID，没有时返回 None
+    """
+    value = header or query
+    if not value:
+        return None
+    value = value.strip()
+    if not value.isdigit():
+        raise BadRequestError('Last-Event-ID 必须是非负整数')
+    return int(value)
+
+
+class Subscription:
+    """
+    一个 SSE 连接的订阅
+
+    同步连接（WSGI）使用线程安全队列；异步连接（ASGI）使用事件循环中的 asyncio.Queue，
+    分发线程通过 call_soon_threadsafe 投递。
+    """
+
+    def __init__(self, post_id, loop=None):
+        self.post_id = post_id
+        self.last_id = 0
+        self._loop = loop
+        self._queue = asyncio.Queue() if loop is not None else queue.SimpleQueue()
+
+    def put(self, event):
+        """分发线程调用：投递一个事件"""
+        if self._loop is None:
+            self._queue.put(event)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    def accept(self, event):
+        """事件是否需要发送（补发和实时推送可能重叠，ID 不大于已发送的跳过）"""
+        if event['id'] <= self.last_id:
+            return False
+        self.last_id = event['id']
+        return True
+
+    def get(self, timeout):
+        """同步等待下一个事件，超时返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def get_async(self, timeout):
+        """异步等待下一个事件，超时返回 None"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class CommentEvents:
+    """进程内的评论事件订阅与分发"""
+
+    def __init__(self, max_subscribers=None, heartbeat_interval=15, poll_interval=1.0,
+                 replay_limit=500, max_duration=300, web_threads=4):
+        self.max_subscribers = max_subscribers
+        self.web_threads = web_threads
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.replay_limit = replay_limit
+        self.max_duration = max_duration
+        self.app = None
+        self._subscribers = {}  # 文章ID -> set(Subscription)
+        self._count = 0
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """读取配置"""
+        self.app = app
+        self.max_subscribers = app.config.get('SSE_MAX_SUBSCRIBERS', self.max_subscribers)
+        self.heartbeat_interval = app.config.get('SSE_HEARTBEAT_INTERVAL', self.heartbeat_interval)
+        self.poll_interval = app.config.get('SSE_POLL_INTERVAL', self.poll_interval)
+        self.replay_limit = app.config.get('SSE_REPLAY_LIMIT', self.replay_limit)
+        self.max_duration = app.config.get('SSE_MAX_DURATION', self.max_duration)
+        self.web_threads = app.config.get('WEB_THREADS', self.web_threads)
+        app.extensions['comment_events'] = self
+
+    @property
+    def subscriber_count(self):
+        """本进程当前的连接数"""
+        return self._count
+
+    def limit(self, asynchronous=False):
+        """
+        本进程允许的最大连接数
+
+        参数:
+            asynchronous: 是否为 ASGI 模式（连接不占用线程）
+
+        返回:
+            int: 配置了 SSE_MAX_SUBSCRIBERS 时为配置值；否则 ASGI 模式为 ASYNC_MAX_SUBSCRIBERS，
+                 WSGI 模式为 WEB_THREADS - 1
+        """
+        if self.max_subscribers is not None:
+            return self.max_subscribers
+        if asynchronous:
+            return ASYNC_MAX_SUBSCRIBERS
+        return max(self.web_threads - 1, 0)
+
+    # ==================== 订阅 ====================
+
+    def open(self, post_id, last_event_id=None, loop=None):
+        """
+        订阅一篇文章的评论事件（需要应用上下文）
+
+        登记订阅和记下分发位置在同一把锁内完成（不会与一轮分发交错）：
+        分发位置之前错过的事件从数据库补发，之后的由分发线程推送，不会遗漏也不会重复。
+
+        参数:
+            post_id:       文章ID
+            last_event_id: 客户端最后收到的事件 ID（None 表示只接收之后的新事件）
+            loop:          ASGI 模式下的事件循环
+
+        返回:
+            (Subscription, list): (订阅, 需要先补发的事件)
+        """
+        subscription = Subscription(post_id, loop)
+        limit = self.limit(asynchronous=loop is not None)
+        with self._dispatch_lock:
+            with self._lock:
+                if self._count >= limit:
+                    raise ServiceUnavailableError('实时推送连接数已满，请稍后重试')
+                self._subscribers.setdefault(post_id, set()).add(subscription)
+                self._count += 1
+            try:
+                self._ensure_thread()
+            except Exception:
+                self.close(subscription)
+                raise
+            head = self._cursor
+        try:
+            if last_event_id is None or last_event_id >= head:
+                subscription.last_id = head if last_event_id is None else last_event_id
+                return subscription, []
+            subscription.last_id = last_event_id
+            return subscription, self.replay(post_id, last_event_id, head)
+        except Exception:
+            self.close(subscription)
+            raise
+
+    def close(self, subscription):
+        """取消订阅（连接结束时调用）"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.post_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.post_id]
+            self._count -= 1
+
+    def replay(self, post_id, last_event_id, head):
+        """
+        读取断线期间错过的事件（last_event_id, head]，head 之后的由分发线程推送
+
+        返回:
+            list: 事件列表；错过的太多时只返回一个 reset 事件
+        """
+        rows = db.session.execute(
+            db.select(ChangeLog)
+            .where(ChangeLog.post_id == post_id, ChangeLog.id > last_event_id, ChangeLog.id <= head)
+            .order_by(ChangeLog.id)
+            .limit(self.replay_limit + 1)
+        ).scalars().all()
+        if len(rows) > self.replay_limit:
+            return [{'id': head, 'event': 'reset', 'post_id': post_id, 'data': {'post_id': post_id}}]
+        return self._build_events(rows)
+
+    def publish(self, post_id):
+        """
+        评论写操作提交后调用：通知分发线程立即读取新事件
+
+        事件本身从 change_log 读取（和其他进程写入的评论走同一条路径，保证顺序一致），
+        这里只负责唤醒；这篇文章在本进程没有订阅者时什么也不做。
+        """
+        if post_id in self._subscribers:
+            self._wakeup.set()
+
+    # ==================== 分发 ====================
+
+    def _ensure_thread(self):
+        """按需启动分发线程（fork 出的子进程会重新启动自己的线程）"""
+        pid = os.getpid()
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+        # 从当前位置开始分发（需要应用上下文；调用方持有分发锁，分发线程不会同时运行）
+        cursor = change_feed.settled_head()
+        with self._lock:
+            self._pid = pid
+            self._cursor = cursor
+            self._thread = threading.Thread(target=self._run, name='comment-events', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """后台线程：被唤醒或每个轮询周期读取一次新事件；没有订阅者时退出"""
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                with self._dispatch_lock, self.app.app_context():
+                    self.dispatch()
+            except Exception as e:
+                self.app.logger.error(f'评论事件分发失败: {str(e)}')
+                time.sleep(self.poll_interval)
+
+    def dispatch(self):
+        """
+        读取 change_log 中的新记录，推送给订阅了对应文章的连接
+
+        返回:
+            int: 推送的事件数
+        """
+        delivered = 0
+        while True:
+            rows, has_more = change_feed.read_log(self._cursor, DISPATCH_BATCH)
+            if not rows:
+                break
+            with self._lock:
+                watched = set(self._subscribers)
+            events = self._build_events([row for row in rows if row.post_id in watched])
+            self._cursor = rows[-1].id
+            for event in events:
+                with self._lock:
+                    subscribers = list(self._subscribers.get(event['post_id'], ()))
+                for subscription in subscribers:
+                    subscription.put(event)
+                    delivered += 1
+            if not has_more:
+                break
+        return delivered
+
+    @staticmethod
+    def _build_events(rows):
+        """
+        把变更记录转换成事件（评论的新增和修改附带当前数据，一次 IN 查询加载；
+        启用分片时按文章所在的分片分组加载）
+
+        新增和修改的评论已经不存在时（之后被删除）不生成事件，页面随后会收到删除事件。
+        """
+        ids_by_post = {}
+        for row in rows:
+            if row.entity == 'comment' and row.action != 'delete':
+                ids_by_post.setdefault(row.post_id, set()).add(row.entity_id)
+
+        def load(post_ids):
+            ids = set().union(*(ids_by_post[post_id] for post_id in post_ids))
+            return {
+                comment.id: comment.to_dict(include_author=True)
+                for comment in db.session.execute(
+                    db.select(Comment).where(Comment.id.in_(ids)).options(selectinload(Comment.author))
+                ).scalars()
+            }
+
+        comments = {}
+        for loaded in shards.fan_out_posts(ids_by_post, load):
+            comments.update(loaded)
+
+        events = []
+        for row in rows:
+            if row.entity == 'comment':
+                comment = None
+                if row.action != 'delete':
+                    comment = comments.get(row.entity_id)
+                    if comment is None:
+                        continue
+                data = {'action': row.action, 'comment_id': row.entity_id, 'post_id': row.post_id,
+                        'comment': comment}
+                events.append({'id': row.id, 'event': 'comment', 'post_id': row.post_id, 'data': data})
+            elif row.action == 'delete':
+                # 文章被删除：推送后结束连接
+                events.append({'id': row.id, 'event': 'post_deleted', 'post_id': row.post_id,
+                               'data': {'post_id': row.post_id}})
+        return events
+
+    # ==================== 输出 ====================
+
+    def stream(self, subscription, backlog):
+        """
+        同步事件流（WSGI），生成 SSE 文本块；客户端断开或流结束时取消订阅
+        """
+        try:
+            yield 'retry: 3000\n\n'
+            for event in self._backlog(subscription, backlog):
+                yield format_event(event)
+                if event['event'] == 'post_deleted':
+                    return
+            deadline = time.monotonic() + self.max_duration
+            while time.monotonic() < deadline:
+                event = subscription.get(min(self.heartbeat_interval, max(deadline - time.monotonic(), 0)))
+                if event is None:
+                    yield ': ping\n\n'
+                elif subscription.accept(event):
+                    yield format_event(event)
+                    if event['event'] == 'post_deleted':
+                        return
+        finally:
+            self.close(subscription)
+
+    async def stream_async(self, subscription, backlog):
+        """异步事件流（ASGI），调用方负责在结束时调用 close()"""
+        yield 'retry: 3000\n\n'
+        for event in self._backlog(subscription, backlog):
+            yield format_event(event)
+            if event['event'] == 'post_deleted':
+                return
+        deadline = time.monotonic() + self.max_duration
+        while time.monotonic() < deadline:
+            event = await subscription.get_async(min(self.heartbeat_interval, max(deadline - time.monotonic(), 0)))
+            if event is None:
+                yield ': ping\n\n'
+            elif subscription.accept(event):
+                yield format_event(event)
+                if event['event'] == 'post_deleted':
+                    return
+
+    @staticmethod
+    def _backlog(subscription, backlog):
+        """补发的事件中需要发送的部分"""
+        for event in backlog:
+            if event['event'] == 'reset':
+                subscription.last_id = event['id']
+                yield event
+            elif subscription.accept(event):
+                yield event
+
+
+# 全局单例，在 create_app 中调用 comment_events.init_app(app)
+comment_events = CommentEvents()
@@ -0,0 +1,226 @@
+"""
+评论回复（楼中楼）模块
+
+表示方式：物化路径（见 models.Comment）
+    path = 各级祖先ID + 自身ID，每段固定 10 位、以 / 结尾
+    - 子树查询：root_id = ? AND path >= P AND path < P'（P' 把 P 末尾的 / 换成 0，
+      因为 '/' 的 ASCII 码紧挨在 '0' 前面），一次索引范围扫描，不需要递归
+    - 深度限制：再加 depth <= ? 即可
+    - 祖先：直接从 path 解析，不需要查库
+
+reply_count 是每条评论的子孙回复数，新增/删除回复时对所有祖先做一次
+UPDATE ... WHERE id IN (...)，读取线程时不需要 COUNT。
+"""
+from flask import current_app
+from sqlalchemy.orm import selectinload
+from models import db, Comment
+
+# path 中每段ID的位数
+PATH_WIDTH = 10
+
+
+def path_segment(comment_id):
+    """单个评论在 path 中的一段"""
+    return f'{comment_id:0{PATH_WIDTH}d}/'
+
+
+def ancestor_ids(path):
+    """从 path 解析出所有祖先ID（从顶层评论开始，不含自身）"""
+    return [int(segment) for segment in path.split('/') if segment][:-1]
+
+
+def max_depth():
+    """允许的最大回复层级（path 列长度 255，每层 11 个字符）"""
+    return current_app.config.get('COMMENT_MAX_DEPTH', 8)
+
+
+def _fill_legacy_path(comment):
+    """补齐之前的老评论（path 为空）都是没有回复的顶层评论：就地写上层级信息"""
+    if comment.path is None:
+        comment.root_id = comment.id
+        comment.path = path_segment(comment.id)
+        comment.depth = 0
+
+
+def attach_reply(comment, parent=None):
+    """
+    为新评论填写层级信息，并给所有祖先的回复数 +1（调用方负责提交事务）
+
+    参数:
+        comment: 已 flush（有 id）的 Comment 对象
+        parent:  父评论（顶层评论传 None；path 为空的老评论会先补上层级信息）
+    """
+    if parent is None:
+        _fill_legacy_path(comment)
+        return
+
+    _fill_legacy_path(parent)
+    comment.parent_id = parent.id
+    comment.root_id = parent.root_id
+    comment.path = parent.path + path_segment(comment.id)
+    comment.depth = parent.depth + 1
+    _adjust_reply_counts(ancestor_ids(comment.path), 1)
+
+
+def _adjust_reply_counts(comment_ids, delta):
+    """批量调整回复数"""
+    if not comment_ids:
+        return
+    db.session.execute(
+        db.update(Comment)
+        .where(Comment.id.in_(comment_ids))
+        .values(reply_count=Comment.reply_count + delta),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def subtree_filter(comment, depth=None):
+    """
+    某条评论整个子树（含自身）的查询条件
+
+    参数:
+        comment: Comment 对象
+        depth:   相对该评论最多向下取几层（None 表示不限）
+    """
+    if comment.path is None:
+        # 还没有补齐层级信息的老评论不会有回复，子树就是它自己
+        return Comment.id == comment.id
+    conditions = [
+        Comment.root_id == comment.root_id,
+        Comment.path >= comment.path,
+        Comment.path < comment.path[:-1] + '0'
+    ]
+    if depth is not None:
+        conditions.append(Comment.depth <= comment.depth + depth)
+    return db.and_(*conditions)
+
+
+def delete_subtree(comment):
+    """
+    删除评论及其所有回复，并扣减祖先的回复数（调用方负责提交事务）
+
+    返回:
+        list: 被删除评论的 (评论ID, 评论者ID, 创建时间)，用于记录墓碑、扣减作者统计和文章热度
+    """
+    deleted = db.session.execute(
+        db.select(Comment.id, Comment.author_id, Comment.created_at).where(subtree_filter(comment))
+    ).all()
+
+    if comment.path is not None:
+        _adjust_reply_counts(ancestor_ids(comment.path), -len(deleted))
+    db.session.execute(
+        db.delete(Comment).where(subtree_filter(comment)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.expunge(comment)
+    return deleted
+
+
+def build_tree(comments, author=None):
+    """
+    把按 path 排序的评论列表组装成嵌套结构
+
+    父评论不在列表中的评论作为顶层节点返回。
+
+    返回:
+        list: 评论字典列表，每个字典带 replies 字段
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        node = comment.to_dict(include_author=True, author=author)
+        node['replies'] = []
+        nodes[comment.id] = node
+        parent = nodes.get(comment.parent_id)
+        if parent is not None:
+            parent['replies'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+def load_subtree(comment, depth=None):
+    """取出一条评论的子树（一次范围查询），返回嵌套结构的根节点"""
+    comments = db.session.execute(
+        db.select(Comment)
+        .where(subtree_filter(comment, depth))
+        .order_by(Comment.path)
+        .options(selectinload(Comment.author))
+    ).scalars().all()
+    return build_tree(comments)[0]
+
+
+def load_threads(post_id, page, per_page, depth=None):
+    """
+    按顶层评论分页读取文章的评论线程
+
+    一次分页查询取出当前页的顶层评论，再用一次 root_id IN (...) 查询
+    取出这些线程内的所有回复（按 root_id, path 走索引）。
+
+    参数:
+        post_id:  文章ID
+        page:     页码
+        per_page: 每页的顶层评论数
+        depth:    每个线程最多展开几层回复（None 表示不限，0 表示只要顶层评论）
+
+    返回:
+        (list, Pagination): (嵌套结构的线程列表, 顶层评论分页对象)
+    """
+    pagination = db.paginate(
+        db.select(Comment)
+        .where(Comment.post_id == post_id, Comment.depth == 0)
+        .order_by(Comment.id.desc())
+        .options(selectinload(Comment.author)),
+        page=page,
+        per_page=per_page,
+        error_out=False
+    )
+    roots = pagination.items
+
+    replies = []
+    if roots and depth != 0:
+        stmt = (
+            db.select(Comment)
+            .where(Comment.root_id.in_([root.id for root in roots]), Comment.depth > 0)
+            .order_by(Comment.root_id, Comment.path)
+            .options(selectinload(Comment.author))
+        )
+        if depth is not None:
+            stmt = stmt.where(Comment.depth <= depth)
+        replies = db.session.execute(stmt).scalars().all()
+
+    # 顶层评论按新到旧，线程内的回复按时间先后（path 顺序）
+    by_root = {}
+    for reply in replies:
+        by_root.setdefault(reply.root_id, []).append(reply)
+
+    threads = []
+    for root in roots:
+        threads.extend(build_tree([root] + by_root.get(root.id, [])))
+    return threads, pagination
+
+
+def backfill_paths(batch_size=1000):
+    """
+    为引入回复功能之前的旧评论补齐层级信息（旧评论都是顶层评论）
+
+    返回:
+        int: 补齐的评论数
+    """
+    table = Comment.__table__
+    total = 0
+    while True:
+        ids = db.session.execute(
+            db.select(table.c.id).where(table.c.path.is_(None)).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(
+            db.update(table)
+            .where(table.c.id == db.bindparam('cid'))
+            .values(root_id=db.bindparam('cid'), path=db.bindparam('cpath'), depth=0),
+            [{'cid': comment_id, 'cpath': path_segment(comment_id)} for comment_id in ids]
+        )
+        db.session.commit()
+        total += len(ids)
+    return total
@@ -0,0 +1,227 @@
+"""
+文章内容压缩迁移脚本
+
+按文章ID分批扫描未压缩的文章，把超过阈值的内容按 content_store 的规则压缩存储，
+每批单独提交、批与批之间可以暂停，适合在服务运行期间放在后台慢慢跑：
+    nohup python compress_content.py --pause 0.2 &
+
+其他用法：
+    python compress_content.py --stats             只输出压缩统计
+    python compress_content.py --codec lzma        指定压缩算法（默认使用 CONTENT_COMPRESSION，未配置时用 zlib）
+    python compress_content.py --decompress        全部还原为原文存储（关闭压缩前使用）
+
+并发安全：
+    更新时带上 content = 读取时的原文、content_codec IS NULL 作为条件，
+    扫描期间被用户修改过的文章不会被旧内容覆盖（下次运行时再处理）；
+    同时显式保持 updated_at 不变，迁移不算修改文章。
+"""
+import argparse
+import time
+from models import db, Post
+from content_store import content_store, CODECS
+from sharding import shards
+
+
+def byte_length(column):
+    """列的字节数（SQLite 的 length() 对文本返回字符数，需要先转成 BLOB）"""
+    if db.session.get_bind(Post).dialect.name == 'sqlite':
+        return db.func.length(db.cast(column, db.LargeBinary))
+    return db.func.length(column)
+
+
+def content_stats():
+    """
+    统计压缩存储节省的空间
+
+    返回:
+        dict: 文章总数、压缩的文章数、压缩文章的原文字节数 / 实际存储字节数 / 节省字节数、各算法的文章数
+    """
+    table = Post.__table__
+    compressed = table.c.content_codec.isnot(None)
+    total, count, original, stored = db.session.execute(
+        db.select(
+            db.func.count(),
+            db.func.count(table.c.content_codec),
+            db.func.sum(db.case((compressed, table.c.content_size), else_=0)),
+            db.func.sum(db.case(
+                (compressed, db.func.length(table.c.content_blob) + byte_length(table.c.content)),
+                else_=0
+            ))
+        )
+    ).one()
+    codecs = db.session.execute(
+        db.select(table.c.content_codec, db.func.count())
+        .where(compressed)
+        .group_by(table.c.content_codec)
+    ).all()
+
+    original, stored = int(original or 0), int(stored or 0)
+    return {
+        'posts': total,
+        'compressed_posts': count,
+        'original_bytes': original,
+        'stored_bytes': stored,
+        'saved_bytes': original - stored,
+        'ratio': round(stored / original, 3) if original else None,
+        'codecs': {codec: n for codec, n in codecs}
+    }
+
+
+def compress_existing(codec, batch_size=500, pause=0.0, limit=None):
+    """
+    压缩已有的文章内容
+
+    参数:
+        codec:      压缩算法
+        batch_size: 每批扫描的文章数
+        pause:      每批之间暂停的秒数（降低对线上服务的影响）
+        limit:      最多扫描的文章数（None 表示全部）
+
+    返回:
+        (int, int): (扫描的文章数, 压缩的文章数)
+    """
+    table = Post.__table__
+    # 达到阈值的文章至少有 threshold / 4 个字符（UTF-8 每个字符最多 4 字节），更短的不用取出来
+    min_chars = content_store.threshold // 4
+    update = (
+        db.update(table)
+        .where(
+            table.c.id == db.bindparam('pid'),
+            table.c.content_codec.is_(None),
+            table.c.content == db.bindparam('old_content')
+        )
+        .values(
+            content=db.bindparam('prefix'),
+            content_blob=db.bindparam('blob'),
+            content_codec=db.bindparam('codec'),
+            content_size=db.bindparam('size'),
+            updated_at=table.c.updated_at
+        )
+    )
+
+    last_id, scanned, compressed = 0, 0, 0
+    while limit is None or scanned < limit:
+        size = batch_size if limit is None else min(batch_size, limit - scanned)
+        ids = db.session.execute(
+            db.select(table.c.id)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(size)
+        ).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        scanned += len(ids)
+
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.content)
+            .where(
+                table.c.id.in_(ids),
+                table.c.content_codec.is_(None),
+                db.func.length(table.c.content) >= min_chars
+            )
+        ).all()
+
+        params = []
+        for post_id, text in rows:
+            encoded = content_store.encode(text, codec)
+            if encoded is not None:
+                prefix, blob, used_codec, raw_size = encoded
+                params.append({
+                    'pid': post_id, 'old_content': text, 'prefix': prefix,
+                    'blob': blob, 'codec': used_codec, 'size': raw_size
+                })
+        if params:
+            result = db.session.execute(update, params)
+            compressed += result.rowcount if result.rowcount >= 0 else len(params)
+        db.session.commit()
+
+        if pause:
+            time.sleep(pause)
+    return scanned, compressed
+
+
+def decompress_all(batch_size=500, pause=0.0):
+    """
+    把压缩存储的文章全部还原为原文存储
+
+    返回:
+        int: 还原的文章数
+    """
+    table = Post.__table__
+    update = (
+        db.update(table)
+        .where(table.c.id == db.bindparam('pid'), table.c.content_blob == db.bindparam('old_blob'))
+        .values(
+            content=db.bindparam('text'),
+            content_blob=None,
+            content_codec=None,
+            content_size=None,
+            updated_at=table.c.updated_at
+        )
+    )
+
+    last_id, restored = 0, 0
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.content_blob, table.c.content_codec)
+            .where(table.c.id > last_id, table.c.content_codec.isnot(None))
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        db.session.execute(update, [
+            {'pid': post_id, 'old_blob': blob, 'text': content_store.decode(codec, blob)}
+            for post_id, blob, codec in rows
+        ])
+        db.session.commit()
+        restored += len(rows)
+
+        if pause:
+            time.sleep(pause)
+    return restored
+
+
+def print_stats(stats):
+    """输出统计信息"""
+    print(f"📊 文章总数: {stats['posts']}，压缩存储: {stats['compressed_posts']} {stats['codecs'] or ''}")
+    if stats['original_bytes']:
+        print(f"   原文 {stats['original_bytes']:,} 字节 → 实际存储 {stats['stored_bytes']:,} 字节，"
+              f"节省 {stats['saved_bytes']:,} 字节（压缩后为原来的 {stats['ratio']:.1%}）")
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='压缩已有的文章内容（可在服务运行期间后台执行）')
+    parser.add_argument('--codec', choices=list(CODECS), help='压缩算法（默认使用 CONTENT_COMPRESSION，未配置时用 zlib）')
+    parser.add_argument('--batch', type=int, default=500, help='每批处理的文章数')
+    parser.add_argument('--pause', type=float, default=0.0, help='每批之间暂停的秒数')
+    parser.add_argument('--limit', type=int, default=None, help='最多扫描的文章数')
+    parser.add_argument('--stats', action='store_true', help='只输出压缩统计')
+    parser.add_argument('--decompress', action='store_true', help='全部还原为原文存储')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        # 启用分片时逐个分片处理
+        for key in shards.targets:
+            with shards.use(key):
+                if key is not None:
+                    print(f"📦 分片 {key}")
+                if args.stats:
+                    print_stats(content_stats())
+                elif args.decompress:
+                    started = time.perf_counter()
+                    restored = decompress_all(args.batch, args.pause)
+                    print(f"✅ 还原 {restored} 篇文章，耗时 {time.perf_counter() - started:.1f} 秒")
+                    print_stats(content_stats())
+                else:
+                    codec = args.codec or content_store.codec or 'zlib'
+                    started = time.perf_counter()
+                    scanned, compressed = compress_existing(codec, args.batch, args.pause, args.limit)
+                    print(f"✅ 扫描 {scanned} 篇文章，压缩 {compressed} 篇（{codec}），耗时 {time.perf_counter() - started:.1f} 秒")
+                    print_stats(content_stats())
@@ -0,0 +1,127 @@
+"""
+响应压缩模块
+
+功能：
+    1. 根据请求头 Accept-Encoding 协商是否使用 gzip 压缩
+    2. 小于阈值的响应、304/204 响应、已编码的响应直接跳过
+    3. 支持流式响应（边生成边压缩，不把整个响应读进内存）
+
+配置项（config.py）：
+    COMPRESS_ENABLED   - 是否开启压缩
+    COMPRESS_LEVEL     - gzip 压缩级别（1~9，越大压缩率越高、越耗 CPU）
+    COMPRESS_MIN_SIZE  - 最小压缩字节数，小于该值的响应不压缩
+    COMPRESS_MIMETYPES - 需要压缩的响应类型
+"""
+import gzip
+import zlib
+from flask import request
+
+
+def accepts_gzip(accept_encoding):
+    """
+    解析 Accept-Encoding，判断客户端是否接受 gzip
+
+    支持 q 值，例如 "gzip;q=0" 表示明确拒绝 gzip，
+    "*" 通配符在没有单独声明 gzip 时生效。
+
+    参数:
+        accept_encoding: 请求头 Accept-Encoding 的值
+
+    返回:
+        bool: 接受 gzip 返回 True
+    """
+    if not accept_encoding:
+        return False
+
+    wildcard_q = None
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        if coding in ('gzip', 'x-gzip'):
+            return q > 0
+        if coding == '*':
+            wildcard_q = q
+
+    return wildcard_q is not None and wildcard_q > 0
+
+
+def _gzip_stream(chunks, level):
+    """把一个字节块迭代器包装成 gzip 流（constant memory）"""
+    # wbits=31 表示带 gzip 头和尾的格式
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            # 每块同步刷新，保证流式数据能及时送达客户端
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def register_compression(app):
+    """
+    注册响应压缩中间件
+
+    参数:
+        app: Flask 应用对象
+    """
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+    mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ['application/json']))
+
+    @app.after_request
+    def compress_response(response):
+        """请求结束后：满足条件时对响应体做 gzip 压缩"""
+        # ---- 不需要压缩的情况 ----
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if response.direct_passthrough:
+            return response
+        if 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in mimetypes:
+            return response
+
+        # 无论是否压缩，只要结果随 Accept-Encoding 变化就声明 Vary
+        response.vary.add('Accept-Encoding')
+
+        if not accepts_gzip(request.headers.get('Accept-Encoding', '')):
+            return response
+
+        # ---- 流式响应：边生成边压缩 ----
+        if response.is_streamed:
+            response.response = _gzip_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+
+        # ---- 普通响应：小于阈值不压缩 ----
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        if response.headers.get('ETag'):
+            # 压缩后的字节与原始内容不同，强 ETag 改为弱 ETag
+            etag, weak = response.get_etag()
+            if etag and not weak:
+                response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,141 @@
+"""
+文章内容压缩存储模块
+
+功能：
+    1. 超过阈值的文章内容压缩后存入 posts.content_blob（zlib / lzma，均为标准库）
+    2. posts.content 只保留开头一段原文，关键字搜索（LIKE）仍然可用
+    3. 读取时延迟解压：只有访问 Post.content（序列化输出）时才解压，结果缓存在对象上
+    4. 压缩后节省不到一定比例（CONTENT_COMPRESSION_MAX_RATIO）的内容按原文存储
+
+说明：
+    - 每行记录自己的压缩算法（content_codec），修改配置或关闭压缩后旧数据照常读取
+    - 已有数据用 compress_content.py 在后台分批迁移，并统计节省的空间
+    - posts.content_blob 是延迟加载的列，只有输出文章内容的查询才用 undefer 一起取出，
+      删除、评论等只需要文章元数据的查询不会读取压缩数据
+    - 压缩存储的文章，关键字搜索只匹配标题和开头 CONTENT_SEARCH_PREFIX 个字符
+      （文章列表的 filters.keyword_content_prefix 会标明这一点）
+
+配置项（config.py）：
+    CONTENT_COMPRESSION           - 压缩算法：zlib / lzma，为空表示不压缩（默认）
+    CONTENT_COMPRESSION_LEVEL     - 压缩级别（zlib 1~9，lzma preset 0~9）
+    CONTENT_COMPRESSION_THRESHOLD - 原文 UTF-8 字节数达到该值才压缩
+    CONTENT_COMPRESSION_MAX_RATIO - 压缩后大小 / 原文大小超过该值时不压缩
+    CONTENT_SEARCH_PREFIX         - 压缩存储时保留的原文字符数
+"""
+import zlib
+
+try:
+    import lzma
+except ImportError:  # 部分精简版 Python 没有编译 lzma 模块
+    lzma = None
+
+
+def _lzma_compress(data, level):
+    return lzma.compress(data, preset=level)
+
+
+def _zlib_compress(data, level):
+    return zlib.compress(data, level)
+
+
+# 算法名 -> (压缩函数, 解压函数)
+CODECS = {'zlib': (_zlib_compress, zlib.decompress)}
+if lzma is not None:
+    CODECS['lzma'] = (_lzma_compress, lzma.decompress)
+
+
+class ContentStore:
+    """文章内容的编码与解码"""
+
+    def __init__(self, codec=None, level=6, threshold=4096, max_ratio=0.9, search_prefix=500):
+        self.codec = codec
+        self.level = level
+        self.threshold = threshold
+        self.max_ratio = max_ratio
+        self.search_prefix = search_prefix
+
+    def init_app(self, app):
+        """读取配置"""
+        codec = app.config.get('CONTENT_COMPRESSION') or None
+        if codec is not None and codec not in CODECS:
+            raise ValueError(f'不支持的压缩算法: {codec}（可选: {", ".join(CODECS)}）')
+        self.codec = codec
+        self.level = app.config.get('CONTENT_COMPRESSION_LEVEL', self.level)
+        self.threshold = app.config.get('CONTENT_COMPRESSION_THRESHOLD', self.threshold)
+        self.max_ratio = app.config.get('CONTENT_COMPRESSION_MAX_RATIO', self.max_ratio)
+        self.search_prefix = app.config.get('CONTENT_SEARCH_PREFIX', self.search_prefix)
+        app.extensions['content_store'] = self
+
+    # ==================== 编码 / 解码 ====================
+
+    def encode(self, text, codec=None):
+        """
+        按配置压缩文章内容
+
+        参数:
+            text:  文章内容
+            codec: 指定压缩算法（默认使用配置的算法）
+
+        返回:
+            tuple 或 None: (保留的开头原文, 压缩数据, 算法名, 原文字节数)；不需要压缩时返回 None
+        """
+        codec = codec or self.codec
+        if codec is None:
+            return None
+
+        data = text.encode('utf-8')
+        if len(data) < self.threshold:
+            return None
+
+        compress = CODECS[codec][0]
+        blob = compress(data, self.level)
+        if len(blob) > len(data) * self.max_ratio:
+            return None
+        return text[:self.search_prefix], blob, codec, len(data)
+
+    @staticmethod
+    def decode(codec, blob):
+        """解压文章内容"""
+        return CODECS[codec][1](blob).decode('utf-8')
+
+    # ==================== 模型属性读写（models.Post.content） ====================
+
+    def read(self, post):
+        """
+        读取文章内容：未压缩直接返回，压缩的解压一次后缓存在对象上
+
+        缓存和压缩数据绑定（同一个 bytes 对象），数据被重新加载或修改后自动失效。
+        """
+        if post.content_codec is None:
+            return post.content_text
+
+        blob = post.content_blob
+        cached = post.__dict__.get('_content_cache')
+        if cached is not None and cached[0] is blob:
+            return cached[1]
+
+        text = self.decode(post.content_codec, blob)
+        post._content_cache = (blob, text)
+        return text
+
+    def write(self, post, text):
+        """写入文章内容（超过阈值时压缩）"""
+        encoded = self.encode(text)
+        if encoded is None:
+            post.content_text = text
+            post.content_blob = None
+            post.content_codec = None
+            post.content_size = None
+            post._content_cache = None
+            return
+
+        prefix, blob, codec, size = encoded
+        post.content_text = prefix
+        post.content_blob = blob
+        post.content_codec = codec
+        post.content_size = size
+        post._content_cache = (blob, text)
+
+
+# 全局单例，在 create_app 中调用 content_store.init_app(app)
+content_store = ContentStore()
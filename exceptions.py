@@ -66,3 +66,8 @@ class NotFoundError(APIError):
 class ConflictError(APIError):
     """409 - 资源冲突（如用户名已存在）"""
     status_code = 409
+
+
+class ServiceUnavailableError(APIError):
+    """503 - 服务暂时不可用（如连接数已满）"""
+    status_code = 503
@@ -0,0 +1,71 @@
+"""
+gunicorn 生产环境配置
+
+启动方式：
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+功能：
+    1. 多进程：默认 worker 数 = CPU 核数，可用 WEB_CONCURRENCY 覆盖
+    2. 预加载：主进程创建一次应用（preload_app），worker fork 后直接复用
+    3. fork 之后丢弃继承来的数据库连接，每个 worker 建立自己的连接，
+       避免多个进程共用同一个 MySQL socket
+    4. 按 worker 数量换算每个进程的连接池大小，总连接数不超过 DB_MAX_CONNECTIONS
+    5. 平滑重启：
+       - kill -HUP <master>  重新读取配置并逐个替换 worker（preload 模式下不会重新加载代码）
+       - kill -USR2 <master> 启动新的主进程（加载新代码），确认正常后 kill -QUIT 旧主进程
+       - kill -TERM <master> 等待正在处理的请求完成后退出
+
+环境变量：
+    WEB_CONCURRENCY    - worker 进程数（默认 CPU 核数）
+    WEB_THREADS        - 每个 worker 的线程数（默认 4）
+    BIND               - 监听地址（默认 0.0.0.0:5000）
+    DB_MAX_CONNECTIONS - 所有 worker 加起来允许占用的数据库连接数（默认 100）
+"""
+import multiprocessing
+import os
+
+# ============ 进程与线程 ============
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+# 平滑重启 / 关闭时等待请求处理完成的最长时间（秒）
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.getenv('WORKER_TIMEOUT', 30))
+
+# 处理一定数量请求后重启 worker，防止内存缓慢增长（加随机抖动避免同时重启）
+max_requests = int(os.getenv('MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', 1000))
+
+accesslog = None  # 请求日志已由 logger.py 记录
+errorlog = '-'
+
+# ============ 每个 worker 的连接池大小 ============
+# 每个线程至少一个常驻连接，剩余额度作为溢出连接，保证 workers * (pool + overflow) <= 上限
+_max_connections = int(os.getenv('DB_MAX_CONNECTIONS', 100))
+_per_worker = max(_max_connections // workers, 1)
+os.environ.setdefault('DB_POOL_SIZE', str(min(threads, _per_worker)))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(max(_per_worker - min(threads, _per_worker), 0)))
+
+
+def post_fork(server, worker):
+    """worker fork 之后：丢弃从主进程继承的连接池（不关闭父进程的连接）"""
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        # 包括分片的引擎（SHARD_DATABASE_URLS）
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    server.log.info(f'worker {worker.pid} 已重置数据库连接池')
+
+
+def worker_exit(server, worker):
+    """worker 退出前：把内存中的浏览量和热度增量写回数据库"""
+    from view_counter import view_counter
+    from trending import trending
+
+    view_counter.flush()
+    trending.flush()
@@ -4,6 +4,7 @@
 """
 from app import create_app, db
 from models import User, Post, Comment
+from sharding import shards
 
 def init_database():
     """初始化数据库"""
@@ -18,10 +19,12 @@ def init_database():
         # 取消注释下面的行可以重置数据库
         # print("⚠️  警告：正在删除所有表...")
         db.drop_all()
+        shards.drop_schema()
         
-        # 创建所有表
+        # 创建所有表（启用分片时同时在各分片上创建文章 / 评论相关的表）
         print("\n📝 正在创建数据库表...")
         db.create_all()
+        shards.create_schema()
         
         print("\n✅ 数据库表创建成功！")
         print("   ✓ users 表")
@@ -25,8 +25,7 @@ def setup_logger(app):
     """
     # ============ 1. 创建日志目录 ============
     log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
     
     # ============ 2. 定义日志格式 ============
     # 详细格式（用于文件）
@@ -46,7 +45,8 @@ def setup_logger(app):
         os.path.join(log_dir, 'app.log'),
         maxBytes=10 * 1024 * 1024,  # 单个文件最大 10MB
         backupCount=5,               # 保留 5 个备份文件
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True                   # 第一次写日志时才打开文件，加快启动
     )
     info_handler.setLevel(logging.INFO)
     info_handler.setFormatter(file_formatter)
@@ -56,7 +56,8 @@ def setup_logger(app):
         os.path.join(log_dir, 'error.log'),
         maxBytes=10 * 1024 * 1024,
         backupCount=5,
-        encoding='utf-8'
+        encoding='utf-8',
+        delay=True
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(file_formatter)
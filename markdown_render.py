@@ -0,0 +1,264 @@
+"""
+Markdown → HTML 渲染模块（只依赖标准库）
+
+安全策略（白名单生成，而不是渲染后再过滤）：
+    1. 原文中的所有 HTML 都会被转义，作为普通文本显示
+    2. 输出中的标签全部由本模块生成：p h1-h6 strong em del code pre blockquote ul ol li a img hr br
+    3. 链接和图片地址只允许 http / https / mailto 和站内相对地址，
+       javascript: 等其他协议的链接只保留文字，图片不输出
+
+支持的语法：
+    标题（# ~ ######）、段落与换行（行尾两个空格或反斜杠）、粗体 / 斜体 / 删除线、行内代码、
+    围栏代码块（``` 或 ~~~，可带语言名）、引用、无序 / 有序列表（可缩进嵌套）、分隔线、
+    链接 [文字](地址 "标题")、图片 ![说明](地址)、自动链接 <https://...>、反斜杠转义
+
+修改渲染结果的任何改动都要递增 RENDERER_VERSION，已存储的 HTML 会被判定为过期并重新渲染。
+"""
+import html
+import re
+
+RENDERER_VERSION = 1
+
+# 块级语法
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})\s*([\w+#.-]*)\s*$')
+_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:\s+(.*?))?\s*#*\s*$')
+_HR = re.compile(r'^ {0,3}([-*_])(?:\s*\1){2,}\s*$')
+_QUOTE = re.compile(r'^ {0,3}> ?(.*)$')
+_LIST_ITEM = re.compile(r'^( *)([-*+]|\d{1,9}[.)])\s+(.*)$')
+
+# 行内语法（作用于已转义的文本）
+_PLACEHOLDER = re.compile('\x00(\\d+)\x00')
+_ESCAPABLE = re.compile(r'\\([\\`*_{}\[\]()#+\-.!~>|])')
+_CODE_SPAN = re.compile(r'(`+)(.+?)\1', re.S)
+# 地址允许一层成对的括号，例如 https://zh.wikipedia.org/wiki/Flask_(web框架)
+_URL = r'((?:[^\s()]|\([^\s()]*\))+)'
+_IMAGE = re.compile(r'!\[([^\]]*)\]\(\s*' + _URL + r'(?:\s+&quot;(.*?)&quot;)?\s*\)')
+_LINK = re.compile(r'\[([^\]]+)\]\(\s*' + _URL + r'(?:\s+&quot;(.*?)&quot;)?\s*\)')
+_AUTOLINK = re.compile(r'&lt;((?:https?://|mailto:)(?:(?!&gt;)\S)+)&gt;')
+_STRONG = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1', re.S)
+_EM_STAR = re.compile(r'\*(?=\S)(.+?)(?<=\S)\*', re.S)
+_EM_UNDERSCORE = re.compile(r'(?<![\w])_(?=\S)(.+?)(?<=\S)_(?![\w])', re.S)
+_DEL = re.compile(r'~~(?=\S)(.+?)(?<=\S)~~', re.S)
+_HARD_BREAK = re.compile(r'(?: {2,}|\\)\n')
+
+_SAFE_SCHEMES = ('http://', 'https://', 'mailto:')
+
+
+def safe_url(url):
+    """
+    检查链接地址是否安全
+
+    返回:
+        str 或 None: 安全时返回原地址，否则返回 None
+    """
+    value = html.unescape(url).strip()
+    lowered = re.sub(r'[\x00-\x20]', '', value).lower()
+    if lowered.startswith(_SAFE_SCHEMES):
+        return url
+    # 站内相对地址：/path、#anchor、?query、path（不能含冒号，排除 javascript: 之类的协议）
+    if ':' not in lowered.split('/', 1)[0].split('?', 1)[0].split('#', 1)[0]:
+        return url
+    return None
+
+
+class MarkdownRenderer:
+    """
+    Markdown 渲染器
+
+    参数:
+        allow_images: 是否输出图片（False 时只保留图片说明文字）
+        link_rel:     链接的 rel 属性（为空则不输出）
+    """
+
+    def __init__(self, allow_images=True, link_rel='nofollow noopener noreferrer'):
+        self.allow_images = allow_images
+        self.link_rel = link_rel
+
+    def render(self, text):
+        """把 Markdown 文本渲染成安全的 HTML"""
+        lines = (text or '').replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '').split('\n')
+        return '\n'.join(self._blocks(lines))
+
+    # ==================== 块级 ====================
+
+    def _blocks(self, lines):
+        """逐行扫描，生成块级 HTML 片段"""
+        out = []
+        paragraph = []
+        i = 0
+
+        def flush_paragraph():
+            if paragraph:
+                out.append(f'<p>{self._inline(chr(10).join(paragraph))}</p>')
+                paragraph.clear()
+
+        while i < len(lines):
+            line = lines[i]
+
+            if not line.strip():
+                flush_paragraph()
+                i += 1
+                continue
+
+            fence = _FENCE.match(line)
+            if fence:
+                flush_paragraph()
+                marker, lang = fence.group(1), fence.group(2)
+                code = []
+                i += 1
+                while i < len(lines) and not lines[i].strip().startswith(marker):
+                    code.append(lines[i])
+                    i += 1
+                i += 1  # 跳过结束标记（没有结束标记时到文末为止）
+                attr = f' class="language-{html.escape(lang)}"' if lang else ''
+                out.append(f'<pre><code{attr}>{html.escape(chr(10).join(code))}</code></pre>')
+                continue
+
+            heading = _HEADING.match(line)
+            if heading:
+                flush_paragraph()
+                level = len(heading.group(1))
+                out.append(f'<h{level}>{self._inline(heading.group(2) or "")}</h{level}>')
+                i += 1
+                continue
+
+            if _HR.match(line):
+                flush_paragraph()
+                out.append('<hr>')
+                i += 1
+                continue
+
+            if _QUOTE.match(line):
+                flush_paragraph()
+                quoted = []
+                while i < len(lines) and lines[i].strip():
+                    match = _QUOTE.match(lines[i])
+                    quoted.append(match.group(1) if match else lines[i])
+                    i += 1
+                out.append('<blockquote>\n' + '\n'.join(self._blocks(quoted)) + '\n</blockquote>')
+                continue
+
+            item = _LIST_ITEM.match(line)
+            # 段落中间以数字开头的行不当作列表
+            if item and not (paragraph and item.group(2)[0].isdigit()):
+                flush_paragraph()
+                html_list, i = self._list(lines, i)
+                out.append(html_list)
+                continue
+
+            paragraph.append(line.strip() if not line.endswith('  ') else line.lstrip())
+            i += 1
+
+        flush_paragraph()
+        return out
+
+    def _list(self, lines, start):
+        """从 start 行开始解析一个列表，返回 (HTML, 列表之后的行号)"""
+        first = _LIST_ITEM.match(lines[start])
+        indent = len(first.group(1))
+        ordered = first.group(2)[0].isdigit()
+        items = []
+        i = start
+
+        while i < len(lines):
+            match = _LIST_ITEM.match(lines[i])
+            if (not match or len(match.group(1)) != indent
+                    or match.group(2)[0].isdigit() != ordered):
+                break
+            content_indent = indent + len(match.group(2)) + 1
+            body = [match.group(3)]
+            i += 1
+            # 列表项的后续行：缩进的行（包括嵌套列表）、紧跟的非空续行
+            while i < len(lines):
+                line = lines[i]
+                if not line.strip():
+                    # 空行之后仍有缩进内容才属于当前列表项
+                    if i + 1 < len(lines) and lines[i + 1].startswith(' ' * content_indent):
+                        body.append('')
+                        i += 1
+                        continue
+                    break
+                leading = len(line) - len(line.lstrip(' '))
+                if leading >= content_indent:
+                    body.append(line[content_indent:])
+                elif _LIST_ITEM.match(line) or _FENCE.match(line) or _HEADING.match(line) or _QUOTE.match(line):
+                    break
+                else:
+                    body.append(line.strip())
+                i += 1
+            items.append(body)
+
+        tag = 'ol' if ordered else 'ul'
+        start_attr = ''
+        if ordered:
+            number = int(first.group(2)[:-1])
+            if number != 1:
+                start_attr = f' start="{number}"'
+
+        rendered = []
+        for body in items:
+            blocks = self._blocks(body)
+            # 紧凑列表：只有一个段落时去掉 <p>
+            if blocks and blocks[0].startswith('<p>') and '' not in body:
+                blocks[0] = blocks[0][3:-4]
+            rendered.append('<li>' + '\n'.join(blocks) + '</li>')
+        return f'<{tag}{start_attr}>\n' + '\n'.join(rendered) + f'\n</{tag}>', i
+
+    # ==================== 行内 ====================
+
+    def _inline(self, text):
+        """渲染行内语法：先把代码和转义字符换成占位符，转义 HTML，再依次处理链接、强调等"""
+        stash = []
+
+        def hold(fragment):
+            stash.append(fragment)
+            return f'\x00{len(stash) - 1}\x00'
+
+        text = _ESCAPABLE.sub(lambda m: hold(html.escape(m.group(1))), text)
+        text = _CODE_SPAN.sub(lambda m: hold(f'<code>{html.escape(m.group(2).strip())}</code>'), text)
+        text = html.escape(text)
+
+        text = _IMAGE.sub(lambda m: hold(self._image(m)), text)
+        text = _LINK.sub(lambda m: hold(self._link(m)), text)
+        text = _AUTOLINK.sub(lambda m: hold(self._anchor(m.group(1), m.group(1))), text)
+
+        text = _STRONG.sub(r'<strong>\2</strong>', text)
+        text = _EM_STAR.sub(r'<em>\1</em>', text)
+        text = _EM_UNDERSCORE.sub(r'<em>\1</em>', text)
+        text = _DEL.sub(r'<del>\1</del>', text)
+        text = _HARD_BREAK.sub('<br>\n', text)
+
+        # 占位符可能嵌套（链接文字里的代码），循环替换到没有为止
+        while '\x00' in text:
+            text = _PLACEHOLDER.sub(lambda m: stash[int(m.group(1))], text)
+        return text
+
+    def _anchor(self, url, label, title=None):
+        """生成链接（地址不安全时只输出文字）"""
+        if safe_url(url) is None:
+            return label
+        attrs = f' href="{url}"'
+        if title:
+            attrs += f' title="{title}"'
+        if self.link_rel:
+            attrs += f' rel="{self.link_rel}"'
+        return f'<a{attrs}>{label}</a>'
+
+    def _link(self, match):
+        label, url, title = match.groups()
+        return self._anchor(url, self._inline_label(label), title)
+
+    def _image(self, match):
+        alt, url, title = match.groups()
+        if not self.allow_images or safe_url(url) is None:
+            return alt
+        attrs = f' src="{url}" alt="{alt}"'
+        if title:
+            attrs += f' title="{title}"'
+        return f'<img{attrs}>'
+
+    @staticmethod
+    def _inline_label(label):
+        """链接文字支持强调（已经是转义后的文本）"""
+        label = _STRONG.sub(r'<strong>\2</strong>', label)
+        return _EM_STAR.sub(r'<em>\1</em>', label)
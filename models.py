@@ -2,9 +2,12 @@
 博客系统数据库模型
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
+from content_store import content_store
 from werkzeug.security import generate_password_hash, check_password_hash
 # 注意：db 对象需要在 app.py 中初始化
+# 启用分片时 shards.init_app 换用 ShardedSession，把文章 / 评论相关的语句发往作者所在的分片（见 sharding.py）
 db = SQLAlchemy()
 
 # ============================================================================
@@ -19,12 +22,18 @@ class User(db.Model):
     username = db.Column(db.String(50), unique=True, nullable=False, comment='用户名')
     email = db.Column(db.String(100), unique=True, nullable=False, comment='邮箱')
     password = db.Column(db.String(500), nullable=False, comment='密码（已加密）')
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='Token 版本（修改密码后递增，旧 Token 失效）')
     created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
     
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='粉丝数（增量维护）')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='关注数（增量维护）')
+    timeline_pull = db.Column(db.Boolean, nullable=False, default=False, server_default='0', comment='是否有未推送到粉丝时间线的文章（读时间线时需要拉取）')
+    
     # 关系定义
-    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan')
-    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan')
+    # passive_deletes：删除用户时不把文章/评论逐条加载到内存，由数据库的 ON DELETE CASCADE 一次删除
+    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -60,6 +69,84 @@ class User(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+
+class AuthorStats(db.Model):
+    """
+    作者统计（个人主页使用）
+    
+    文章数、评论数和最近活跃时间由文章/评论的写操作增量维护（author_stats.py），
+    读取个人主页只需按主键取一行，不需要对 posts / comments 做 COUNT。
+    """
+    __tablename__ = 'author_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, comment='用户ID')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='文章数')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='评论数')
+    last_active_at = db.Column(db.DateTime, nullable=True, comment='最近一次发文/评论的时间')
+    
+    def to_dict(self):
+        """将统计转换为字典（用于 JSON 响应）"""
+        return {
+            'post_count': self.post_count,
+            'comment_count': self.comment_count,
+            'last_active_at': self.last_active_at.isoformat() if self.last_active_at else None
+        }
+
+# ============================================================================
+# Token 版本变更日志
+# ============================================================================
+
+class TokenRevocation(db.Model):
+    """
+    Token 版本变更日志
+    
+    用户修改密码等需要让旧 Token 失效时插入一行；
+    各进程按自增 ID 增量轮询本表，刷新内存中的 Token 版本表（见 token_epochs.py）。
+    """
+    __tablename__ = 'token_revocations'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, comment='用户ID')
+    token_version = db.Column(db.Integer, nullable=False, comment='新的 Token 版本')
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
+    
+    def __repr__(self):
+        return f'<TokenRevocation user={self.user_id} v{self.token_version}>'
+
+# ============================================================================
+# 标签模型
+# ============================================================================
+
+# 文章-标签关联表：主键 (post_id, tag_id) 用于查文章的标签，
+# 反向索引 (tag_id, post_id) 用于按标签筛选文章
+post_tags = db.Table(
+    'post_tags',
+    db.Column('post_id', db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_post_tags_tag_post', 'tag_id', 'post_id')
+)
+
+
+class Tag(db.Model):
+    """标签模型"""
+    __tablename__ = 'tags'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(30), unique=True, nullable=False, comment='标签名')
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True, comment='文章数（增量维护）')
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+    
+    def to_dict(self):
+        """将标签对象转换为字典（用于 JSON 响应）"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'post_count': self.post_count or 0
+        }
+
 # ============================================================================
 # 文章模型
 # ============================================================================
@@ -70,27 +157,67 @@ class Post(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(200), nullable=False, comment='文章标题')
-    content = db.Column(db.Text, nullable=False, comment='文章内容')
-    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, comment='作者ID')
+    # 文章内容通过 content 属性读写；超过阈值时压缩存储（见 content_store.py）
+    content_text = db.Column('content', db.Text, nullable=False, comment='文章内容（压缩存储时只保留开头一段，用于关键字搜索）')
+    # 延迟加载：只有输出文章内容的查询才用 undefer(Post.content_blob) 一起取出
+    content_blob = db.deferred(db.Column(db.LargeBinary(length=16777215), nullable=True, comment='压缩后的文章内容'))
+    content_codec = db.Column(db.String(10), nullable=True, comment='压缩算法（zlib / lzma），NULL 表示未压缩')
+    content_size = db.Column(db.Integer, nullable=True, comment='原文 UTF-8 字节数（仅压缩存储时记录，用于统计）')
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, comment='作者ID')
+    view_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True, comment='浏览量（sort=view_count 使用索引）')
+    fanned_out = db.Column(db.Boolean, nullable=False, default=True, server_default='1', comment='发文时是否已推送到粉丝时间线（否则读时间线时拉取）')
     created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
     
     # 关系定义
-    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
+    # 评论由 purge.py 分批删除（或数据库 ON DELETE CASCADE），删除文章时不逐条加载评论
+    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    # 列表接口每篇文章都要输出标签，用 selectin 一次查出整页文章的标签，避免 N+1
+    tags = db.relationship('Tag', secondary=post_tags, lazy='selectin', order_by='Tag.name')
+    
+    __table_args__ = (
+        # 按作者取最新文章（作者页、时间线的拉模式）
+        db.Index('ix_posts_author_id_id', 'author_id', 'id'),
+        # 时间线拉模式：只取作者未推送的文章
+        db.Index('ix_posts_author_fanned_out_id', 'author_id', 'fanned_out', 'id'),
+    )
     
     def __repr__(self):
         return f'<Post {self.title}>'
     
-    def to_dict(self, include_author=False, include_comments=False):
-        """将文章对象转换为字典（用于 JSON 响应）"""
+    @hybrid_property
+    def content(self):
+        """文章内容（压缩存储的在第一次访问时解压）"""
+        return content_store.read(self)
+    
+    @content.setter
+    def content(self, value):
+        content_store.write(self, value)
+    
+    @content.expression
+    def content(cls):
+        # 查询条件（关键字搜索）使用 content 列：压缩存储的文章只有开头一段原文
+        return cls.content_text
+    
+    def to_dict(self, include_author=False, include_comments=False, html=None):
+        """
+        将文章对象转换为字典（用于 JSON 响应）
+        
+        参数:
+            html: 预渲染的 HTML（format=html 时传入，替代 Markdown 原文输出）
+        """
         result = {
             'id': self.id,
             'title': self.title,
-            'content': self.content,
+            'content': self.content if html is None else html,
             'author_id': self.author_id,
+            'view_count': self.view_count or 0,
+            'tags': [tag.name for tag in self.tags],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if html is not None:
+            result['content_format'] = 'html'
         
         # 可选：包含作者信息
         if include_author and self.author:
@@ -107,40 +234,263 @@ class Post(db.Model):
         
         return result
 
+# ============================================================================
+# 关注关系与时间线
+# ============================================================================
+
+class Follow(db.Model):
+    """关注关系：follower 关注 followee"""
+    __tablename__ = 'follows'
+    
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, comment='粉丝ID')
+    followee_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, comment='被关注者ID')
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='关注时间')
+    
+    __table_args__ = (
+        # 反向索引：发文时查作者的所有粉丝
+        db.Index('ix_follows_followee_follower', 'followee_id', 'follower_id'),
+    )
+    
+    def __repr__(self):
+        return f'<Follow {self.follower_id} -> {self.followee_id}>'
+
+
+class TimelineEntry(db.Model):
+    """
+    首页时间线（推模式物化结果）
+    
+    作者发文时为每个粉丝写入一行，读时间线只需按 (user_id, post_id) 倒序范围扫描。
+    post_id 随发文时间递增，直接作为分页游标。
+    """
+    __tablename__ = 'timelines'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, comment='时间线所属用户ID')
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True, comment='文章ID')
+    author_id = db.Column(db.Integer, nullable=False, comment='文章作者ID（取消关注时按作者清理）')
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='文章发布时间')
+    
+    __table_args__ = (
+        db.Index('ix_timelines_user_author', 'user_id', 'author_id'),
+    )
+    
+    def __repr__(self):
+        return f'<TimelineEntry user={self.user_id} post={self.post_id}>'
+
+
+class PostTrending(db.Model):
+    """
+    文章热度（按时间衰减的评论活跃度）
+    
+    score 是相对基准时间 base 的累计权重，由 trending.py 增量维护，
+    同一 base 下 score 越大越热门，按 score 索引倒序即可取出排行榜。
+    """
+    __tablename__ = 'post_trending'
+    
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True, comment='文章ID')
+    score = db.Column(db.Float, nullable=False, default=0, index=True, comment='热度分数（相对 base）')
+    base = db.Column(db.Integer, nullable=False, comment='基准时间（Unix 秒）')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
+    
+    def __repr__(self):
+        return f'<PostTrending {self.post_id} score={self.score}>'
+
+
+class PostRender(db.Model):
+    """
+    文章内容预渲染的 HTML（由 post_html.py 在写文章时生成）
+    
+    content_hash 是渲染时 Markdown 原文的 SHA-256，renderer 是渲染器版本和配置的指纹，
+    两者都与当前一致时不需要重新渲染。
+    """
+    __tablename__ = 'post_renders'
+    
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True, comment='文章ID')
+    content_hash = db.Column(db.String(64), nullable=False, comment='渲染时文章内容的 SHA-256')
+    renderer = db.Column(db.String(32), nullable=False, comment='渲染器版本和配置指纹')
+    html = db.Column(db.Text(length=16777215), nullable=False, comment='渲染后的 HTML')
+    rendered_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='渲染时间')
+    
+    def __repr__(self):
+        return f'<PostRender {self.post_id} {self.renderer}>'
+
+
+class PostPurge(db.Model):
+    """
+    待后台删除的文章（由 purge.py 的 PostPurger 处理）
+    
+    删除接口返回 202 前在同一个事务中写入，进程重启后继续删除；
+    claimed_at 是领取任务的时间（租约），超过 PURGE_LEASE_SECONDS 未续期的任务可以被其他进程接手。
+    """
+    __tablename__ = 'post_purges'
+    
+    post_id = db.Column(db.Integer, primary_key=True, comment='文章ID')
+    shard = db.Column(db.String(64), nullable=True, comment='文章所在的分片（未启用分片时为空）')
+    claimed_at = db.Column(db.DateTime, nullable=True, index=True, comment='领取时间（为空表示未领取）')
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='提交时间')
+    
+    def __repr__(self):
+        return f'<PostPurge {self.post_id}>'
+
 # ============================================================================
 # 评论模型
 # ============================================================================
 
 class Comment(db.Model):
-    """评论模型"""
+    """
+    评论模型
+    
+    回复使用物化路径（materialized path）表示：path 由根评论到自身的ID拼接而成，
+    每段固定 10 位并以 / 结尾（如 0000000012/0000000034/）。
+    一个评论的所有子孙就是同一 root_id 下 path 以它的 path 开头的行，
+    在 (root_id, path) 索引上一次范围扫描即可取出，结果按 path 排序正好是树的先序遍历。
+    """
     __tablename__ = 'comments'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     content = db.Column(db.Text, nullable=False, comment='评论内容')
-    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False, comment='文章ID')
-    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, comment='评论者ID')
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False, comment='文章ID')
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, comment='评论者ID')
+    parent_id = db.Column(db.Integer, nullable=True, comment='父评论ID（顶层评论为空）')
+    root_id = db.Column(db.Integer, nullable=True, comment='所属顶层评论ID（顶层评论为自身ID）')
+    path = db.Column(db.String(255), nullable=True, comment='物化路径')
+    depth = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='层级（顶层为 0）')
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', comment='子孙回复数（增量维护）')
     created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
     
+    __table_args__ = (
+        # 按顶层评论分页：WHERE post_id = ? AND depth = 0 ORDER BY id
+        db.Index('ix_comments_post_depth_id', 'post_id', 'depth', 'id'),
+        # 取子树：WHERE root_id = ? AND path >= ? AND path < ?
+        db.Index('ix_comments_root_path', 'root_id', 'path'),
+    )
+    
     def __repr__(self):
         return f'<Comment {self.id}>'
     
-    def to_dict(self, include_author=False):
-        """将评论对象转换为字典（用于 JSON 响应）"""
+    def to_dict(self, include_author=False, author=None):
+        """
+        将评论对象转换为字典（用于 JSON 响应）
+        
+        参数:
+            include_author: 是否包含作者信息
+            author: 已知的作者对象（如当前登录用户），传入时不再通过关系加载 users 表
+        """
         result = {
             'id': self.id,
             'content': self.content,
             'post_id': self.post_id,
             'author_id': self.author_id,
+            'parent_id': self.parent_id,
+            'depth': self.depth,
+            'reply_count': self.reply_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
         
         # 可选：包含作者信息
-        if include_author and self.author:
-            result['author'] = {
-                'id': self.author.id,
-                'username': self.author.username
-            }
+        if include_author:
+            author = author or self.author
+            if author:
+                result['author'] = {
+                    'id': author.id,
+                    'username': author.username
+                }
         
         return result
+
+
+# ============================================================================
+# 变更日志
+# ============================================================================
+
+class ChangeLog(db.Model):
+    """
+    文章 / 评论变更日志（GET /api/changes 增量同步）
+    
+    创建、修改、删除文章或评论时，在同一个事务中插入一行；自增 ID 即同步游标。
+    删除的对象只剩这里的记录（墓碑），所以不设外键，也不随文章、评论级联删除。
+    """
+    __tablename__ = 'change_log'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(10), nullable=False, comment='对象类型（post / comment）')
+    entity_id = db.Column(db.Integer, nullable=False, comment='文章或评论ID')
+    action = db.Column(db.String(10), nullable=False, comment='操作（create / update / delete）')
+    post_id = db.Column(db.Integer, nullable=False, comment='所属文章ID（文章为自身ID）')
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='变更时间')
+    
+    __table_args__ = (
+        # 评论推送断线续传：WHERE post_id = ? AND id > ? ORDER BY id
+        db.Index('ix_change_log_post_id', 'post_id', 'id'),
+    )
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.id} {self.entity}#{self.entity_id} {self.action}>'
+    
+    def to_dict(self):
+        """将变更记录转换为字典（用于 JSON 响应）"""
+        return {
+            'cursor': self.id,
+            'type': self.entity,
+            'id': self.entity_id,
+            'action': self.action,
+            'post_id': self.post_id,
+            'changed_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+# ============================================================================
+# 分片目录（启用分片时使用，见 sharding.py）
+# ============================================================================
+
+class PostDirectory(db.Model):
+    """
+    文章目录（主库）
+    
+    启用分片后，文章ID由这张表自增分配，保证各分片之间不重复；
+    同时记录作者，按文章ID访问时据此找到作者所在的分片。未启用分片时为空。
+    """
+    __tablename__ = 'post_directory'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    author_id = db.Column(db.Integer, nullable=False, comment='作者ID')
+    
+    def __repr__(self):
+        return f'<PostDirectory {self.id} author={self.author_id}>'
+
+
+class CommentDirectory(db.Model):
+    """
+    评论目录（主库）
+    
+    评论ID的分配方式同 PostDirectory；记录所属文章，按评论ID访问时据此找到分片。
+    """
+    __tablename__ = 'comment_directory'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_id = db.Column(db.Integer, nullable=False, comment='文章ID')
+    
+    def __repr__(self):
+        return f'<CommentDirectory {self.id} post={self.post_id}>'
+
+
+# ============================================================================
+# 表结构版本
+# ============================================================================
+
+class SchemaVersion(db.Model):
+    """
+    表结构版本（只有一行）
+    
+    init_db 补齐表结构后写入模型的结构指纹；启动时只读这一行和当前模型比较，
+    不需要读取数据库元数据就能发现升级后还没有补齐的表、列和索引。
+    """
+    __tablename__ = 'schema_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False, comment='模型表结构指纹（sha256）')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='最后一次补齐的时间')
+    
+    def __repr__(self):
+        return f'<SchemaVersion {self.fingerprint[:12]}>'
@@ -0,0 +1,203 @@
+"""
+文章 HTML 预渲染模块
+
+流程：
+    1. create_post / update_post 在同一个事务里把 Markdown 渲染成 HTML，存入 post_renders
+       （内容的 SHA-256 和渲染器指纹都没变时跳过渲染，例如只改了标题）
+    2. GET /api/posts/<id>?format=html 直接返回存储的 HTML
+    3. 渲染器版本或配置变化后，指纹不再匹配：读取时在内存中渲染后返回（不写数据库），
+       由 python post_html.py 批量重新渲染并保存（按文章ID分批，每批单独提交）；
+       读请求始终只读，保存渲染结果只在写文章和批量重新渲染时进行
+
+渲染器指纹 = markdown_render.RENDERER_VERSION + 渲染相关配置的哈希，
+配置项（config.py）：MARKDOWN_ALLOW_IMAGES / MARKDOWN_LINK_REL
+"""
+import argparse
+import hashlib
+import time
+from flask import current_app
+from sqlalchemy.orm import undefer
+from models import db, Post, PostRender
+from sharding import shards
+from exceptions import BadRequestError
+
+# 文章详情支持的输出格式
+FORMATS = ('markdown', 'html')
+
+# 配置 -> (渲染器, 指纹)
+_renderers = {}
+
+
+def parse_format(args):
+    """解析 format 查询参数（默认 markdown）"""
+    value = args.get('format', 'markdown')
+    if value not in FORMATS:
+        raise BadRequestError('format 只能是 markdown 或 html')
+    return value
+
+
+def content_hash(text):
+    """文章内容的 SHA-256（十六进制）"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def get_renderer(config=None):
+    """
+    按当前配置获取渲染器和指纹（同样的配置只创建一次）
+
+    参数:
+        config: 应用配置（默认 current_app.config；ASGI 模式下传入 Flask 应用的配置）
+
+    返回:
+        (MarkdownRenderer, str): (渲染器, 指纹)
+    """
+    config = config if config is not None else current_app.config
+    settings = (
+        bool(config.get('MARKDOWN_ALLOW_IMAGES', True)),
+        config.get('MARKDOWN_LINK_REL', 'nofollow noopener noreferrer')
+    )
+    cached = _renderers.get(settings)
+    if cached is None:
+        # 延迟导入：只有写文章或 format=html 时才需要渲染器，不计入启动耗时
+        from markdown_render import MarkdownRenderer, RENDERER_VERSION
+        digest = hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()[:8]
+        renderer = MarkdownRenderer(allow_images=settings[0], link_rel=settings[1])
+        cached = _renderers[settings] = (renderer, f'v{RENDERER_VERSION}-{digest}')
+    return cached
+
+
+def is_fresh(render, config=None):
+    """存储的 HTML 是否由当前渲染器生成"""
+    return render is not None and render.renderer == get_renderer(config)[1]
+
+
+def render_html(content, config=None):
+    """用当前渲染器渲染 Markdown（不保存）"""
+    return get_renderer(config)[0].render(content)
+
+
+# ==================== 写入 ====================
+
+def render_post(post):
+    """
+    渲染文章并保存（create_post / update_post 中调用，调用方负责提交事务）
+
+    参数:
+        post: 已 flush（有 id）的 Post 对象
+
+    返回:
+        PostRender: 渲染结果
+    """
+    renderer, fingerprint = get_renderer()
+    content = post.content
+    digest = content_hash(content)
+
+    render = db.session.get(PostRender, post.id)
+    if render is not None and render.content_hash == digest and render.renderer == fingerprint:
+        return render
+
+    html = renderer.render(content)
+    if render is None:
+        render = PostRender(post_id=post.id, content_hash=digest, renderer=fingerprint, html=html)
+        db.session.add(render)
+    else:
+        render.content_hash = digest
+        render.renderer = fingerprint
+        render.html = html
+    return render
+
+
+def forget(post_id):
+    """删除文章前调用：删除渲染结果（调用方负责提交事务）"""
+    db.session.execute(db.delete(PostRender).where(PostRender.post_id == post_id))
+
+
+# ==================== 读取 ====================
+
+def get_html(post):
+    """
+    读取文章的 HTML：有最新的渲染结果直接返回，否则在内存中渲染后返回（不保存）
+
+    没有渲染结果的只有两种情况：预渲染功能上线前的旧文章、渲染器配置变化后尚未批量重新渲染，
+    执行 python post_html.py 保存后就不再需要读取时渲染。
+    """
+    render = db.session.get(PostRender, post.id)
+    if is_fresh(render):
+        return render.html
+    return render_html(post.content)
+
+
+# ==================== 批量重新渲染 ====================
+
+def rerender_all(batch_size=200, force=False, pause=0.0):
+    """
+    批量检查并重新渲染文章
+
+    渲染结果缺失、渲染器指纹不一致、或内容哈希与当前内容不一致的文章会被重新渲染。
+
+    参数:
+        batch_size: 每批处理的文章数
+        force:      是否全部重新渲染
+        pause:      每批之间暂停的秒数
+
+    返回:
+        (int, int): (扫描的文章数, 重新渲染的文章数)
+    """
+    renderer, fingerprint = get_renderer()
+    last_id, scanned, rendered = 0, 0, 0
+    while True:
+        posts = db.session.execute(
+            db.select(Post).where(Post.id > last_id).options(undefer(Post.content_blob))
+            .order_by(Post.id).limit(batch_size)
+        ).scalars().all()
+        if not posts:
+            break
+        last_id = posts[-1].id
+        scanned += len(posts)
+
+        renders = {
+            render.post_id: render
+            for render in db.session.execute(
+                db.select(PostRender).where(PostRender.post_id.in_([post.id for post in posts]))
+            ).scalars()
+        }
+        for post in posts:
+            content = post.content
+            digest = content_hash(content)
+            render = renders.get(post.id)
+            if not force and render is not None and render.renderer == fingerprint and render.content_hash == digest:
+                continue
+            if render is None:
+                render = PostRender(post_id=post.id)
+                db.session.add(render)
+            render.content_hash = digest
+            render.renderer = fingerprint
+            render.html = renderer.render(content)
+            rendered += 1
+        db.session.commit()
+        # 每批结束后释放已加载的对象，内存不随文章数增长
+        db.session.expunge_all()
+
+        if pause:
+            time.sleep(pause)
+    return scanned, rendered
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='批量重新渲染文章 HTML（渲染器版本或配置变化后执行）')
+    parser.add_argument('--batch', type=int, default=200, help='每批处理的文章数')
+    parser.add_argument('--pause', type=float, default=0.0, help='每批之间暂停的秒数')
+    parser.add_argument('--force', action='store_true', help='全部重新渲染（默认只渲染缺失或过期的）')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        # 启用分片时逐个分片处理
+        for key in shards.targets:
+            with shards.use(key):
+                started = time.perf_counter()
+                scanned, rendered = rerender_all(args.batch, args.force, args.pause)
+                print(f"✅ {f'分片 {key}：' if key is not None else ''}扫描 {scanned} 篇文章，"
+                      f"重新渲染 {rendered} 篇（渲染器 {get_renderer()[1]}），耗时 {time.perf_counter() - started:.1f} 秒")
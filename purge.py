@@ -0,0 +1,236 @@
+"""
+批量删除模块
+
+删除文章时不再通过 ORM 级联把所有评论加载到内存后逐条 DELETE，而是：
+    1. 按主键分批选出评论ID（每批 PURGE_CHUNK_SIZE 条），一条 DELETE ... WHERE id IN (...) 删除，
+       同一批里按评论者扣减作者统计、记录变更流墓碑
+    2. 最后一批评论和文章本身及其标签、时间线、热度等关联数据在同一个事务中删除；
+       评论不超过一批时整个删除只有一个事务，失败时什么都不会删掉
+    3. 评论超过一批的文章不在请求中删除：DELETE 接口在请求事务中写入 post_purges 任务后返回 202，
+       由后台线程（PostPurger）完成；前面的批次各自提交，锁只持有很短的时间
+
+10 万条评论的文章只需要几十条语句，不会长时间占用请求线程或锁住 comments 表。
+每一批都是一致的（评论和作者统计同时提交）；任务持久化在数据库中，中途失败或进程退出后由后台线程继续。
+
+新建的表在外键上声明了 ON DELETE CASCADE，ORM 关系使用 passive_deletes，
+直接在数据库中删除用户/文章时由数据库级联清理；已有的表不会修改外键，以本模块的显式删除为准。
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, Post, Comment, PostPurge
+from cache import invalidate_post_caches
+from tags import release_post_tags
+from trending import trending
+from suggest import title_index
+from comment_events import comment_events
+from sharding import shards
+import author_stats
+import change_feed
+import post_html
+import timeline
+from sqlite_profile import write_transaction
+
+
+def chunk_size():
+    """每批删除的评论数"""
+    return current_app.config.get('PURGE_CHUNK_SIZE', 5000)
+
+
+def _delete_comments(post_id, ids):
+    """删除一批评论，同时扣减作者统计、记录变更流墓碑（调用方负责提交事务）"""
+    counts = dict(db.session.execute(
+        db.select(Comment.author_id, db.func.count())
+        .where(Comment.id.in_(ids))
+        .group_by(Comment.author_id)
+    ).all())
+    db.session.execute(
+        db.delete(Comment).where(Comment.id.in_(ids)),
+        execution_options={'synchronize_session': False}
+    )
+    author_stats.record_comments(counts, -1)
+    change_feed.record_deletes('comment', ids, post_id)
+
+
+def has_many_comments(post_id):
+    """评论是否超过一批（超过时交给后台线程删除）"""
+    size = chunk_size()
+    first_chunk = db.select(Comment.id).where(Comment.post_id == post_id).limit(size + 1).subquery()
+    return db.session.scalar(db.select(db.func.count()).select_from(first_chunk)) > size
+
+
+def delete_post(post_id):
+    """
+    删除文章：分批删除评论，最后一批评论和文章本身及其关联数据在同一个事务中删除，提交后清理缓存和索引
+
+    评论超过一批时前面的批次各自提交，并顺带续期后台删除任务的租约；
+    同一个事务里删除文章时也删除文章的后台删除任务。
+    请求线程和后台线程共用；启用分片时调用方需要先选定文章所在的分片。
+
+    参数:
+        post_id: 文章ID
+
+    返回:
+        int|None: 删除的评论数；文章已经不存在时返回 None
+    """
+    post = db.session.get(Post, post_id)
+    if post is None:
+        db.session.execute(db.delete(PostPurge).where(PostPurge.post_id == post_id))
+        db.session.commit()
+        return None
+    author_id = post.author_id
+
+    # 多取一条判断后面是否还有评论：还有时这一批单独提交，否则留到删除文章的事务里
+    size = chunk_size()
+    comment_count = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Comment.id).where(Comment.post_id == post_id).limit(size + 1)
+        ).scalars().all()
+        if len(ids) <= size:
+            break
+        _delete_comments(post_id, ids[:size])
+        db.session.execute(
+            db.update(PostPurge).where(PostPurge.post_id == post_id).values(claimed_at=datetime.now())
+        )
+        db.session.commit()
+        comment_count += size
+    if ids:
+        _delete_comments(post_id, ids)
+        comment_count += len(ids)
+
+    release_post_tags(post)
+    timeline.remove_post(post_id)
+    trending.forget(post_id)
+    post_html.forget(post_id)
+    db.session.delete(post)
+    db.session.flush()
+    author_stats.record_post(author_id, -1)
+    change_feed.record('post', post_id, 'delete')
+    db.session.execute(db.delete(PostPurge).where(PostPurge.post_id == post_id))
+    db.session.commit()
+    invalidate_post_caches(author_id=author_id)
+    title_index.remove(post_id)
+    comment_events.publish(post_id)
+    return comment_count
+
+
+class PostPurger:
+    """
+    后台删除评论很多的文章
+
+    待删除的文章记录在 post_purges 表中（和 202 响应在同一个事务中写入），进程重启不会丢失。
+    每个进程一个后台线程：领取任务时写入 claimed_at（租约），删除过程中每批续期；
+    租约超过 lease_seconds 未续期（进程退出或删除失败）的任务由任意进程的线程重新领取。
+    没有任务时每 poll_interval 秒检查一次，本进程提交任务时立即唤醒。
+    """
+
+    def __init__(self, poll_interval=60, lease_seconds=600):
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """读取配置；收到请求时按需启动后台线程（继续处理之前进程留下的任务）"""
+        self.app = app
+        self.poll_interval = app.config.get('PURGE_POLL_INTERVAL', self.poll_interval)
+        self.lease_seconds = app.config.get('PURGE_LEASE_SECONDS', self.lease_seconds)
+        app.extensions['post_purger'] = self
+        app.before_request(self._ensure_thread)
+
+    def submit(self, post_id):
+        """
+        登记后台删除任务并提交事务（在当前选定的分片上删除）；文章已经登记过时不重复登记
+
+        参数:
+            post_id: 文章ID
+        """
+        if db.session.get(PostPurge, post_id) is None:
+            db.session.add(PostPurge(post_id=post_id, shard=shards.current))
+        db.session.commit()
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def join(self, timeout=10):
+        """
+        等待 post_purges 中的任务全部完成（测试使用）
+
+        返回:
+            bool: 全部完成返回 True，超时返回 False
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.app.app_context():
+                if db.session.scalar(db.select(db.func.count()).select_from(PostPurge)) == 0:
+                    return True
+            self._wakeup.set()
+            time.sleep(0.05)
+        return False
+
+    def _ensure_thread(self):
+        """按需启动后台线程（fork 出的子进程会重新启动自己的线程）"""
+        pid = os.getpid()
+        if self.app is None or (self._thread is not None and self._pid == pid):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='post-purge', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """后台线程：领取一篇删除一篇，没有任务时等待"""
+        while self._thread is threading.current_thread():
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    job = self._claim()
+                    if job is not None:
+                        self._purge(*job)
+                        continue
+            except Exception as e:
+                # 已提交的批次不会回滚；任务保留，租约过期后重新领取
+                self.app.logger.error(f'后台删除文章失败: {str(e)}')
+            self._wakeup.wait(self.poll_interval)
+
+    def _claim(self):
+        """
+        领取一个未领取或租约已过期的任务
+
+        返回:
+            tuple|None: (分片, 文章ID)；没有可领取的任务时返回 None
+        """
+        now = datetime.now()
+        available = db.or_(PostPurge.claimed_at.is_(None),
+                           PostPurge.claimed_at < now - timedelta(seconds=self.lease_seconds))
+        jobs = db.session.execute(
+            db.select(PostPurge.post_id, PostPurge.shard).where(available)
+            .order_by(PostPurge.created_at).limit(10)
+        ).all()
+        db.session.commit()
+        for post_id, key in jobs:
+            # 条件更新：多个进程同时领取时只有一个成功
+            claimed = db.session.execute(
+                db.update(PostPurge).where(PostPurge.post_id == post_id, available).values(claimed_at=now)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return key, post_id
+        return None
+
+    def _purge(self, key, post_id):
+        """删除一篇已领取的文章"""
+        with shards.use(key), write_transaction():
+            comment_count = delete_post(post_id)
+        self.app.logger.info(f'后台删除文章完成: #{post_id}，评论 {comment_count} 条')
+
+
+# 全局单例，在 create_app 中调用 post_purger.init_app(app)
+post_purger = PostPurger()
@@ -0,0 +1,462 @@
+"""
+文章列表查询构建模块
+
+功能：
+    1. 解析并规范化 GET /api/posts 的查询参数
+    2. 根据参数构建 SQLAlchemy select 语句（同步路由和异步路由共用）
+    3. 组装列表接口的返回数据，保证不同服务模式下 JSON 结构完全一致
+    4. GET /api/posts/batch 的参数解析、查询和返回数据（同样由两种服务模式共用）
+    5. 列表总数的几种计算方式（count 参数）：
+       exact    - 每次 COUNT(*)
+       cached   - 按过滤条件缓存 COUNT 结果（TTL + 文章写操作失效）
+       estimate - 无过滤条件时用表统计信息估算，有过滤条件时退化为 cached
+       none     - 不计算总数，多取一条判断是否有下一页
+       当前页不满一页（或第一页就没有下一页）时总数可以直接算出，任何模式都不执行 COUNT
+    6. 启用分片时（见 sharding.py），按作者过滤只查作者所在的分片，否则并行查询所有分片：
+       分页取各分片的前 offset + per_page + 1 条按排序键归并，总数为各分片之和
+"""
+from math import ceil
+from sqlalchemy.orm import selectinload, undefer
+from models import db, Post, Tag, post_tags
+from exceptions import BadRequestError
+from cache import count_cache
+from content_store import content_store
+from sharding import shards, merge
+
+
+# 列表总数的计算方式
+COUNT_MODES = ('exact', 'cached', 'estimate', 'none')
+
+# 允许的排序字段（防止注入）
+ALLOWED_SORT = {
+    'created_at': Post.created_at,
+    'updated_at': Post.updated_at,
+    'title': Post.title,
+    'view_count': Post.view_count
+}
+
+
+def parse_post_list_args(args, default_count='exact'):
+    """
+    解析文章列表查询参数
+
+    参数:
+        args:          查询参数（request.args 或同类型的 MultiDict）
+        default_count: 未传 count 参数时使用的总数计算方式（配置项 POST_COUNT_MODE）
+
+    返回:
+        dict: 规范化后的参数
+    """
+    page = args.get('page', 1, type=int)
+    per_page = args.get('per_page', 10, type=int)
+
+    # 限制 per_page 范围，防止一次查太多
+    if per_page > 100:
+        per_page = 100
+    if per_page < 1:
+        per_page = 10
+
+    # 标签：支持 ?tag=a&tag=b 和 ?tag=a,b 两种写法
+    tags = []
+    for value in args.getlist('tag'):
+        for name in value.split(','):
+            name = name.strip().lower()
+            if name and name not in tags:
+                tags.append(name)
+
+    return {
+        'page': page,
+        'per_page': per_page,
+        'keyword': args.get('keyword', '').strip(),
+        'author_id': args.get('author_id', type=int),
+        'tags': tags,
+        'tag_mode': 'any' if args.get('tag_mode') == 'any' else 'all',
+        'sort': args.get('sort', 'created_at'),
+        'order': args.get('order', 'desc'),
+        'count': args.get('count') if args.get('count') in COUNT_MODES else default_count
+    }
+
+
+def cache_params(params):
+    """把规范化后的参数转成可哈希的元组（用作缓存 key）"""
+    return (
+        params['page'], params['per_page'], params['keyword'],
+        params['author_id'], tuple(params['tags']), params['tag_mode'],
+        params['sort'], params['order'], params['count']
+    )
+
+
+def build_post_list_query(params):
+    """
+    构建文章列表查询（过滤 + 排序，不含分页）
+
+    参数:
+        params: parse_post_list_args 的返回值
+
+    返回:
+        Select: SQLAlchemy select 语句
+    """
+    stmt = db.select(Post).options(undefer(Post.content_blob))
+
+    # ---- 过滤：按关键字搜索（标题或内容包含关键字） ----
+    keyword = params['keyword']
+    if keyword:
+        stmt = stmt.where(
+            db.or_(
+                Post.title.contains(keyword),
+                Post.content.contains(keyword)
+            )
+        )
+
+    # ---- 过滤：按作者ID ----
+    if params['author_id']:
+        stmt = stmt.where(Post.author_id == params['author_id'])
+
+    # ---- 过滤：按标签（走 post_tags 的 (tag_id, post_id) 索引） ----
+    if params['tags']:
+        tagged = (
+            db.select(post_tags.c.post_id)
+            .join(Tag, Tag.id == post_tags.c.tag_id)
+            .where(Tag.name.in_(params['tags']))
+        )
+        if params['tag_mode'] == 'all':
+            # 同时包含所有标签
+            tagged = tagged.group_by(post_tags.c.post_id).having(
+                db.func.count(post_tags.c.tag_id) == len(params['tags'])
+            )
+        stmt = stmt.where(Post.id.in_(tagged))
+
+    # ---- 排序 ----
+    sort_column = ALLOWED_SORT.get(params['sort'], Post.created_at)
+    if params['order'] == 'asc':
+        stmt = stmt.order_by(sort_column.asc())
+    else:
+        stmt = stmt.order_by(sort_column.desc())
+
+    return stmt
+
+
+def page_statement(stmt, params):
+    """当前页的查询：多取一条，用来判断是否还有下一页"""
+    per_page = params['per_page']
+    offset = (max(params['page'], 1) - 1) * per_page
+    return stmt.limit(per_page + 1).offset(offset)
+
+
+def split_page(rows, params):
+    """
+    拆分 page_statement 的结果
+
+    返回:
+        (list, bool): (当前页文章列表, 是否有下一页)
+    """
+    per_page = params['per_page']
+    return rows[:per_page], len(rows) > per_page
+
+
+def post_list_shards(params):
+    """文章列表需要查询的分片：按作者过滤时只查作者所在的分片（未启用分片时为 [None]）"""
+    if shards.enabled and params['author_id']:
+        return [shards.for_author(params['author_id'])]
+    return shards.targets
+
+
+def fetch_page(stmt, params):
+    """
+    执行分页查询（同步路由使用）
+
+    只查一个分片（或未启用分片）时直接执行 page_statement；
+    多个分片时每个分片按同样的排序取前 offset + per_page + 1 条（排序值相同时按ID），
+    并行查询后按排序键归并，再切出当前页。
+
+    参数:
+        stmt:   build_post_list_query 的返回值
+        params: parse_post_list_args 的返回值
+
+    返回:
+        (list, bool): (当前页文章列表, 是否有下一页)
+    """
+    keys = post_list_shards(params)
+    if len(keys) == 1:
+        rows = shards.fan_out(lambda: db.session.execute(page_statement(stmt, params)).scalars().all(), keys)[0]
+        return split_page(rows, params)
+
+    per_page = params['per_page']
+    offset = (max(params['page'], 1) - 1) * per_page
+    descending = params['order'] != 'asc'
+    sort_name = ALLOWED_SORT.get(params['sort'], Post.created_at).key
+    shard_stmt = stmt.order_by(Post.id.desc() if descending else Post.id.asc()).limit(offset + per_page + 1)
+    results = shards.fan_out(lambda: db.session.execute(shard_stmt).scalars().all(), keys)
+
+    def sort_key(post):
+        # 与数据库一致：NULL 排在升序的最前面
+        value = getattr(post, sort_name)
+        return (value is not None, value if value is not None else 0, post.id)
+
+    rows = merge(results, key=sort_key, reverse=descending, start=offset, stop=offset + per_page + 1)
+    return split_page(rows, params)
+
+
+def known_total(posts, has_next, params):
+    """
+    不执行 COUNT 就能确定的总数：没有下一页时，总数 = 前面各页 + 当前页
+
+    返回:
+        int|None: 能确定时返回总数，否则返回 None
+    """
+    if has_next or (not posts and params['page'] > 1):
+        return None
+    return (max(params['page'], 1) - 1) * params['per_page'] + len(posts)
+
+
+def has_filters(params):
+    """是否带有过滤条件（影响总数的参数）"""
+    return bool(params['keyword'] or params['author_id'] or params['tags'])
+
+
+def count_statement(stmt):
+    """精确总数：对过滤后的查询做 COUNT(*)"""
+    return db.select(db.func.count()).select_from(stmt.order_by(None).subquery())
+
+
+def estimate_statement(dialect_name):
+    """
+    文章总数的估算语句（不扫描 posts 表）
+
+    MySQL 读取 information_schema 中 InnoDB 维护的行数统计；
+    SQLite 没有现成的行数统计，用主键范围估算（只读主键索引的两端）。
+    其他数据库返回 None，调用方退化为精确 COUNT。
+    """
+    if dialect_name == 'mysql':
+        return db.text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'posts'"
+        )
+    if dialect_name == 'sqlite':
+        return db.select(db.func.coalesce(db.func.max(Post.id) - db.func.min(Post.id) + 1, 0))
+    return None
+
+
+def estimate_posts():
+    """
+    文章总数的估算值（启用分片时各分片分别估算后相加）
+
+    返回:
+        int|None: 估算值，数据库不支持估算时返回 None
+    """
+    total = 0
+    for key in shards.targets:
+        engine = shards.engine(key)
+        estimate = estimate_statement(engine.dialect.name)
+        if estimate is None or (shards.enabled and engine.dialect.name == 'sqlite'):
+            # 分片后各分片的文章ID交错分布，主键范围估算不再成立
+            return None
+        with shards.use(key):
+            total += db.session.execute(estimate, bind_arguments={'bind': engine}).scalar() or 0
+    return total
+
+
+def exact_count(stmt, params):
+    """精确总数（启用分片时各分片分别 COUNT 后相加）"""
+    return sum(shards.fan_out(
+        lambda: db.session.execute(count_statement(stmt)).scalar(), post_list_shards(params)
+    ))
+
+
+def count_cache_key(params):
+    """总数缓存的 key：只包含影响总数的过滤条件（分页、排序不影响总数）"""
+    signature = (params['keyword'], params['author_id'], tuple(params['tags']), params['tag_mode'])
+    return count_cache.make_key(signature, author_id=params['author_id'])
+
+
+def count_posts(stmt, params):
+    """
+    按 params['count'] 指定的方式计算列表总数（同步路由使用）
+
+    参数:
+        stmt:   build_post_list_query 的返回值
+        params: parse_post_list_args 的返回值
+
+    返回:
+        int|None: 总数，count=none 时返回 None
+    """
+    mode = params['count']
+    if mode == 'none':
+        return None
+
+    if mode == 'estimate' and not has_filters(params):
+        estimate = estimate_posts()
+        if estimate is not None:
+            return estimate
+    if mode in ('cached', 'estimate'):
+        key = count_cache_key(params)
+        total = count_cache.get(key)
+        if total is None:
+            total = exact_count(stmt, params)
+            count_cache.set(key, total)
+        return total
+
+    return exact_count(stmt, params)
+
+
+def ranked_post_page(ranked_ids, params):
+    """
+    按给定的排行（文章ID列表）分页，用于 sort=trending
+
+    没有过滤条件时直接对排行列表切片；有过滤条件时先用一条 IN 查询
+    找出排行中满足条件的文章，再按排名顺序切片。启用分片时按文章所在的分片分组查询。
+
+    参数:
+        ranked_ids: 按排名降序的文章ID列表
+        params:     parse_post_list_args 的返回值
+
+    返回:
+        (list, int): (当前页文章对象列表, 满足条件的总数)
+    """
+    if params['order'] == 'asc':
+        ranked_ids = ranked_ids[::-1]
+
+    if ranked_ids and (params['keyword'] or params['author_id'] or params['tags']):
+        matched = set()
+        for found in shards.fan_out_posts(ranked_ids, lambda ids: db.session.execute(
+            build_post_list_query(params)
+            .with_only_columns(Post.id)
+            .order_by(None)
+            .where(Post.id.in_(ids))
+        ).scalars().all()):
+            matched.update(found)
+        ranked_ids = [post_id for post_id in ranked_ids if post_id in matched]
+
+    start = (max(params['page'], 1) - 1) * params['per_page']
+    page_ids = ranked_ids[start:start + params['per_page']]
+
+    found = {}
+    for rows in shards.fan_out_posts(page_ids, lambda ids: db.session.execute(
+        db.select(Post).where(Post.id.in_(ids)).options(undefer(Post.content_blob))
+    ).scalars().all()):
+        found.update((post.id, post) for post in rows)
+    posts = [found[post_id] for post_id in page_ids if post_id in found]
+
+    return posts, len(ranked_ids)
+
+
+def post_list_data(posts, total, params, has_next=None):
+    """
+    组装文章列表接口的 data 部分
+
+    参数:
+        posts:    当前页的文章对象列表
+        total:    满足条件的文章总数（count=none 时为 None）
+        params:   parse_post_list_args 的返回值
+        has_next: 是否有下一页（不传时根据 total 计算）
+
+    返回:
+        dict: 接口返回的 data
+    """
+    per_page = params['per_page']
+    # 与 Flask-SQLAlchemy Pagination 的计算方式保持一致
+    current_page = max(params['page'], 1)
+    if total is None:
+        total_pages = None
+    else:
+        total_pages = ceil(total / per_page) if total else 0
+    if has_next is None:
+        has_next = total_pages is not None and current_page < total_pages
+
+    return {
+        'posts': [post.to_dict() for post in posts],
+        'pagination': {
+            'total': total,
+            'page': params['page'],
+            'per_page': per_page,
+            'total_pages': total_pages,
+            'has_next': has_next,
+            'has_prev': current_page > 1,
+            'count': params['count']
+        },
+        'filters': {
+            'keyword': params['keyword'] if params['keyword'] else None,
+            # 压缩存储的文章只有开头一段原文参与关键字搜索，告诉调用方匹配范围
+            'keyword_content_prefix': content_store.search_prefix if params['keyword'] and content_store.codec else None,
+            'author_id': params['author_id'],
+            'tags': params['tags'] if params['tags'] else None,
+            'tag_mode': params['tag_mode'],
+            'sort': params['sort'],
+            'order': params['order']
+        }
+    }
+
+
+# ==================== 批量获取文章 ====================
+
+def parse_batch_args(args, max_ids=200):
+    """
+    解析批量获取文章的参数
+
+    参数:
+        args:    查询参数（ids 支持 ?ids=1,2,3 和 ?ids=1&ids=2 两种写法）
+        max_ids: 一次最多获取的文章数
+
+    返回:
+        (list, bool): (去重后保持请求顺序的文章ID列表, 是否包含作者信息)
+    """
+    ids = []
+    for value in args.getlist('ids'):
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if not item.isdigit():
+                raise BadRequestError(f'文章ID不合法: {item}')
+            post_id = int(item)
+            if post_id not in ids:
+                ids.append(post_id)
+
+    if not ids:
+        raise BadRequestError('请提供文章ID列表 ids')
+    if len(ids) > max_ids:
+        raise BadRequestError(f'一次最多获取 {max_ids} 篇文章')
+
+    include_author = args.get('include_author', '').lower() in ('1', 'true', 'yes')
+    return ids, include_author
+
+
+def build_batch_query(ids, include_author=False):
+    """一条 IN 查询取出所有文章；需要作者时用 selectin 一次性预加载"""
+    stmt = db.select(Post).where(Post.id.in_(ids)).options(undefer(Post.content_blob))
+    if include_author:
+        stmt = stmt.options(selectinload(Post.author))
+    return stmt
+
+
+def fetch_batch(ids, include_author=False):
+    """
+    执行批量查询（同步路由使用；启用分片时按文章所在的分片分组并行查询）
+
+    返回:
+        list: 文章对象（顺序任意，不存在的文章不在其中）
+    """
+    results = shards.fan_out_posts(
+        ids, lambda group: db.session.execute(build_batch_query(group, include_author)).scalars().all()
+    )
+    return [post for posts in results for post in posts]
+
+
+def batch_data(posts, ids, include_author=False):
+    """
+    组装批量获取接口的 data 部分
+
+    参数:
+        posts:          查询到的文章对象（顺序任意）
+        ids:            请求的文章ID列表
+        include_author: 是否包含作者信息
+
+    返回:
+        dict: 按请求顺序排列的文章列表 + 不存在的文章ID
+    """
+    found = {post.id: post for post in posts}
+    return {
+        'posts': [found[post_id].to_dict(include_author=include_author) for post_id in ids if post_id in found],
+        'missing': [post_id for post_id in ids if post_id not in found],
+        'count': len(found)
+    }
@@ -0,0 +1,95 @@
+"""
+写接口请求体解析模块
+
+每个写接口声明一个 Schema（字段名 → validators.py 中预编译的字段规则），导入时生成对应的具名元组类型。
+请求时按声明顺序一次遍历完成取值、类型检查、去首尾空格和长度/格式校验，
+第一个不合法的字段抛出 BadRequestError（错误信息与原来逐个调用 validate_* 完全一致），
+路由拿到的是已经规范化的只读对象，直接用 form.title 等属性，不再重复 data.get / strip。
+
+使用方式：
+    form = POST_FORM.load()            # 读取请求体并解析
+    form = COMMENT_CREATE.parse(data)  # 已经取出请求体时
+"""
+from collections import namedtuple
+from flask import request
+from exceptions import BadRequestError
+from validators import (
+    MISSING, Raw, Integer,
+    USERNAME, EMAIL, PASSWORD, POST_TITLE, POST_CONTENT, POST_TAGS, COMMENT_CONTENT
+)
+
+
+def json_body():
+    """
+    读取 JSON 请求体
+
+    返回:
+        dict: 请求体
+
+    异常:
+        BadRequestError: 请求体为空或不是 JSON 对象
+    """
+    data = request.get_json()
+    if not data:
+        raise BadRequestError('请求体不能为空')
+    if not isinstance(data, dict):
+        raise BadRequestError('请求体必须是 JSON 对象')
+    return data
+
+
+class Schema:
+    """
+    请求体声明
+
+    参数:
+        name:   生成的具名元组类型名
+        fields: 字段名 → 字段规则（按校验顺序声明）
+    """
+
+    def __init__(self, name, **fields):
+        self.fields = tuple((field, rule.check) for field, rule in fields.items())
+        self.type = namedtuple(name, fields)
+
+    def parse(self, data):
+        """按声明顺序校验并规范化请求体，返回具名元组"""
+        get = data.get
+        return self.type._make([check(get(field, MISSING)) for field, check in self.fields])
+
+    def load(self):
+        """读取当前请求的 JSON 请求体并解析"""
+        return self.parse(json_body())
+
+
+# ==================== 用户 ====================
+
+REGISTER_FORM = Schema('RegisterForm', username=USERNAME, email=EMAIL, password=PASSWORD)
+
+# 先检查密码，再检查邮箱/用户名（二选一，由路由判断）
+LOGIN_FORM = Schema(
+    'LoginForm',
+    password=Raw('缺少必填字段: password'),
+    email=Raw(),
+    username=Raw()
+)
+
+# 新密码的强度在校验原密码之后再检查（PASSWORD.check）
+PASSWORD_FORM = Schema(
+    'PasswordForm',
+    old_password=Raw('请输入原密码'),
+    new_password=Raw('请输入新密码')
+)
+
+# ==================== 文章 ====================
+
+# tags 没传时为 None（更新文章时保留原有标签），传了就必须是合法的标签列表
+POST_FORM = Schema('PostForm', title=POST_TITLE, content=POST_CONTENT, tags=POST_TAGS)
+
+# ==================== 评论 ====================
+
+COMMENT_CREATE = Schema(
+    'CommentCreateForm',
+    content=COMMENT_CONTENT,
+    parent_id=Integer('parent_id 必须是整数')
+)
+
+COMMENT_UPDATE = Schema('CommentUpdateForm', content=COMMENT_CONTENT)
@@ -0,0 +1,676 @@
+"""
+文章 / 评论按作者水平分片
+
+单个数据库放不下所有文章和评论时，把它们按作者分散到多个数据库（分片）：
+    1. 分片由 SHARD_DATABASE_URLS 配置（name=url，逗号分隔），注册为 Flask-SQLAlchemy 的 bind；
+       未配置时不分片，所有表都在主库，行为与之前完全一致
+    2. 作者ID通过一致性哈希环映射到分片（每个分片 SHARD_VIRTUAL_NODES 个虚拟节点），
+       增加一个分片只有约 1/N 的作者需要迁移
+    3. 作者的文章，以及文章的评论、标签、渲染结果、热度、时间线记录都在作者所在的分片上
+       （SHARDED_TABLES），按作者或按文章的操作只访问一个分片；
+       用户、关注、作者统计、变更日志等留在主库
+    4. 文章 / 评论ID由主库的 post_directory / comment_directory 自增分配（全局唯一），
+       同时记下文章的作者、评论所属的文章，按ID访问时由此定位分片（结果在进程内缓存）
+
+路由：
+    请求先选定分片（路由装饰器 by_post / by_comment / by_author / by_current_user，或 shards.use），
+    数据库会话按语句涉及的表选择引擎：分片表发往选定的分片，其他表发往主库。
+    访问分片表却没有选定分片、或一条语句同时涉及分片表和主库表时直接报错，不会悄悄查错库。
+
+跨分片查询：
+    文章列表、标签云、时间线等在线程池中并行查询各分片（fan_out），每个分片按同样的排序取前 N 条，
+    再按排序键做 k 路归并（merge）。
+
+迁移：
+    python sharding.py status                查看各分片的文章数和评论数
+    python sharding.py rebalance [--dry-run] 把主库中分片之前的数据、以及增减分片后归属改变的作者
+                                             迁移到所属分片（分批复制后删除，中断后重新执行即可）
+"""
+import argparse
+import bisect
+import hashlib
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, select, insert, update, delete, func, bindparam
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql.util import find_tables
+from exceptions import NotFoundError
+from sqlite_profile import register_sqlite_profile
+
+# 放在分片上的表（都通过 post_id 跟随文章；tags 在每个分片上各有一份）
+SHARDED_TABLES = frozenset(('posts', 'comments', 'tags', 'post_tags', 'post_renders', 'post_trending', 'timelines'))
+
+# 迁移作者时复制的表（父表在前，删除时倒序）及其关联文章的列
+MOVED_TABLES = (
+    ('posts', 'id'), ('comments', 'post_id'), ('post_tags', 'post_id'),
+    ('post_renders', 'post_id'), ('post_trending', 'post_id'), ('timelines', 'post_id')
+)
+
+# 当前选定的分片（每个线程 / 协程独立）
+_current_shard = ContextVar('current_shard', default=None)
+
+
+class HashRing:
+    """
+    一致性哈希环
+
+    每个节点在环上放 replicas 个虚拟节点（位置为 md5(节点名#序号)），
+    key 沿环顺时针遇到的第一个虚拟节点就是它所属的节点。
+    增加一个节点时它只从已有节点各接管一小段，约 1/N 的 key 改变归属。
+    """
+
+    def __init__(self, nodes=(), replicas=128):
+        self.replicas = replicas
+        self._points = []  # 排好序的虚拟节点位置
+        self._owners = []  # 与 _points 一一对应的节点名
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def position(value):
+        """在环上的位置（md5 前 8 字节，各进程、各次启动结果一致）"""
+        return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+    @property
+    def nodes(self):
+        """环上的节点（按名称排序）"""
+        return sorted(set(self._owners))
+
+    def add(self, node):
+        """加入一个节点"""
+        for i in range(self.replicas):
+            point = self.position(f'{node}#{i}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        """移除一个节点"""
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def get(self, key):
+        """key 所属的节点"""
+        if not self._points:
+            raise LookupError('哈希环上没有节点')
+        index = bisect.bisect(self._points, self.position(key)) % len(self._points)
+        return self._owners[index]
+
+
+def merge(results, key=None, reverse=False, start=0, stop=None):
+    """
+    k 路归并：results 中每个列表都已按 key 排好序（reverse=True 表示降序），合并后取 [start, stop)
+
+    参数:
+        results: 各分片的查询结果
+        key:     排序键（必须与各分片 ORDER BY 的顺序一致）
+
+    返回:
+        list: 合并后的结果
+    """
+    return list(itertools.islice(heapq.merge(*results, key=key, reverse=reverse), start, stop))
+
+
+class ShardedSession(Session):
+    """
+    按分片路由的数据库会话（启用分片时 shards.init_app 把 models.db 的会话换成这个类）
+
+    涉及分片表的语句发往当前选定的分片，其他语句沿用 Flask-SQLAlchemy 的规则（主库）。
+    分片上的连接由会话自己打开并开始事务，再作为 bind 交给 SQLAlchemy（join_transaction_mode='rollback_only'：
+    SQLAlchemy 回滚时一起回滚、提交时不提交），提交时先逐个提交分片、最后提交主库（见 commit）。
+    """
+
+    def __init__(self, db, **kwargs):
+        kwargs.setdefault('join_transaction_mode', 'rollback_only')
+        super().__init__(db, **kwargs)
+        self._shard_connections = {}  # 分片引擎 -> 本会话在该分片上的连接
+        self._shards_committed = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and shards.enabled:
+            engine = shards.engine_for(mapper, clause)
+            if engine is not None:
+                return self._shard_connection(engine)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _shard_connection(self, engine):
+        """本会话在分片上的连接（第一次使用时打开并开始事务）"""
+        conn = self._shard_connections.get(engine)
+        if conn is None:
+            conn = self._shard_connections[engine] = engine.connect()
+            conn.begin()
+        return conn
+
+    def commit(self):
+        """
+        提交事务：先提交各分片，最后提交主库
+
+        主库和分片不是一个原子事务（没有两阶段提交）。先提交分片：主库提交失败时，分片上的修改已经生效，
+        但主库中没有对应的目录和变更记录（新文章 / 评论按ID访问不到，变更流和评论推送里没有这次修改）；
+        主库的目录和变更记录不会指向从未提交的数据。
+        """
+        if self._shard_connections:
+            # 先 flush，分片上的修改都写进各自的事务之后再提交
+            self.flush()
+            for conn in self._shard_connections.values():
+                conn.commit()
+            self._shards_committed = True
+        super().commit()
+        # 失败时由调用方的 rollback（或请求结束时的 close）关闭分片连接
+        self._release_shards()
+
+    def rollback(self):
+        try:
+            if self._shards_committed:
+                # 分片已经提交、主库提交失败：分片上的事务已经结束，不能再回滚。
+                # 关闭会话，主库的事务随之回滚（对象脱离会话，不会被标记为过期）
+                super().close()
+            else:
+                super().rollback()
+        finally:
+            self._release_shards()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release_shards()
+
+    def _release_shards(self):
+        """关闭分片连接（还没提交的事务随之回滚），下一个事务重新打开"""
+        connections, self._shard_connections = self._shard_connections, {}
+        self._shards_committed = False
+        for conn in connections.values():
+            conn.close()
+
+
+class ShardRouter:
+    """分片路由（进程内）"""
+
+    def __init__(self, replicas=128, query_threads=8, cache_size=100000):
+        self.replicas = replicas
+        self.query_threads = query_threads
+        self.cache_size = cache_size
+        self.app = None
+        self.db = None
+        self.names = []
+        self.ring = HashRing(replicas=replicas)
+        self._post_authors = {}   # 文章ID -> 作者ID
+        self._comment_posts = {}  # 评论ID -> 文章ID
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def init_app(self, app):
+        """读取配置，为 SQLite 分片启用调优配置（需要在 db.init_app 之后调用）"""
+        self.app = app
+        self.db = app.extensions['sqlalchemy']
+        self.replicas = app.config.get('SHARD_VIRTUAL_NODES', self.replicas)
+        self.query_threads = app.config.get('SHARD_QUERY_THREADS', self.query_threads)
+        self.cache_size = app.config.get('SHARD_DIRECTORY_CACHE', self.cache_size)
+        self.names = list(app.config.get('SHARD_BINDS') or {})
+        self.ring = HashRing(self.names, self.replicas)
+        # 只有启用分片时才换用按分片路由的会话并在 flush 前分配全局ID，未启用时是 Flask-SQLAlchemy 默认的会话
+        self.db.session.session_factory.class_ = ShardedSession if self.enabled else Session
+        if self.enabled and not event.contains(ShardedSession, 'before_flush', _assign_ids):
+            event.listen(ShardedSession, 'before_flush', _assign_ids)
+        # 重新初始化时清空：缓存的是上一次配置的数据库中的目录
+        self._post_authors.clear()
+        self._comment_posts.clear()
+        with app.app_context():
+            for name in self.names:
+                register_sqlite_profile(app, self.db.engines[name])
+        app.extensions['shards'] = self
+
+    @property
+    def enabled(self):
+        """是否启用了分片"""
+        return bool(self.names)
+
+    @property
+    def targets(self):
+        """需要逐个处理的位置：各分片；未启用分片时为 [None]（主库）"""
+        return self.names if self.names else [None]
+
+    @property
+    def current(self):
+        """当前选定的分片"""
+        return _current_shard.get()
+
+    # ==================== 路由 ====================
+
+    @contextmanager
+    def use(self, key):
+        """在 with 块内选定分片（key 为 None 表示只访问主库）"""
+        token = _current_shard.set(key)
+        try:
+            yield key
+        finally:
+            _current_shard.reset(token)
+
+    def for_author(self, author_id):
+        """作者所在的分片"""
+        return self.ring.get(author_id)
+
+    def engine_for(self, mapper, clause):
+        """
+        语句应该发往的引擎：涉及分片表时返回当前分片的引擎，否则返回 None（主库）
+        """
+        tables = set()
+        if mapper is not None:
+            tables.add(inspect(mapper).local_table.name)
+        if clause is not None:
+            tables.update(
+                table.name for table in find_tables(clause, check_columns=True, include_crud=True)
+                if getattr(table, 'name', None)
+            )
+        sharded = tables & SHARDED_TABLES
+        if not sharded:
+            return None
+        if len(sharded) != len(tables):
+            raise RuntimeError(f'同一条语句不能同时访问分片表和主库表: {", ".join(sorted(tables))}')
+        key = _current_shard.get()
+        if key is None:
+            raise RuntimeError(f'访问分片表（{", ".join(sorted(sharded))}）之前需要先选定分片')
+        return self.db.engines[key]
+
+    def engine(self, key):
+        """分片的引擎（None 表示主库）"""
+        return self.db.engines[key]
+
+    # ==================== 按ID定位 ====================
+
+    def _lookup(self, cache, table_name, column, ids):
+        """查询目录表（先查进程内缓存）：{ID: column 的值}，目录中没有的ID不在结果中"""
+        found, missing = {}, []
+        for item in ids:
+            value = cache.get(item)
+            if value is None:
+                missing.append(item)
+            else:
+                found[item] = value
+        if missing:
+            table = self.db.metadata.tables[table_name]
+            rows = self.db.session.execute(
+                select(table.c.id, table.c[column]).where(table.c.id.in_(missing))
+            ).all()
+            with self._lock:
+                if len(cache) + len(rows) > self.cache_size:
+                    cache.clear()
+                cache.update(rows)
+            found.update(rows)
+        return found
+
+    def post_shards(self, post_ids):
+        """
+        文章所在的分片
+
+        返回:
+            dict: {文章ID: 分片}（不存在的文章不在结果中）
+        """
+        authors = self._lookup(self._post_authors, 'post_directory', 'author_id', post_ids)
+        return {post_id: self.ring.get(author_id) for post_id, author_id in authors.items()}
+
+    def post_shard(self, post_id):
+        """单篇文章所在的分片（文章不存在时返回 None）"""
+        return self.post_shards([post_id]).get(post_id)
+
+    def comment_shard(self, comment_id):
+        """评论所在的分片（与所属文章相同；评论不存在时返回 None）"""
+        post_id = self._lookup(self._comment_posts, 'comment_directory', 'post_id', [comment_id]).get(comment_id)
+        return None if post_id is None else self.post_shard(post_id)
+
+    # ==================== 路由装饰器 ====================
+
+    def _route(self, locate, missing_message=None):
+        """生成路由装饰器：locate(kwargs) 返回分片，找不到时返回 404（未启用分片时不做任何事）"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                key = locate(kwargs)
+                if key is None:
+                    raise NotFoundError(missing_message)
+                with self.use(key):
+                    return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def by_post(self, arg='post_id'):
+        """按 URL 中的文章ID选定分片"""
+        return self._route(lambda kwargs: self.post_shard(kwargs[arg]), '文章不存在')
+
+    def by_comment(self, arg='comment_id'):
+        """按 URL 中的评论ID选定分片"""
+        return self._route(lambda kwargs: self.comment_shard(kwargs[arg]), '评论不存在')
+
+    def by_author(self, arg):
+        """按 URL 中的作者ID选定分片"""
+        return self._route(lambda kwargs: self.for_author(kwargs[arg]))
+
+    @property
+    def by_current_user(self):
+        """按当前登录用户选定分片（放在 login_required / claims_required 之后）"""
+        return self._route(lambda kwargs: self.for_author(request.current_user.id))
+
+    # ==================== 跨分片查询 ====================
+
+    def _get_executor(self):
+        """并行查询的线程池（fork 出的子进程重新创建）"""
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.query_threads, thread_name_prefix='shard-query')
+                self._pid = pid
+            return self._executor
+
+    def _call(self, key, func):
+        with self.app.app_context(), self.use(key):
+            return func()
+
+    def fan_out(self, func, keys=None):
+        """
+        在多个分片上执行 func()，按 keys 的顺序返回结果列表
+
+        多个分片时在线程池中并行执行，每个分片使用独立的应用上下文和数据库会话（只用于读），
+        返回的 ORM 对象已脱离会话，需要的关系要在 func 中预加载；
+        只有一个分片（或未启用分片）时直接在当前会话中执行。
+
+        参数:
+            func: 无参函数，执行时已选定分片（可以通过 shards.current 取得）
+            keys: 分片列表（默认全部）
+        """
+        keys = self.targets if keys is None else list(keys)
+        if len(keys) <= 1:
+            results = []
+            for key in keys:
+                with self.use(key):
+                    results.append(func())
+            return results
+        executor = self._get_executor()
+        return list(executor.map(self._call, keys, [func] * len(keys)))
+
+    def fan_out_posts(self, post_ids, func):
+        """
+        把文章ID按所在分片分组，在各分片上执行 func(该分片的文章ID列表)，返回结果列表
+
+        未启用分片时直接执行一次 func(post_ids)；目录中不存在的文章ID被忽略。
+        """
+        post_ids = list(post_ids)
+        if not post_ids:
+            return []
+        if not self.enabled:
+            return [func(post_ids)]
+        groups = {}
+        for post_id, key in self.post_shards(post_ids).items():
+            groups.setdefault(key, []).append(post_id)
+        return self.fan_out(lambda: func(groups[self.current]), list(groups))
+
+    # ==================== ID 分配 ====================
+
+    def assign_ids(self, session):
+        """
+        flush 之前为新的文章 / 评论分配全局唯一的ID，并检查写入的是所属分片
+
+        目录行和文章写操作在同一个事务中提交（主库），回滚时一起回滚。
+        """
+        tables = self.db.metadata.tables
+        for obj in list(session.new):
+            table_name = getattr(type(obj), '__tablename__', None)
+            if table_name == 'posts' and obj.id is None:
+                author_id = obj.author_id if obj.author_id is not None else obj.author.id
+                self._check_target(self.for_author(author_id))
+                result = session.execute(insert(tables['post_directory']).values(author_id=author_id))
+                obj.id = result.inserted_primary_key[0]
+                with self._lock:
+                    self._post_authors[obj.id] = author_id
+            elif table_name == 'comments' and obj.id is None:
+                self._check_target(self.post_shard(obj.post_id))
+                result = session.execute(insert(tables['comment_directory']).values(post_id=obj.post_id))
+                obj.id = result.inserted_primary_key[0]
+                with self._lock:
+                    self._comment_posts[obj.id] = obj.post_id
+
+    def _check_target(self, key):
+        if key is None or key != _current_shard.get():
+            raise RuntimeError(f'文章和评论必须写入作者所在的分片（{key}），当前选定的是 {_current_shard.get()}')
+
+    # ==================== 表结构与迁移 ====================
+
+    def create_schema(self):
+        """
+        在每个分片上创建缺失的分片表及其索引（init_db 时调用）
+
+        指向主库表（users）的外键不创建，分片表之间的外键保留。
+
+        返回:
+            dict: {分片: [新建的表名]}
+        """
+        tables = [table for table in self.db.metadata.sorted_tables if table.name in SHARDED_TABLES]
+        created = {}
+        for name in self.names:
+            engine = self.db.engines[name]
+            existing = set(inspect(engine).get_table_names())
+            with engine.begin() as conn:
+                for table in tables:
+                    if table.name in existing:
+                        continue
+                    conn.execute(CreateTable(table, include_foreign_key_constraints=[
+                        fk for fk in table.foreign_key_constraints if fk.referred_table.name in SHARDED_TABLES
+                    ]))
+                    for index in table.indexes:
+                        index.create(conn)
+                    created.setdefault(name, []).append(table.name)
+        return created
+
+    def drop_schema(self):
+        """删除每个分片上的分片表（init_db 强制模式，仅用于开发环境）"""
+        tables = [table for table in self.db.metadata.sorted_tables if table.name in SHARDED_TABLES]
+        for name in self.names:
+            with self.db.engines[name].begin() as conn:
+                for table in reversed(tables):
+                    table.drop(conn, checkfirst=True)
+
+    def _sources(self):
+        """可能存放文章的位置：主库（分片之前的数据）和各分片"""
+        sources = list(self.names)
+        if 'posts' in inspect(self.db.engines[None]).get_table_names():
+            sources.insert(0, None)
+        return sources
+
+    def status(self):
+        """
+        各位置的文章数、评论数和作者数
+
+        返回:
+            list: [(位置, 文章数, 评论数, 作者数)]，位置 None 表示主库
+        """
+        tables = self.db.metadata.tables
+        posts, comments = tables['posts'], tables['comments']
+        result = []
+        for source in self._sources():
+            with self.db.engines[source].connect() as conn:
+                result.append((
+                    source,
+                    conn.execute(select(func.count()).select_from(posts)).scalar(),
+                    conn.execute(select(func.count()).select_from(comments)).scalar(),
+                    conn.execute(select(func.count(posts.c.author_id.distinct()))).scalar()
+                ))
+        return result
+
+    def rebalance(self, batch_size=200, dry_run=False):
+        """
+        把不在所属分片上的作者数据迁移过去
+
+        数据来源：主库中启用分片之前的文章（同时补建目录），以及各分片上归属已经改变的作者（增减分片之后）。
+
+        参数:
+            batch_size: 每批迁移的文章数
+            dry_run:    只统计需要迁移的文章数，不迁移
+
+        返回:
+            dict: {(来源, 目标): 文章数}，来源 None 表示主库
+        """
+        posts = self.db.metadata.tables['posts']
+        moved = {}
+        for source in self._sources():
+            with self.db.engines[source].connect() as conn:
+                counts = conn.execute(
+                    select(posts.c.author_id, func.count()).group_by(posts.c.author_id)
+                ).all()
+            for author_id, count in counts:
+                target = self.for_author(author_id)
+                if target == source:
+                    continue
+                if not dry_run:
+                    count = self._move_author(author_id, source, target, batch_size)
+                moved[(source, target)] = moved.get((source, target), 0) + count
+        return moved
+
+    def _move_author(self, author_id, source, target, batch_size):
+        """分批迁移一个作者的文章及其关联数据，返回迁移的文章数"""
+        posts = self.db.metadata.tables['posts']
+        total = 0
+        while True:
+            with self.db.engines[source].connect() as conn:
+                ids = conn.execute(
+                    select(posts.c.id).where(posts.c.author_id == author_id).order_by(posts.c.id).limit(batch_size)
+                ).scalars().all()
+            if not ids:
+                return total
+            self._move_posts(ids, source, target)
+            total += len(ids)
+
+    def _move_posts(self, ids, source, target):
+        """
+        迁移一批文章：目标分片先清掉这批文章的残留（上次中断时复制了一半的数据），整体写入并提交；
+        再从来源删除并提交。标签在每个分片上各有一份，按名称对应，文章数随之增减。
+        """
+        tables = self.db.metadata.tables
+        tags, post_tags = tables['tags'], tables['post_tags']
+
+        with self.db.engines[source].connect() as conn:
+            rows = {
+                name: [dict(row) for row in conn.execute(
+                    tables[name].select().where(tables[name].c[column].in_(ids))
+                ).mappings()]
+                for name, column in MOVED_TABLES
+            }
+            tag_names = dict(conn.execute(
+                select(tags.c.id, tags.c.name).where(tags.c.id.in_({row['tag_id'] for row in rows['post_tags']}))
+            ).all())
+
+        with self.db.engines[target].begin() as conn:
+            leftover = conn.execute(
+                select(post_tags.c.tag_id, func.count()).where(post_tags.c.post_id.in_(ids)).group_by(post_tags.c.tag_id)
+            ).all()
+            _adjust_tag_counts(conn, tags, {tag_id: -n for tag_id, n in leftover})
+            for name, column in reversed(MOVED_TABLES):
+                conn.execute(delete(tables[name]).where(tables[name].c[column].in_(ids)))
+
+            names = set(tag_names.values())
+            existing = dict(conn.execute(select(tags.c.name, tags.c.id).where(tags.c.name.in_(names))).all())
+            new_names = names - set(existing)
+            if new_names:
+                conn.execute(insert(tags), [
+                    {'name': name, 'post_count': 0, 'created_at': datetime.now()} for name in sorted(new_names)
+                ])
+                existing.update(conn.execute(select(tags.c.name, tags.c.id).where(tags.c.name.in_(new_names))).all())
+            for row in rows['post_tags']:
+                row['tag_id'] = existing[tag_names[row['tag_id']]]
+
+            for name, _ in MOVED_TABLES:
+                if rows[name]:
+                    conn.execute(insert(tables[name]), rows[name])
+            added = {}
+            for row in rows['post_tags']:
+                added[row['tag_id']] = added.get(row['tag_id'], 0) + 1
+            _adjust_tag_counts(conn, tags, added)
+
+        with self.db.engines[source].begin() as conn:
+            removed = {}
+            for row in rows['post_tags']:
+                removed[row['tag_id']] = removed.get(row['tag_id'], 0) - 1
+            _adjust_tag_counts(conn, tags, {
+                source_id: removed.get(target_id, 0)
+                for source_id, target_id in ((tag_id, existing[name]) for tag_id, name in tag_names.items())
+            })
+            for name, column in reversed(MOVED_TABLES):
+                conn.execute(delete(tables[name]).where(tables[name].c[column].in_(ids)))
+            if source is None:
+                # 分片之前的数据：补建目录（ID 保持不变）
+                post_directory, comment_directory = tables['post_directory'], tables['comment_directory']
+                conn.execute(delete(post_directory).where(post_directory.c.id.in_(ids)))
+                conn.execute(insert(post_directory), [
+                    {'id': row['id'], 'author_id': row['author_id']} for row in rows['posts']
+                ])
+                comment_ids = [row['id'] for row in rows['comments']]
+                if comment_ids:
+                    conn.execute(delete(comment_directory).where(comment_directory.c.id.in_(comment_ids)))
+                    conn.execute(insert(comment_directory), [
+                        {'id': row['id'], 'post_id': row['post_id']} for row in rows['comments']
+                    ])
+
+
+def _adjust_tag_counts(conn, tags, deltas):
+    """批量调整标签的文章数 {标签ID: 增量}"""
+    deltas = [{'tid': tag_id, 'n': n} for tag_id, n in deltas.items() if n]
+    if deltas:
+        conn.execute(
+            update(tags).where(tags.c.id == bindparam('tid')).values(post_count=tags.c.post_count + bindparam('n')),
+            deltas
+        )
+
+
+def _assign_ids(session, flush_context, instances):
+    """before_flush：为新的文章 / 评论分配ID（启用分片时由 ShardRouter.init_app 注册）"""
+    shards.assign_ids(session)
+
+
+# 全局单例，在 create_app 中调用 shards.init_app(app)
+shards = ShardRouter()
+
+
+if __name__ == '__main__':
+    from app import create_app
+    # 以脚本运行时本文件是 __main__ 模块，使用应用实际注册的 sharding.shards
+    from sharding import shards
+
+    parser = argparse.ArgumentParser(description='文章 / 评论分片管理')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='查看各分片的文章数和评论数')
+    rebalance_parser = subparsers.add_parser('rebalance', help='把数据迁移到所属分片（启用分片或增减分片后执行）')
+    rebalance_parser.add_argument('--batch', type=int, default=200, help='每批迁移的文章数')
+    rebalance_parser.add_argument('--dry-run', action='store_true', help='只统计需要迁移的文章数')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not shards.enabled:
+            print('❌ 没有配置分片（SHARD_DATABASE_URLS）')
+            raise SystemExit(1)
+        created = shards.create_schema()
+        for name, table_names in created.items():
+            print(f"📝 分片 {name} 新建表: {', '.join(table_names)}")
+
+        if args.command == 'status':
+            for source, post_count, comment_count, author_count in shards.status():
+                print(f"📊 {source or '主库（分片之前的数据）'}: 文章 {post_count}，评论 {comment_count}，作者 {author_count}")
+        else:
+            moved = shards.rebalance(args.batch, args.dry_run)
+            if not moved:
+                print('✅ 所有作者都已在所属分片上')
+            for (source, target), count in sorted(moved.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+                action = '需要迁移' if args.dry_run else '已迁移'
+                print(f"{'📝' if args.dry_run else '✅'} {source or '主库'} → {target}: {action} {count} 篇文章")
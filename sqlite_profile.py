@@ -0,0 +1,157 @@
+"""
+SQLite 单机部署配置
+
+适用于不想运维 MySQL 的小站点：DB_BACKEND=sqlite（或 DATABASE_URL=sqlite:///...）即可使用。
+
+每个新连接都会执行：
+    PRAGMA journal_mode=WAL        读写互不阻塞（读者看快照，写者追加到 WAL 文件）
+    PRAGMA synchronous=NORMAL      WAL 模式下只在检查点时 fsync，断电最多丢最后几个事务，不会损坏数据库
+    PRAGMA mmap_size=...           用内存映射读取数据库文件，减少 read() 系统调用和内存拷贝
+    PRAGMA cache_size=...          加大每个连接的页缓存
+    PRAGMA busy_timeout=...        遇到锁时等待而不是立即报 "database is locked"
+    PRAGMA foreign_keys=ON         启用外键约束（SQLite 默认不检查外键）
+
+写操作串行化：
+    SQLite 同一时间只允许一个写事务。默认的延迟事务（BEGIN DEFERRED）先读后写时，
+    如果期间别的连接提交了写操作，升级写锁会直接失败（busy_timeout 也救不了）。
+    所以这里接管了事务的开始语句：
+    1. 写请求（POST/PUT/DELETE 等）使用 BEGIN IMMEDIATE，事务一开始就拿写锁
+    2. 读请求和请求之外的代码（命令行、后台批量写回）使用普通的 BEGIN：
+       WAL 模式下读不会阻塞也不会被阻塞；后台批量写回的事务第一条语句就是写，
+       直接申请写锁，会在 busy_timeout 内正常等待
+    3. 请求之外先读后写的后台任务（热门排行同步）在 write_transaction() 块内执行，同样使用 BEGIN IMMEDIATE
+    4. 同一进程内的写事务先排队获取一把进程锁，再去拿 SQLite 的写锁，
+       避免多个线程同时在 busy_timeout 里轮询；跨进程的等待交给 busy_timeout
+
+配置项（config.py）：
+    SQLITE_TUNED / SQLITE_MMAP_SIZE / SQLITE_CACHE_SIZE / SQLITE_BUSY_TIMEOUT / SQLITE_SERIALIZE_WRITES
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import has_request_context, request
+from sqlalchemy import event
+
+# 这些请求方法的请求只读数据库
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 请求之外声明为写事务的代码块（见 write_transaction）
+_background_write = ContextVar('sqlite_background_write', default=False)
+
+
+@contextmanager
+def write_transaction():
+    """在 with 块内开始的事务按写事务处理（BEGIN IMMEDIATE），用于请求之外先读后写的后台任务"""
+    token = _background_write.set(True)
+    try:
+        yield
+    finally:
+        _background_write.reset(token)
+
+
+def pragma_statements(config):
+    """根据配置生成每个连接要执行的 PRAGMA 语句"""
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 268435456))}",
+        f"PRAGMA cache_size={int(config.get('SQLITE_CACHE_SIZE', -65536))}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT', 5000))}",
+        'PRAGMA foreign_keys=ON'
+    ]
+
+
+def apply_pragmas(engine, config):
+    """
+    在引擎的每个新连接上执行 PRAGMA（同步引擎或异步引擎的 sync_engine 都可以）
+
+    参数:
+        engine: SQLAlchemy Engine
+        config: 应用配置
+    """
+    statements = pragma_statements(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+
+class WriteSerializer:
+    """
+    接管 SQLite 事务的开始语句，并在进程内串行化写事务
+
+    需要关闭 pysqlite 自己的隐式 BEGIN（isolation_level = None），
+    再在 SQLAlchemy 的 begin 事件里发出 BEGIN / BEGIN IMMEDIATE。
+    """
+
+    def __init__(self, busy_timeout_ms=5000):
+        self.busy_timeout = busy_timeout_ms / 1000
+        self._lock = threading.Lock()
+
+    def install(self, engine):
+        """在引擎上注册事件"""
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'begin', self._on_begin)
+        event.listen(engine, 'commit', self._on_end)
+        event.listen(engine, 'rollback', self._on_end)
+        # 连接归还连接池时兜底释放（例如请求结束时会话被直接关闭）
+        event.listen(engine.pool, 'checkin', self._on_checkin)
+
+    @staticmethod
+    def is_write_context():
+        """当前事务是否属于写请求（或声明为写事务的后台任务）"""
+        if _background_write.get():
+            return True
+        return has_request_context() and request.method not in READ_METHODS
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        # 关闭 pysqlite 的隐式事务，由 _on_begin 显式开始事务
+        dbapi_connection.isolation_level = None
+
+    def _on_begin(self, conn):
+        if not self.is_write_context():
+            conn.exec_driver_sql('BEGIN')
+            return
+
+        # 进程内排队；等太久就不再排队，交给 busy_timeout 处理
+        acquired = self._lock.acquire(timeout=self.busy_timeout)
+        conn.connection.info['sqlite_write_lock'] = acquired
+        try:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        except Exception:
+            self._release(conn.connection.info)
+            raise
+
+    def _on_end(self, conn):
+        self._release(conn.connection.info)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self._release(connection_record.info)
+
+    def _release(self, info):
+        if info.pop('sqlite_write_lock', False):
+            self._lock.release()
+
+
+def register_sqlite_profile(app, engine):
+    """
+    为 SQLite 引擎启用调优配置和写操作串行化（create_app 中调用）
+
+    参数:
+        app:    Flask 应用
+        engine: db.engine
+
+    返回:
+        bool: 是否启用
+    """
+    config = app.config
+    if not config.get('SQLITE_TUNED', True) or engine.dialect.name != 'sqlite':
+        return False
+
+    apply_pragmas(engine, config)
+    if config.get('SQLITE_SERIALIZE_WRITES', True):
+        WriteSerializer(config.get('SQLITE_BUSY_TIMEOUT', 5000)).install(engine)
+    return True
@@ -0,0 +1,73 @@
+"""
+启动耗时统计模块
+
+功能：
+    1. 记录进程启动各阶段耗时（导入模块、初始化数据库、日志、路由……）
+    2. 记录从开始导入应用到处理完第一个请求的总耗时
+    3. 启动完成后输出一行耗时明细，方便排查冷启动慢的问题
+
+注意：
+    本模块只依赖标准库，必须在 app.py 中最先导入，才能把导入 Flask / SQLAlchemy 的时间统计进去。
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """启动阶段计时器"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._last = self.started_at
+        self.phases = []
+        self.first_request_ms = None
+
+    def mark(self, name):
+        """记录从上一个标记点到现在的耗时"""
+        now = time.perf_counter()
+        self.phases.append((name, round((now - self._last) * 1000, 2)))
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        """统计一个代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases.append((name, round((now - start) * 1000, 2)))
+            self._last = now
+
+    def elapsed_ms(self):
+        """从开始导入应用到现在的总耗时（毫秒）"""
+        return round((time.perf_counter() - self.started_at) * 1000, 2)
+
+    def summary(self):
+        """耗时明细，例如：导入模块 350.1ms, 初始化数据库 3.2ms, 总计 380.5ms"""
+        parts = [f'{name} {ms}ms' for name, ms in self.phases]
+        parts.append(f'总计 {self.elapsed_ms()}ms')
+        return ', '.join(parts)
+
+
+def register_startup_timing(app, timer):
+    """
+    注册首个请求计时：第一个请求处理完成时输出“启动到首个请求”的耗时
+
+    参数:
+        app:   Flask 应用对象
+        timer: StartupTimer 对象
+    """
+    app.extensions['startup_timer'] = timer
+
+    @app.after_request
+    def log_first_request(response):
+        """只在第一个请求完成时记录一次"""
+        if timer.first_request_ms is None:
+            timer.first_request_ms = timer.elapsed_ms()
+            app.logger.info(f'启动到首个请求完成: {timer.first_request_ms}ms')
+        return response
+
+
+# 全局计时器：导入本模块时开始计时
+startup_timer = StartupTimer()
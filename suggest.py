@@ -0,0 +1,174 @@
+"""
+文章标题自动补全模块
+
+数据结构：
+    一个按 (key, post_id) 排序的列表，key 是规范化后的标题（转小写、全角转半角），
+    外加从标题中每个词开头截取的后缀，这样输入 "flask" 也能匹配到 "Python Flask 入门"。
+    前缀查询用 bisect 定位到第一个 >= 前缀的位置，然后向后扫描到不再匹配为止，
+    只取前 N 个，复杂度 O(log n + N)。中文按字符比较，天然支持中文前缀匹配。
+
+维护：
+    1. 第一次查询时从数据库加载最新的 SUGGEST_MAX_TITLES 篇文章标题
+    2. 本进程的 create_post / update_post / delete_post 直接增量更新
+    3. 每隔 SUGGEST_RELOAD_INTERVAL 秒整体重建一次，同步其他进程的写操作
+    4. 超过 SUGGEST_MAX_TITLES 篇时淘汰最早的文章，内存有上限
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from flask import current_app
+from models import db, Post
+from sharding import shards, merge
+
+# 词的分隔符：空白和常见的中英文标点
+_SEPARATORS = re.compile(r'[\s\-_/|:：,，.。、;；!！?？()（）\[\]【】《》"“”\'‘’]+')
+
+# 每个标题最多建立的索引条数（整个标题 + 若干个词开头的后缀）
+MAX_KEYS_PER_TITLE = 8
+
+
+def normalize(text):
+    """规范化：全角转半角、转小写、合并空白"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ' '.join(text.split())
+
+
+def title_keys(title):
+    """标题的所有索引 key：整个标题，以及从每个词开头截取到结尾的后缀"""
+    text = normalize(title)
+    keys = [text] if text else []
+    for match in _SEPARATORS.finditer(text):
+        suffix = text[match.end():]
+        if suffix and suffix not in keys:
+            keys.append(suffix)
+        if len(keys) >= MAX_KEYS_PER_TITLE:
+            break
+    return keys
+
+
+class TitleIndex:
+    """文章标题前缀索引（进程内）"""
+
+    def __init__(self, max_titles=100000, reload_interval=300):
+        self.max_titles = max_titles
+        self.reload_interval = reload_interval
+        self._entries = []   # [(key, post_id)]，有序
+        self._titles = {}    # {post_id: title}，按文章ID从小到大插入，便于淘汰最早的文章
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def init_app(self, app):
+        """读取配置"""
+        self.max_titles = app.config.get('SUGGEST_MAX_TITLES', self.max_titles)
+        self.reload_interval = app.config.get('SUGGEST_RELOAD_INTERVAL', self.reload_interval)
+        app.extensions['title_index'] = self
+
+    # ==================== 查询 ====================
+
+    def suggest(self, prefix, limit=10):
+        """
+        按前缀查找文章标题
+
+        参数:
+            prefix: 用户输入的前缀
+            limit:  最多返回几条
+
+        返回:
+            list: [{'id': 文章ID, 'title': 标题}]，按匹配的 key 字典序排列
+        """
+        self._maybe_reload()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        result = []
+        seen = set()
+        with self._lock:
+            index = bisect.bisect_left(self._entries, (prefix,))
+            while index < len(self._entries) and len(result) < limit:
+                key, post_id = self._entries[index]
+                if not key.startswith(prefix):
+                    break
+                if post_id not in seen:
+                    seen.add(post_id)
+                    result.append({'id': post_id, 'title': self._titles[post_id]})
+                index += 1
+        return result
+
+    # ==================== 增量维护 ====================
+
+    def add(self, post_id, title):
+        """新增或更新文章标题（尚未加载时忽略，加载时会从数据库读到）"""
+        if self._loaded_at is None:
+            return
+        with self._lock:
+            if post_id in self._titles:
+                self._remove_entries(post_id)
+            elif self._titles and post_id < next(iter(self._titles)) and len(self._titles) >= self.max_titles:
+                # 比已索引的所有文章都旧，并且索引已满
+                return
+            self._titles[post_id] = title
+            for key in title_keys(title):
+                bisect.insort(self._entries, (key, post_id))
+            # 超出上限：淘汰最早的文章
+            while len(self._titles) > self.max_titles:
+                oldest = next(iter(self._titles))
+                self._remove_entries(oldest)
+                del self._titles[oldest]
+
+    def remove(self, post_id):
+        """删除文章"""
+        with self._lock:
+            if post_id in self._titles:
+                self._remove_entries(post_id)
+                del self._titles[post_id]
+
+    def _remove_entries(self, post_id):
+        """删除某篇文章的所有索引条目（调用方持有锁）"""
+        for key in title_keys(self._titles[post_id]):
+            index = bisect.bisect_left(self._entries, (key, post_id))
+            if index < len(self._entries) and self._entries[index] == (key, post_id):
+                del self._entries[index]
+
+    # ==================== 加载与重建 ====================
+
+    def _maybe_reload(self):
+        """首次查询或距上次加载超过 reload_interval 时重建索引"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        # 首次加载时其他线程需要等待；之后的重建期间其他线程继续使用旧索引
+        if not self._reload_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.reload_interval:
+                self.reload()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'加载标题索引失败: {str(e)}')
+        finally:
+            self._reload_lock.release()
+
+    def reload(self):
+        """从数据库加载最新的 max_titles 篇文章，整体替换当前索引（启用分片时各分片分别取出后归并）"""
+        rows = merge(shards.fan_out(lambda: db.session.execute(
+            db.select(Post.id, Post.title).order_by(Post.id.desc()).limit(self.max_titles)
+        ).all()), key=lambda row: row[0], reverse=True, stop=self.max_titles)
+
+        titles = {}
+        entries = []
+        for post_id, title in reversed(rows):
+            titles[post_id] = title
+            entries.extend((key, post_id) for key in title_keys(title))
+        entries.sort()
+
+        with self._lock:
+            self._titles = titles
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+
+# 全局单例，在 create_app 中调用 title_index.init_app(app)
+title_index = TitleIndex()
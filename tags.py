@@ -0,0 +1,132 @@
+"""
+标签工具模块
+
+功能：
+    1. 标签名规范化（去空格、转小写、去重）
+    2. 设置文章标签：自动创建新标签，只对增减的标签调整 post_count
+    3. 删除文章前释放其标签计数
+    4. 标签云（按文章数降序）
+
+说明：
+    tags.post_count 随文章写操作增量维护（UPDATE tags SET post_count = post_count ± 1），
+    标签云直接按 post_count 排序读取，不需要对 post_tags 做 GROUP BY 统计。
+    启用分片时每个分片各有一份标签表（只统计本分片的文章），标签云按名称合并各分片的计数。
+"""
+from sqlalchemy.exc import IntegrityError
+from models import db, Tag
+from sharding import shards
+
+
+def normalize_tag_names(names):
+    """
+    规范化标签名：去掉首尾空格、转小写、保持原顺序去重
+
+    参数:
+        names: 标签名列表（已通过 validate_post_tags 校验）
+
+    返回:
+        list: 规范化后的标签名
+    """
+    result = []
+    for name in names:
+        name = name.strip().lower()
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def get_or_create_tags(names):
+    """
+    按名称获取标签，不存在的自动创建
+
+    参数:
+        names: 规范化后的标签名列表
+
+    返回:
+        list: Tag 对象列表（与 names 顺序一致）
+    """
+    if not names:
+        return []
+
+    existing = {
+        tag.name: tag
+        for tag in db.session.execute(db.select(Tag).where(Tag.name.in_(names))).scalars()
+    }
+
+    tags = []
+    for name in names:
+        tag = existing.get(name)
+        if tag is None:
+            try:
+                # 使用 SAVEPOINT：并发创建同名标签时只回滚这一条插入
+                with db.session.begin_nested():
+                    tag = Tag(name=name, post_count=0)
+                    db.session.add(tag)
+            except IntegrityError:
+                tag = db.session.execute(db.select(Tag).where(Tag.name == name)).scalar_one()
+        tags.append(tag)
+    return tags
+
+
+def _adjust_counts(tag_ids, delta):
+    """批量调整标签的文章数"""
+    if not tag_ids:
+        return
+    db.session.execute(
+        db.update(Tag)
+        .where(Tag.id.in_(tag_ids))
+        .values(post_count=Tag.post_count + delta),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def set_post_tags(post, names):
+    """
+    设置文章的标签（调用方负责提交事务）
+
+    参数:
+        post:  Post 对象
+        names: 标签名列表（已通过 validate_post_tags 校验）
+    """
+    tags = get_or_create_tags(normalize_tag_names(names))
+
+    old_ids = {tag.id for tag in post.tags}
+    new_ids = {tag.id for tag in tags}
+
+    post.tags = tags
+    _adjust_counts(new_ids - old_ids, 1)
+    _adjust_counts(old_ids - new_ids, -1)
+
+
+def release_post_tags(post):
+    """删除文章前调用：把文章所有标签的 post_count 减 1（调用方负责提交事务）"""
+    _adjust_counts({tag.id for tag in post.tags}, -1)
+
+
+def top_tags(limit):
+    """
+    标签云：文章数最多的 limit 个标签
+
+    启用分片时各分片的同名标签合并计数；标签ID在各分片上不同，返回的 id 为 None。
+
+    返回:
+        list: 标签字典列表（与 Tag.to_dict 结构相同）
+    """
+    if not shards.enabled:
+        tags = db.session.execute(
+            db.select(Tag)
+            .where(Tag.post_count > 0)
+            .order_by(Tag.post_count.desc(), Tag.name)
+            .limit(limit)
+        ).scalars().all()
+        return [tag.to_dict() for tag in tags]
+
+    # 合并后的排名与单个分片内的排名不同，每个分片取出全部有文章的标签（标签数远少于文章数）
+    counts = {}
+    for rows in shards.fan_out(lambda: db.session.execute(
+        db.select(Tag.name, Tag.post_count).where(Tag.post_count > 0)
+    ).all()):
+        for name, post_count in rows:
+            counts[name] = counts.get(name, 0) + post_count
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{'id': None, 'name': name, 'post_count': post_count} for name, post_count in ranked]
@@ -0,0 +1,106 @@
+"""
+测试公共夹具
+
+每个测试使用 tmp_path 下独立的 SQLite 数据库；
+make_app(**overrides) 用关键字参数覆盖 Config 中的同名配置项，再创建应用并建表。
+进程内的全局单例（缓存、计数器、排行榜……）在每次创建应用前重置，测试之间互不影响。
+"""
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 在导入 config 之前设置：导入 asgi / wsgi 时模块级创建的应用不会去连接 MySQL
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from config import Config  # noqa: E402
+from app import create_app, init_db  # noqa: E402
+from models import db  # noqa: E402
+from cache import list_cache, count_cache  # noqa: E402
+from view_counter import view_counter  # noqa: E402
+from token_epochs import token_epochs  # noqa: E402
+from trending import trending  # noqa: E402
+from suggest import title_index  # noqa: E402
+from content_store import content_store  # noqa: E402
+from comment_events import comment_events  # noqa: E402
+from sharding import shards  # noqa: E402
+from purge import post_purger  # noqa: E402
+
+
+def reset_singletons():
+    """把进程内的全局单例恢复成初始状态"""
+    for extension in (view_counter, token_epochs, trending, title_index, content_store, comment_events, shards, post_purger):
+        extension.__init__()
+    for cache in (list_cache, count_cache):
+        cache.__init__(config_prefix=cache.config_prefix)
+    # init_app 为每个 bind 登记一份 MetaData：去掉上一个测试的分片，只保留主库
+    for key in [key for key in db.metadatas if key is not None]:
+        del db.metadatas[key]
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """创建测试应用的工厂函数（同一个测试中多次调用共用同一个数据库）"""
+    apps = []
+
+    def factory(**overrides):
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'blog.db'}",
+            'SQLALCHEMY_ENGINE_OPTIONS': {'pool_pre_ping': True},
+            'SHARD_BINDS': {},
+            'SQLALCHEMY_BINDS': {},
+            'TOKEN_EPOCH_POLL_INTERVAL': 0,
+            'VIEW_FLUSH_INTERVAL': 3600,
+        }
+        settings.update(overrides)
+        for name, value in settings.items():
+            monkeypatch.setattr(Config, name, value, raising=False)
+        reset_singletons()
+        app = create_app()
+        app.config['TESTING'] = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            init_db(app)
+        apps.append(app)
+        return app
+
+    yield factory
+
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    """默认配置的测试应用"""
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, username, password='secret1'):
+    """注册并登录一个用户，返回 (用户ID, 认证请求头)"""
+    client.post('/api/users/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': password
+    })
+    response = client.post('/api/users/login', json={'username': username, 'password': password})
+    data = response.get_json()['data']
+    return data['user']['id'], {'Authorization': f"Bearer {data['token']}"}
+
+
+def create_post(client, headers, title='标题', content='内容', **fields):
+    """发表一篇文章，返回文章的 JSON"""
+    response = client.post('/api/posts', json={'title': title, 'content': content, **fields}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']['post']
@@ -0,0 +1,154 @@
+"""ASGI 异步服务模式（asgi.py）"""
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from models import db, PostRender
+from conftest import register, create_post
+
+
+async def call(asgi_app, path, query='', headers=None, method='GET', body=b''):
+    """发送一个 HTTP 请求，返回 (状态码, 响应头, 响应体)"""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'root_path': '',
+        'query_string': query.encode('latin-1'), 'http_version': '1.1', 'scheme': 'http',
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (headers or {}).items()],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+    }
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    start = messages[0]
+    data = b''.join(m.get('body', b'') for m in messages[1:])
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, data
+
+
+def run(asgi_app, scenario):
+    """在一个事件循环中执行测试场景，结束时释放异步引擎"""
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            if asgi_app.engine is not None:
+                await asgi_app.engine.dispose()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def asgi_app(make_app):
+    # 先导入 asgi：模块级创建的应用会初始化全局单例，之后再创建测试应用
+    from asgi import BlogASGI
+    asgi_app = BlogASGI(make_app())
+    yield asgi_app
+    asgi_app.executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def client(asgi_app):
+    return asgi_app.flask_app.test_client()
+
+
+def test_native_reads_match_flask(client, asgi_app):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, title='异步', content='正文' * 10, tags=['py'])
+    client.post(f"/api/posts/{post['id']}/comments", json={'content': '评论'}, headers=headers)
+
+    async def scenario():
+        return [await call(asgi_app, path, query) for path, query in requests]
+
+    requests = [('/api/posts', 'per_page=5'), ('/api/posts/batch', f"ids={post['id']},999"),
+                (f"/api/posts/{post['id']}/comments", '')]
+    for (path, query), (status, _, body) in zip(requests, run(asgi_app, scenario)):
+        expected = client.get(f'{path}?{query}')
+        assert status == expected.status_code
+        assert json.loads(body) == expected.get_json()
+
+
+def test_native_detail_and_not_found(client, asgi_app):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, title='详情')
+
+    async def scenario():
+        found = await call(asgi_app, f"/api/posts/{post['id']}")
+        missing = await call(asgi_app, '/api/posts/999')
+        return found, missing
+
+    (status, _, body), (missing_status, _, _) = run(asgi_app, scenario)
+    assert status == 200
+    assert json.loads(body)['data']['title'] == '详情'
+    assert missing_status == 404
+
+
+def test_native_html_without_render_is_not_saved(client, asgi_app):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, content='**粗**')
+    with asgi_app.flask_app.app_context():
+        db.session.execute(db.delete(PostRender))
+        db.session.commit()
+
+    status, _, body = run(asgi_app, lambda: call(asgi_app, f"/api/posts/{post['id']}", query='format=html'))
+    assert status == 200
+    assert json.loads(body)['data']['content'] == '<p><strong>粗</strong></p>'
+    with asgi_app.flask_app.app_context():
+        assert db.session.get(PostRender, post['id']) is None
+
+
+def test_writes_are_forwarded_to_flask(client, asgi_app):
+    _, headers = register(client, 'alice')
+
+    async def scenario():
+        payload = json.dumps({'title': '经 ASGI 发表', 'content': '正文'}).encode()
+        created = await call(asgi_app, '/api/posts', method='POST', body=payload,
+                             headers={**headers, 'Content-Type': 'application/json'})
+        listed = await call(asgi_app, '/api/posts')
+        return created, listed
+
+    (status, _, _), (_, _, body) = run(asgi_app, scenario)
+    assert status == 201
+    assert [p['title'] for p in json.loads(body)['data']['posts']] == ['经 ASGI 发表']
+
+
+def test_native_response_compression(client, asgi_app):
+    _, headers = register(client, 'alice')
+    for i in range(5):
+        create_post(client, headers, title=f'T{i}', content='正文' * 100)
+
+    async def scenario():
+        return await call(asgi_app, '/api/posts', headers={'Accept-Encoding': 'gzip'})
+
+    status, response_headers, body = run(asgi_app, scenario)
+    assert status == 200
+    assert response_headers['content-encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(body))['data']['pagination']['total'] == 5
+
+
+def test_native_detail_reads_compressed_content(make_app):
+    from asgi import BlogASGI
+    asgi_app = BlogASGI(make_app(CONTENT_COMPRESSION='zlib', CONTENT_COMPRESSION_THRESHOLD=1024))
+    client = asgi_app.flask_app.test_client()
+    _, headers = register(client, 'alice')
+    content = '压缩存储的长文章。' * 500
+    post = create_post(client, headers, content=content)
+
+    async def scenario():
+        return await call(asgi_app, f"/api/posts/{post['id']}")
+
+    try:
+        status, _, body = run(asgi_app, scenario)
+    finally:
+        asgi_app.executor.shutdown(wait=True)
+    assert status == 200
+    assert json.loads(body)['data']['content'] == content
@@ -0,0 +1,46 @@
+"""作者统计的增量维护（author_stats.py）"""
+import author_stats
+from models import db, AuthorStats
+from conftest import register, create_post
+
+
+def profile_stats(client, user_id):
+    return client.get(f'/api/users/{user_id}').get_json()['data']['stats']
+
+
+def test_counts_follow_writes(client):
+    alice_id, alice = register(client, 'alice')
+    bob_id, bob = register(client, 'bob')
+    first = create_post(client, alice, title='P1')
+    create_post(client, alice, title='P2')
+    for headers in (bob, bob, alice):
+        client.post(f"/api/posts/{first['id']}/comments", json={'content': '评论'}, headers=headers)
+
+    assert profile_stats(client, alice_id)['post_count'] == 2
+    assert profile_stats(client, alice_id)['comment_count'] == 1
+    assert profile_stats(client, bob_id)['comment_count'] == 2
+
+    # 删除文章时连同文章下的评论一起扣减
+    client.delete(f"/api/posts/{first['id']}", headers=alice)
+    assert profile_stats(client, alice_id)['post_count'] == 1
+    assert profile_stats(client, alice_id)['comment_count'] == 0
+    assert profile_stats(client, bob_id)['comment_count'] == 0
+
+
+def test_missing_row_rebuilt_from_counts(app, client):
+    alice_id, alice = register(client, 'alice')
+    create_post(client, alice)
+    with app.app_context():
+        db.session.execute(db.delete(AuthorStats))
+        db.session.commit()
+
+    # 第一次增量更新时用 COUNT 补建，结果包含本次变更
+    create_post(client, alice, title='P2')
+    assert profile_stats(client, alice_id)['post_count'] == 2
+
+    with app.app_context():
+        db.session.execute(db.delete(AuthorStats))
+        db.session.commit()
+        assert author_stats.backfill() == 1
+        assert author_stats.backfill() == 0
+    assert profile_stats(client, alice_id)['post_count'] == 2
@@ -0,0 +1,52 @@
+"""按ID批量获取文章（queries.py: parse_batch_args / fetch_batch）"""
+from sqlalchemy import event
+
+from models import db
+from view_counter import view_counter
+from conftest import register, create_post
+
+
+def test_order_duplicates_and_missing(client):
+    _, headers = register(client, 'alice')
+    first = create_post(client, headers, title='第一篇')
+    second = create_post(client, headers, title='第二篇')
+
+    response = client.get(f"/api/posts/batch?ids={second['id']},{first['id']},999&ids={second['id']}")
+    data = response.get_json()['data']
+    assert [post['title'] for post in data['posts']] == ['第二篇', '第一篇']
+    assert data['missing'] == [999]
+    assert data['count'] == 2
+    assert 'author' not in data['posts'][0]
+
+    with_author = client.get(f"/api/posts/batch?ids={first['id']}&include_author=1").get_json()['data']
+    assert with_author['posts'][0]['author']['username'] == 'alice'
+
+    # 批量获取不计入浏览量
+    assert view_counter._pending == {}
+
+
+def test_single_in_query(app, client):
+    _, headers = register(client, 'alice')
+    ids = ','.join(str(create_post(client, headers, title=f'T{i}')['id']) for i in range(10))
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM posts' in statement:
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert client.get(f'/api/posts/batch?ids={ids}').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert len(statements) == 1
+
+
+def test_invalid_requests(make_app):
+    client = make_app(BATCH_MAX_IDS=3).test_client()
+    assert client.get('/api/posts/batch').status_code == 400
+    assert client.get('/api/posts/batch?ids=1,abc').status_code == 400
+    assert client.get('/api/posts/batch?ids=1,2,3,4').status_code == 400
@@ -0,0 +1,131 @@
+"""增量变更流（change_feed.py，GET /api/changes）"""
+
+from datetime import datetime, timedelta
+
+from models import db, ChangeLog
+from sqlite_profile import write_transaction
+import change_feed
+from conftest import register, create_post
+
+
+def changes(client, **params):
+    response = client.get('/api/changes', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def summary(data):
+    return [(change['type'], change['id'], change['action']) for change in data['changes']]
+
+
+def add_comment(client, headers, post_id, content='评论'):
+    response = client.post(f'/api/posts/{post_id}/comments', json={'content': content}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']['comment']
+
+
+def test_create_update_delete(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, title='原标题')
+    comment = add_comment(client, headers, post['id'])
+    client.put(f"/api/posts/{post['id']}", json={'title': '新标题', 'content': '内容'}, headers=headers)
+
+    data = changes(client)
+    assert summary(data) == [('post', post['id'], 'create'), ('comment', comment['id'], 'create'),
+                             ('post', post['id'], 'update')]
+    assert data['changes'][1]['post_id'] == post['id']
+    # 附带的是对象的当前数据
+    assert data['changes'][0]['data']['title'] == '新标题'
+    assert data['changes'][1]['data']['content'] == '评论'
+    assert data['has_more'] is False
+    cursor = data['next_cursor']
+    assert cursor == data['changes'][-1]['cursor']
+
+    # 删除文章：文章和它的评论都有墓碑；之前的 create 记录再读时 data 为 null
+    assert client.delete(f"/api/posts/{post['id']}", headers=headers).status_code == 200
+    data = changes(client, since=cursor)
+    assert sorted(summary(data)) == [('comment', comment['id'], 'delete'), ('post', post['id'], 'delete')]
+    assert all(change['data'] is None for change in data['changes'])
+    assert all(change['data'] is None for change in changes(client)['changes'][:2])
+
+    # 没有新变更时游标不动
+    assert changes(client, since=data['next_cursor']) == {
+        'changes': [], 'next_cursor': data['next_cursor'], 'has_more': False
+    }
+
+
+def test_limit_and_types(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    for i in range(3):
+        add_comment(client, headers, post['id'], content=f'评论{i}')
+
+    first = changes(client, limit=2)
+    assert len(first['changes']) == 2 and first['has_more'] is True
+    rest = changes(client, since=first['next_cursor'], limit=2)
+    assert len(rest['changes']) == 2 and rest['has_more'] is False
+
+    # types 只过滤结果，游标照样越过评论
+    posts_only = changes(client, types='post')
+    assert summary(posts_only) == [('post', post['id'], 'create')]
+    assert posts_only['next_cursor'] == rest['next_cursor']
+
+
+def test_invalid_params(client):
+    for params in ({'since': '-1'}, {'since': 'abc'}, {'types': 'user'}, {'types': ','}):
+        response = client.get('/api/changes', query_string=params)
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+def test_gap_holds_back_later_changes(make_app):
+    app = make_app(CHANGE_FEED_SETTLE_SECONDS=60)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    # ID 连续的记录不用等待
+    cursor = changes(client)['next_cursor']
+    assert cursor > 0
+
+    # cursor + 1 被一个还没提交的事务占用：之后的记录要等它提交，游标停在原处
+    with app.app_context():
+        db.session.add(ChangeLog(id=cursor + 2, entity='post', entity_id=post['id'], action='update', post_id=post['id']))
+        db.session.commit()
+    assert changes(client, since=cursor) == {'changes': [], 'next_cursor': cursor, 'has_more': False}
+    with app.app_context():
+        assert change_feed.settled_head() == cursor
+
+    # 晚提交的事务填上空洞后两条都能读到
+    with app.app_context():
+        db.session.add(ChangeLog(id=cursor + 1, entity='post', entity_id=post['id'], action='update', post_id=post['id']))
+        db.session.commit()
+    assert changes(client, since=cursor)['next_cursor'] == cursor + 2
+
+
+def test_old_gap_is_skipped(make_app):
+    # 空洞之后的记录超过等待时间：视为回滚留下的空洞，不再等待
+    app = make_app(CHANGE_FEED_SETTLE_SECONDS=60)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    cursor = changes(client)['next_cursor']
+    with app.app_context():
+        db.session.add(ChangeLog(id=cursor + 2, entity='post', entity_id=post['id'], action='update',
+                                 post_id=post['id'], created_at=datetime.now() - timedelta(seconds=61)))
+        db.session.commit()
+        assert change_feed.settled_head() == cursor + 2
+    assert changes(client, since=cursor)['next_cursor'] == cursor + 2
+
+
+def test_backfill(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    comment = add_comment(client, headers, post['id'])
+    # 先读后写，和后台线程（热门排行同步）并发时需要写事务
+    with app.app_context(), write_transaction():
+        db.session.execute(db.delete(ChangeLog))
+        db.session.commit()
+        assert change_feed.backfill() == 2
+        # 已有记录时不重复补建
+        assert change_feed.backfill() == 0
+    assert summary(changes(client)) == [('post', post['id'], 'create'), ('comment', comment['id'], 'create')]
@@ -0,0 +1,79 @@
+"""只校验 Token 的写接口鉴权（auth.claims_required）"""
+import pytest
+from sqlalchemy import event
+
+from auth import ClaimsUser, generate_token
+from exceptions import UnauthorizedError
+from models import db, User
+from conftest import register, create_post
+
+
+def user_queries(app, action):
+    """执行 action 期间查询 users 表的 SELECT 语句数"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and ' users' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    try:
+        action()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_execute)
+    return statements
+
+
+def test_write_route_does_not_load_user(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+
+    def comment():
+        response = client.post(f"/api/posts/{post['id']}/comments", json={'content': '沙发'}, headers=headers)
+        assert response.status_code == 201
+
+    assert user_queries(app, comment) == []
+
+
+def test_missing_or_invalid_token_is_rejected(client):
+    assert client.post('/api/posts', json={'title': 't', 'content': 'c'}).status_code == 401
+    response = client.post('/api/posts', json={'title': 't', 'content': 'c'},
+                           headers={'Authorization': 'Bearer not-a-token'})
+    assert response.status_code == 401
+
+
+def test_token_signed_with_other_key_is_rejected(app, client):
+    register(client, 'alice')
+    original = app.config['SECRET_KEY']
+    with app.test_request_context():
+        app.config['SECRET_KEY'] = 'other-key'
+        forged = generate_token(1, 'alice')
+    app.config['SECRET_KEY'] = original
+    response = client.post('/api/posts', json={'title': 't', 'content': 'c'},
+                           headers={'Authorization': f'Bearer {forged}'})
+    assert response.status_code == 401
+
+
+def test_claims_user_loads_full_user_on_demand(app, client):
+    user_id, _ = register(client, 'alice')
+    with app.app_context():
+        user = ClaimsUser(user_id, 'alice')
+        assert user.username == 'alice'
+        assert user._user is None
+        assert user.email == 'alice@example.com'
+        assert user._user is not None
+
+
+def test_deleted_user_is_unauthorized(app, client):
+    bob_id, _ = register(client, 'bob')
+    with app.app_context():
+        db.session.execute(db.delete(User).where(User.id == bob_id))
+        db.session.commit()
+        # id / username 仍取自 Token；需要完整用户信息时按未登录处理（401），而不是 LookupError（500）
+        user = ClaimsUser(bob_id, 'bob')
+        assert user.username == 'bob'
+        with pytest.raises(UnauthorizedError) as info:
+            user.email
+        assert info.value.status_code == 401
@@ -0,0 +1,75 @@
+"""评论实时推送（comment_events.py）"""
+import asyncio
+
+import pytest
+
+from comment_events import comment_events, ASYNC_MAX_SUBSCRIBERS
+from exceptions import ServiceUnavailableError
+from conftest import register, create_post
+
+
+def add_comment(client, headers, post_id, content='评论'):
+    response = client.post(f'/api/posts/{post_id}/comments', json={'content': content}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']['comment']
+
+
+def test_default_limits(make_app):
+    make_app(WEB_THREADS=4)
+    # WSGI 模式每个连接占一个线程，留一个线程处理普通请求
+    assert comment_events.limit() == 3
+    assert comment_events.limit(asynchronous=True) == ASYNC_MAX_SUBSCRIBERS
+
+    make_app(WEB_THREADS=4, SSE_MAX_SUBSCRIBERS=10)
+    assert comment_events.limit() == comment_events.limit(asynchronous=True) == 10
+
+
+def test_wsgi_connections_capped_by_threads(make_app):
+    app = make_app(WEB_THREADS=3)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+
+    with app.app_context():
+        subscriptions = [comment_events.open(post['id'])[0] for _ in range(2)]
+        with pytest.raises(ServiceUnavailableError):
+            comment_events.open(post['id'])
+        # ASGI 连接不占线程，不受 WEB_THREADS 限制
+        loop = asyncio.new_event_loop()
+        try:
+            subscriptions.append(comment_events.open(post['id'], loop=loop)[0])
+        finally:
+            loop.close()
+        for subscription in subscriptions:
+            comment_events.close(subscription)
+    assert comment_events.subscriber_count == 0
+
+
+def test_single_thread_refuses_stream(make_app):
+    client = make_app(WEB_THREADS=1).test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    response = client.get(f"/api/posts/{post['id']}/comments/stream")
+    assert response.status_code == 503
+
+
+def test_replay_and_live_events(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    first = add_comment(client, headers, post['id'], content='第一条')
+
+    with app.app_context():
+        # 从头订阅：补发已有的评论
+        subscription, backlog = comment_events.open(post['id'], last_event_id=0)
+    try:
+        assert [event['data']['comment_id'] for event in backlog] == [first['id']]
+        assert backlog[0]['data']['comment']['content'] == '第一条'
+
+        # 之后的评论由分发线程推送
+        second = add_comment(client, headers, post['id'], content='第二条')
+        event = subscription.get(timeout=5)
+        assert event['event'] == 'comment'
+        assert event['data']['action'] == 'create'
+        assert event['data']['comment']['id'] == second['id']
+    finally:
+        comment_events.close(subscription)
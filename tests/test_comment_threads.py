@@ -0,0 +1,99 @@
+"""评论楼中楼与物化路径（comment_threads.py）"""
+from models import db, Comment
+from comment_threads import path_segment, ancestor_ids
+from conftest import register, create_post
+
+
+def reply(client, headers, post_id, content, parent_id=None):
+    response = client.post(f'/api/posts/{post_id}/comments',
+                           json={'content': content, 'parent_id': parent_id}, headers=headers)
+    return response
+
+
+def add(client, headers, post_id, content, parent_id=None):
+    response = reply(client, headers, post_id, content, parent_id)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['data']['comment']
+
+
+def contents(nodes):
+    return [(node['content'], contents(node['replies'])) for node in nodes]
+
+
+def test_path_helpers():
+    path = path_segment(1) + path_segment(23) + path_segment(456)
+    assert path == '0000000001/0000000023/0000000456/'
+    assert ancestor_ids(path) == [1, 23]
+
+
+def test_threads_nest_replies_and_count_descendants(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    top = add(client, headers, post['id'], '一楼')
+    child = add(client, headers, post['id'], '回复一楼', top['id'])
+    add(client, headers, post['id'], '楼中楼', child['id'])
+    add(client, headers, post['id'], '二楼')
+    assert child['depth'] == 1
+
+    data = client.get(f"/api/posts/{post['id']}/comments/threads").get_json()['data']
+    assert contents(data['threads']) == [
+        ('二楼', []),
+        ('一楼', [('回复一楼', [('楼中楼', [])])]),
+    ]
+    assert data['threads'][1]['reply_count'] == 2
+
+    shallow = client.get(f"/api/posts/{post['id']}/comments/threads?depth=1").get_json()['data']
+    assert contents(shallow['threads'])[1] == ('一楼', [('回复一楼', [])])
+
+    subtree = client.get(f"/api/posts/comments/{child['id']}/replies").get_json()['data']['comment']
+    assert subtree['reply_count'] == 1
+    assert contents(subtree['replies']) == [('楼中楼', [])]
+
+
+def test_delete_removes_subtree_and_updates_ancestors(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    top = add(client, headers, post['id'], '一楼')
+    child = add(client, headers, post['id'], '回复', top['id'])
+    add(client, headers, post['id'], '楼中楼', child['id'])
+
+    response = client.delete(f"/api/posts/comments/{child['id']}", headers=headers)
+    assert response.get_json()['data']['deleted_count'] == 2
+
+    threads = client.get(f"/api/posts/{post['id']}/comments/threads").get_json()['data']['threads']
+    assert threads[0]['reply_count'] == 0
+    assert threads[0]['replies'] == []
+
+
+def test_reply_validation(make_app):
+    client = make_app(COMMENT_MAX_DEPTH=1).test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    other = create_post(client, headers, title='另一篇')
+    top = add(client, headers, post['id'], '一楼')
+    child = add(client, headers, post['id'], '回复', top['id'])
+
+    assert reply(client, headers, post['id'], '太深了', child['id']).status_code == 400
+    assert reply(client, headers, other['id'], '跨文章', top['id']).status_code == 400
+    assert reply(client, headers, post['id'], '不存在', 999).status_code == 404
+
+
+def test_legacy_comments_without_path(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    legacy = add(client, headers, post['id'], '老评论')
+    other = add(client, headers, post['id'], '另一条老评论')
+    with app.app_context():
+        # 升级前的评论：还没有补齐层级信息
+        db.session.execute(db.update(Comment).values(root_id=None, path=None))
+        db.session.commit()
+
+    child = add(client, headers, post['id'], '回复', parent_id=legacy['id'])
+    assert child['depth'] == 1
+    replies = client.get(f"/api/posts/comments/{legacy['id']}/replies").get_json()['data']['comment']
+    assert contents(replies['replies']) == [('回复', [])]
+
+    assert client.delete(f"/api/posts/comments/{other['id']}", headers=headers).status_code == 200
+    with app.app_context():
+        assert db.session.get(Comment, other['id']) is None
+        assert db.session.get(Comment, legacy['id']).reply_count == 1
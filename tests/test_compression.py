@@ -0,0 +1,44 @@
+"""响应压缩（compression.py）"""
+import gzip
+
+from compression import accepts_gzip
+from conftest import register, create_post
+
+
+def test_accepts_gzip_negotiation():
+    assert accepts_gzip('gzip, deflate, br')
+    assert accepts_gzip('br;q=1.0, gzip;q=0.5')
+    assert accepts_gzip('*')
+    assert not accepts_gzip('')
+    assert not accepts_gzip('gzip;q=0')
+    assert not accepts_gzip('gzip;q=0, *;q=1')
+    assert not accepts_gzip('deflate, br')
+
+
+def test_large_json_is_gzipped(client):
+    _, headers = register(client, 'alice')
+    for i in range(5):
+        create_post(client, headers, title=f'文章 {i}', content='正文' * 100)
+
+    plain = client.get('/api/posts')
+    assert plain.headers.get('Content-Encoding') is None
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    response = client.get('/api/posts', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+
+
+def test_small_response_not_compressed(client):
+    response = client.get('/api/health', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') is None
+
+
+def test_disabled_by_config(make_app):
+    client = make_app(COMPRESS_ENABLED=False).test_client()
+    _, headers = register(client, 'alice')
+    create_post(client, headers, content='正文' * 500)
+    response = client.get('/api/posts', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers.get('Content-Encoding') is None
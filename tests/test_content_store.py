@@ -0,0 +1,79 @@
+"""文章内容压缩存储（content_store.py）"""
+from sqlalchemy import inspect
+from werkzeug.datastructures import MultiDict
+
+from content_store import ContentStore
+from models import db, Post
+from queries import parse_post_list_args, build_post_list_query
+from conftest import register, create_post
+
+LONG_TEXT = '压缩存储的长文章。' * 1000 + '结尾关键字'
+
+
+def compressed_app(make_app):
+    return make_app(CONTENT_COMPRESSION='zlib', CONTENT_COMPRESSION_THRESHOLD=1024, CONTENT_SEARCH_PREFIX=100)
+
+
+def test_encode_decode_round_trip():
+    store = ContentStore(codec='zlib', threshold=1024, search_prefix=10)
+    prefix, blob, codec, size = store.encode(LONG_TEXT)
+    assert prefix == LONG_TEXT[:10]
+    assert codec == 'zlib' and size == len(LONG_TEXT.encode('utf-8'))
+    assert store.decode(codec, blob) == LONG_TEXT
+    # 短文本和压缩不划算的内容按原文存储
+    assert store.encode('短文') is None
+    assert ContentStore(codec='zlib', threshold=1, max_ratio=0.1).encode('随机性高的内容') is None
+
+
+def test_api_round_trip(make_app):
+    app = compressed_app(make_app)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, content=LONG_TEXT)
+
+    with app.app_context():
+        stored = db.session.get(Post, post['id'])
+        assert stored.content_codec == 'zlib'
+        assert len(stored.content_text) == 100
+
+    assert client.get(f"/api/posts/{post['id']}").get_json()['data']['content'] == LONG_TEXT
+    listed = client.get('/api/posts').get_json()['data']['posts']
+    assert listed[0]['content'] == LONG_TEXT
+
+
+def test_blob_is_deferred(make_app):
+    app = compressed_app(make_app)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, content=LONG_TEXT)
+
+    with app.app_context():
+        # 不输出内容的查询不读取压缩数据
+        plain = db.session.get(Post, post['id'])
+        assert 'content_blob' in inspect(plain).unloaded
+        db.session.expunge_all()
+
+        # 列表查询带 undefer：一次取出，不会逐篇再查
+        stmt = build_post_list_query(parse_post_list_args(MultiDict()))
+        listed = db.session.execute(stmt).scalars().first()
+        assert 'content_blob' not in inspect(listed).unloaded
+
+
+def test_keyword_search_flags_prefix(make_app):
+    app = compressed_app(make_app)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    create_post(client, headers, title='长文', content=LONG_TEXT)
+
+    data = client.get('/api/posts?keyword=结尾关键字').get_json()['data']
+    assert data['posts'] == []
+    assert data['filters']['keyword_content_prefix'] == 100
+    assert client.get('/api/posts').get_json()['data']['filters']['keyword_content_prefix'] is None
+
+
+def test_no_flag_without_compression(client):
+    _, headers = register(client, 'alice')
+    create_post(client, headers, content=LONG_TEXT)
+    data = client.get('/api/posts?keyword=结尾关键字').get_json()['data']
+    assert len(data['posts']) == 1
+    assert data['filters']['keyword_content_prefix'] is None
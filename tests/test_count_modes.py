@@ -0,0 +1,66 @@
+"""文章列表总数的计算方式（queries.py: count_posts）"""
+from models import db, Post
+from conftest import register, create_post
+
+
+def pagination(client, headers, **params):
+    # 带 Token 的请求不走列表缓存，只测总数
+    response = client.get('/api/posts', query_string=params, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['data']['pagination']
+
+
+def insert_behind_api(app, author_id, n=1):
+    """直接写数据库，不经过接口（总数缓存不会失效）"""
+    with app.app_context():
+        db.session.add_all(Post(title=f'直接插入{i}', content='内容', author_id=author_id) for i in range(n))
+        db.session.commit()
+
+
+def test_modes(app, client):
+    user_id, headers = register(client, 'alice')
+    for i in range(3):
+        create_post(client, headers, title=f'T{i}')
+
+    assert pagination(client, headers, per_page=2, count='cached')['total'] == 3
+    insert_behind_api(app, user_id)
+    assert pagination(client, headers, per_page=2, count='cached')['total'] == 3
+    assert pagination(client, headers, per_page=2, count='exact')['total'] == 4
+
+    # 写操作让总数缓存失效
+    create_post(client, headers, title='T3')
+    assert pagination(client, headers, per_page=2, count='cached')['total'] == 5
+
+    none = pagination(client, headers, per_page=2, count='none')
+    assert none['total'] is None and none['total_pages'] is None
+    assert none['has_next'] is True
+    assert none['count'] == 'none'
+
+
+def test_estimate_uses_id_range_on_sqlite(app, client):
+    _, headers = register(client, 'alice')
+    ids = [create_post(client, headers, title=f'T{i}')['id'] for i in range(4)]
+    with app.app_context():
+        db.session.execute(db.delete(Post).where(Post.id == ids[1]))
+        db.session.commit()
+
+    # 主键范围估算：中间删掉的文章仍然计入；有过滤条件时不估算
+    assert pagination(client, headers, per_page=2, count='estimate')['total'] == 4
+    assert pagination(client, headers, per_page=2, count='estimate', keyword='T')['total'] == 3
+
+
+def test_last_page_total_without_count(app, client):
+    _, headers = register(client, 'alice')
+    for i in range(3):
+        create_post(client, headers, title=f'T{i}')
+    # 最后一页直接算出总数，即使 count=none
+    last = pagination(client, headers, page=2, per_page=2, count='none')
+    assert last['total'] == 3
+    assert last['has_next'] is False
+
+
+def test_unknown_mode_uses_configured_default(make_app):
+    client = make_app(POST_COUNT_MODE='exact').test_client()
+    _, headers = register(client, 'alice')
+    assert pagination(client, headers)['count'] == 'exact'
+    assert pagination(client, headers, count='fast')['count'] == 'exact'
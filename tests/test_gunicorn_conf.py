@@ -0,0 +1,40 @@
+"""gunicorn 多进程配置（gunicorn.conf.py）"""
+import os
+import runpy
+
+from conftest import ROOT
+
+
+def load_conf(monkeypatch, **env):
+    """用给定的环境变量执行配置文件，返回 (配置, 执行后的环境变量)"""
+    environ = {key: str(value) for key, value in env.items()}
+    monkeypatch.setattr(os, 'environ', environ)
+    conf = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+    return conf, environ
+
+
+def test_pool_size_split_across_workers(monkeypatch):
+    conf, environ = load_conf(monkeypatch, WEB_CONCURRENCY=4, WEB_THREADS=4, DB_MAX_CONNECTIONS=20)
+    assert conf['workers'] == 4
+    assert conf['worker_class'] == 'gthread'
+    assert conf['preload_app'] is True
+    # 每个 worker 5 个连接：4 个常驻 + 1 个溢出
+    assert environ['DB_POOL_SIZE'] == '4'
+    assert environ['DB_MAX_OVERFLOW'] == '1'
+
+
+def test_small_connection_budget(monkeypatch):
+    _, environ = load_conf(monkeypatch, WEB_CONCURRENCY=8, WEB_THREADS=4, DB_MAX_CONNECTIONS=10)
+    assert environ['DB_POOL_SIZE'] == '1'
+    assert environ['DB_MAX_OVERFLOW'] == '0'
+
+
+def test_explicit_pool_settings_win(monkeypatch):
+    _, environ = load_conf(monkeypatch, WEB_CONCURRENCY=2, DB_POOL_SIZE=7, DB_MAX_OVERFLOW=3)
+    assert environ['DB_POOL_SIZE'] == '7'
+    assert environ['DB_MAX_OVERFLOW'] == '3'
+
+
+def test_single_thread_uses_sync_worker(monkeypatch):
+    conf, _ = load_conf(monkeypatch, WEB_CONCURRENCY=1, WEB_THREADS=1)
+    assert conf['worker_class'] == 'sync'
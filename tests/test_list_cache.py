@@ -0,0 +1,70 @@
+"""匿名文章列表缓存与代数失效（cache.py）"""
+from cache import ListCache
+from models import db, Post
+from conftest import register, create_post
+
+
+def rename_behind_cache(app, post_id, title):
+    """直接改数据库，不经过接口（缓存不会失效）"""
+    with app.app_context():
+        db.session.execute(db.update(Post).where(Post.id == post_id).values(title=title))
+        db.session.commit()
+
+
+def titles(response):
+    return [post['title'] for post in response.get_json()['data']['posts']]
+
+
+def test_anonymous_list_is_cached_until_a_write(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, title='原标题')
+
+    assert titles(client.get('/api/posts')) == ['原标题']
+    rename_behind_cache(app, post['id'], '改过的标题')
+
+    # 匿名请求命中缓存；带 Token 的请求不走缓存
+    assert titles(client.get('/api/posts')) == ['原标题']
+    assert titles(client.get('/api/posts', headers=headers)) == ['改过的标题']
+
+    # 任何文章写操作都让未按作者过滤的缓存失效
+    create_post(client, headers, title='新文章')
+    assert titles(client.get('/api/posts')) == ['新文章', '改过的标题']
+
+
+def test_author_filtered_list_only_invalidated_by_that_author(app, client):
+    alice_id, alice = register(client, 'alice')
+    _, bob = register(client, 'bob')
+    post = create_post(client, alice, title='A1')
+    url = f'/api/posts?author_id={alice_id}'
+
+    assert titles(client.get(url)) == ['A1']
+    rename_behind_cache(app, post['id'], 'A1-改')
+
+    create_post(client, bob, title='B1')
+    assert titles(client.get(url)) == ['A1']
+
+    create_post(client, alice, title='A2')
+    assert titles(client.get(url)) == ['A2', 'A1-改']
+
+
+def test_disabled_cache_always_queries(make_app):
+    app = make_app(LIST_CACHE_ENABLED=False)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, title='原标题')
+    client.get('/api/posts')
+    rename_behind_cache(app, post['id'], '改过的标题')
+    assert titles(client.get('/api/posts')) == ['改过的标题']
+
+
+def test_lru_capacity_and_ttl(monkeypatch):
+    cache = ListCache(ttl=30, max_entries=2)
+    for i in range(3):
+        cache.set(('k', i), i)
+    assert cache.get(('k', 0)) is None
+    assert cache.get(('k', 2)) == 2
+
+    import cache as cache_module
+    now = cache_module.time.monotonic()
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now + 31)
+    assert cache.get(('k', 2)) is None
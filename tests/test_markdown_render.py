@@ -0,0 +1,111 @@
+"""Markdown 渲染与 XSS 防护（markdown_render.py / post_html.py）"""
+from html.parser import HTMLParser
+
+import pytest
+
+from markdown_render import MarkdownRenderer, safe_url
+from models import db, PostRender
+from conftest import register, create_post
+
+ALLOWED_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'em', 'del', 'code', 'pre',
+                'blockquote', 'ul', 'ol', 'li', 'a', 'img', 'hr', 'br'}
+ALLOWED_ATTRS = {'href', 'title', 'rel', 'src', 'alt', 'class', 'start'}
+
+PAYLOADS = [
+    '<script>alert(1)</script>',
+    '<img src=x onerror=alert(1)>',
+    '<a href="javascript:alert(1)">x</a>',
+    '[x](javascript:alert(1))',
+    '[x](JaVaScRiPt:alert(1))',
+    '[x](&#106;avascript:alert(1))',
+    '[x](java\x01script:alert(1))',
+    '![x](javascript:alert(1))',
+    '![x](data:text/html;base64,PHNjcmlwdD4=)',
+    '[x](https://a.com "t" onmouseover="alert(1)")',
+    '[x](https://a.com/"onclick="alert(1))',
+    '<javascript:alert(1)>',
+    '`<script>` **<b>粗</b>**',
+    '```html\n<script>alert(1)</script>\n```',
+    '> <iframe src=https://evil></iframe>',
+    '- [x](vbscript:msgbox(1))',
+]
+
+
+class TagCollector(HTMLParser):
+    """收集输出中的所有标签和属性"""
+
+    def __init__(self):
+        super().__init__()
+        self.tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.append((tag, dict(attrs)))
+
+
+def parse(output):
+    collector = TagCollector()
+    collector.feed(output)
+    return collector.tags
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_output_only_contains_whitelisted_markup(payload):
+    for tag, attrs in parse(MarkdownRenderer().render(payload)):
+        assert tag in ALLOWED_TAGS
+        assert set(attrs) <= ALLOWED_ATTRS
+        for name in ('href', 'src'):
+            if name in attrs:
+                # 浏览器看到的地址（属性值解码一次、去掉控制字符）
+                url = ''.join(ch for ch in attrs[name] if ch > ' ').lower()
+                assert not url.startswith(('javascript:', 'vbscript:', 'data:'))
+
+
+def test_safe_url():
+    assert safe_url('https://example.com') == 'https://example.com'
+    assert safe_url('/posts/1') == '/posts/1'
+    assert safe_url('#top') == '#top'
+    assert safe_url('mailto:a@example.com') == 'mailto:a@example.com'
+    assert safe_url('javascript:alert(1)') is None
+    assert safe_url(' JAVA\tSCRIPT:alert(1)') is None
+    assert safe_url('data:image/png;base64,AAAA') is None
+
+
+def test_markdown_features():
+    html = MarkdownRenderer().render('# 标题\n\n**粗** *斜* ~~删~~ `code`\n\n- 一\n- 二\n\n[链接](https://a.com)')
+    assert '<h1>标题</h1>' in html
+    assert '<strong>粗</strong> <em>斜</em> <del>删</del> <code>code</code>' in html
+    assert '<ul>' in html and '<li>二</li>' in html
+    assert '<a href="https://a.com" rel="nofollow noopener noreferrer">链接</a>' in html
+    assert MarkdownRenderer(allow_images=False).render('![图](https://a.com/x.png)') == '<p>图</p>'
+
+
+def test_html_format_endpoint(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, content='<script>alert(1)</script>\n\n[x](javascript:alert(1))')
+
+    data = client.get(f"/api/posts/{post['id']}?format=html").get_json()['data']
+    assert data['content_format'] == 'html'
+    assert '<script>' not in data['content']
+    assert 'javascript:' not in data['content']
+    # 默认仍返回 Markdown 原文
+    raw = client.get(f"/api/posts/{post['id']}").get_json()['data']
+    assert raw['content'].startswith('<script>')
+
+
+def test_stale_html_rendered_without_saving(app, client):
+    # 渲染器配置变化后（或旧文章没有渲染结果）：读取时在内存中渲染，不写 post_renders
+    _, headers = register(client, 'alice')
+    stale = create_post(client, headers, content='**新**')
+    missing = create_post(client, headers, content='*旧*')
+    with app.app_context():
+        db.session.get(PostRender, stale['id']).renderer = 'v0-old'
+        db.session.delete(db.session.get(PostRender, missing['id']))
+        db.session.commit()
+
+    stale_html = client.get(f"/api/posts/{stale['id']}?format=html").get_json()['data']['content']
+    missing_html = client.get(f"/api/posts/{missing['id']}?format=html").get_json()['data']['content']
+    assert stale_html == '<p><strong>新</strong></p>'
+    assert missing_html == '<p><em>旧</em></p>'
+    with app.app_context():
+        assert db.session.get(PostRender, stale['id']).renderer == 'v0-old'
+        assert db.session.get(PostRender, missing['id']) is None
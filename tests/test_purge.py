@@ -0,0 +1,98 @@
+"""删除文章时分批删除评论（purge.py）"""
+from datetime import datetime, timedelta
+from purge import post_purger
+from models import db, Comment, PostPurge
+from conftest import register, create_post
+
+
+def add_comments(client, headers, post_id, n):
+    for i in range(n):
+        client.post(f'/api/posts/{post_id}/comments', json={'content': f'评论{i}'}, headers=headers)
+
+
+def comment_rows(app, post_id):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count()).where(Comment.post_id == post_id))
+
+
+def test_few_comments_deleted_in_request(make_app):
+    app = make_app(PURGE_CHUNK_SIZE=3)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    add_comments(client, headers, post['id'], 3)
+
+    response = client.delete(f"/api/posts/{post['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['data']['deleted_comments'] == 3
+    assert client.get(f"/api/posts/{post['id']}").status_code == 404
+
+
+def test_many_comments_deleted_in_background(make_app):
+    app = make_app(PURGE_CHUNK_SIZE=2)
+    client = app.test_client()
+    alice_id, alice = register(client, 'alice')
+    _, bob = register(client, 'bob')
+    post = create_post(client, alice)
+    add_comments(client, bob, post['id'], 5)
+
+    response = client.delete(f"/api/posts/{post['id']}", headers=alice)
+    assert response.status_code == 202
+    assert response.get_json()['data'] == {'post_id': post['id']}
+    post_purger.join()
+
+    assert comment_rows(app, post['id']) == 0
+    assert client.get(f"/api/posts/{post['id']}").status_code == 404
+    assert client.get('/api/posts').get_json()['data']['posts'] == []
+    stats = client.get(f'/api/users/{alice_id}').get_json()['data']['stats']
+    assert stats['post_count'] == 0
+
+    # 后台已删除，再次删除返回 404
+    assert client.delete(f"/api/posts/{post['id']}", headers=alice).status_code == 404
+
+
+def test_failed_delete_keeps_comments(make_app, monkeypatch):
+    # 评论不超过一批时和文章在同一个事务中删除：删除文章失败时评论也不会被删掉
+    app = make_app(PURGE_CHUNK_SIZE=3)
+    client = app.test_client()
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    add_comments(client, headers, post['id'], 3)
+
+    def fail(post_id):
+        raise RuntimeError('boom')
+    monkeypatch.setattr('purge.timeline.remove_post', fail)
+
+    assert client.delete(f"/api/posts/{post['id']}", headers=headers).status_code == 500
+    assert comment_rows(app, post['id']) == 3
+    assert client.get(f"/api/posts/{post['id']}").status_code == 200
+
+
+def test_duplicate_submit_is_ignored(app):
+    # 任务已经登记（并被领取）时重复删除不会再登记一个，也不会打断正在进行的删除
+    claimed_at = datetime.now()
+    with app.app_context():
+        db.session.add(PostPurge(post_id=12345, claimed_at=claimed_at))
+        db.session.commit()
+        post_purger.submit(12345)
+        jobs = db.session.execute(db.select(PostPurge.post_id, PostPurge.claimed_at)).all()
+        assert jobs == [(12345, claimed_at)]
+
+
+def test_unfinished_job_resumed(make_app):
+    # 之前的进程登记了任务后退出（或领取后租约过期）：后台线程继续删除，租约未过期的任务不动
+    app = make_app(PURGE_CHUNK_SIZE=2, PURGE_LEASE_SECONDS=60)
+    client = app.test_client()
+    _, alice = register(client, 'alice')
+    expired = create_post(client, alice)
+    claimed = create_post(client, alice)
+    add_comments(client, alice, expired['id'], 5)
+    with app.app_context():
+        db.session.add(PostPurge(post_id=expired['id'], claimed_at=datetime.now() - timedelta(minutes=5)))
+        db.session.add(PostPurge(post_id=claimed['id'], claimed_at=datetime.now()))
+        db.session.commit()
+
+    assert not post_purger.join(timeout=1)
+    assert comment_rows(app, expired['id']) == 0
+    assert client.get(f"/api/posts/{expired['id']}").status_code == 404
+    assert client.get(f"/api/posts/{claimed['id']}").status_code == 200
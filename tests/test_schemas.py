@@ -0,0 +1,43 @@
+"""写接口请求体解析（schemas.py / validators.py）"""
+import pytest
+
+from exceptions import BadRequestError
+from schemas import POST_FORM, COMMENT_CREATE, REGISTER_FORM
+from conftest import register
+
+
+def error_message(schema, data):
+    with pytest.raises(BadRequestError) as info:
+        schema.parse(data)
+    return info.value.message
+
+
+def test_parse_normalizes_fields():
+    form = POST_FORM.parse({'title': '  标题  ', 'content': ' 正文 ', 'tags': [' flask ']})
+    assert (form.title, form.content, form.tags) == ('标题', '正文', ['flask'])
+    assert POST_FORM.parse({'title': 't', 'content': 'c'}).tags is None
+    assert COMMENT_CREATE.parse({'content': '评论'}).parent_id is None
+
+
+def test_first_invalid_field_reported():
+    assert error_message(POST_FORM, {'content': 'c'}) == '文章标题不能为空'
+    assert error_message(POST_FORM, {'title': '   ', 'content': 'c'}) == '文章标题不能为空'
+    assert error_message(POST_FORM, {'title': 't' * 201, 'content': ''}) == '文章标题不能超过200个字符'
+    assert error_message(POST_FORM, {'title': 't', 'content': 'c', 'tags': 'flask'}) == '标签必须是字符串列表'
+    assert error_message(POST_FORM, {'title': 't', 'content': 'c', 'tags': ['a b']}) == \
+        '标签只能包含字母、数字、下划线、中划线和中文'
+    assert error_message(COMMENT_CREATE, {'content': 'c', 'parent_id': True}) == 'parent_id 必须是整数'
+    assert error_message(REGISTER_FORM, {'username': 'a', 'email': 'x', 'password': 'p'}) == \
+        '用户名至少需要2个字符'
+    assert error_message(REGISTER_FORM, {'username': '张三', 'email': 'bad', 'password': 'p'}) == '邮箱格式不正确'
+
+
+def test_routes_return_400(client):
+    _, headers = register(client, 'alice')
+    response = client.post('/api/posts', json={'title': 'x'}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == '文章内容不能为空'
+
+    response = client.post('/api/posts', data='[1]', content_type='application/json', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == '请求体必须是 JSON 对象'
@@ -0,0 +1,163 @@
+"""按作者分片（sharding.py）"""
+import pytest
+from sqlalchemy import event
+
+from models import db, Post, Comment, ChangeLog, PostDirectory
+from sharding import HashRing, ShardedSession, merge, shards
+from comment_events import CommentEvents
+import change_feed
+from conftest import register, create_post
+
+SHARDS = ('s1', 's2')
+
+
+@pytest.fixture
+def sharded_app(make_app, tmp_path):
+    binds = {name: f"sqlite:///{tmp_path / name}.db" for name in SHARDS}
+    return make_app(SHARD_BINDS=binds, SQLALCHEMY_BINDS=binds)
+
+
+def authors_on_both_shards(client, count=6):
+    """注册若干作者，返回 [(分片, 认证请求头)]，保证两个分片都有作者"""
+    authors = []
+    for i in range(count):
+        user_id, headers = register(client, f'author{i}')
+        authors.append((shards.for_author(user_id), headers))
+    assert {key for key, _ in authors} == set(SHARDS)
+    return authors
+
+
+def test_hash_ring_moves_about_one_nth():
+    keys = range(2000)
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b', 'c', 'd'])
+    moved = [key for key in keys if before.get(key) != after.get(key)]
+    # 只有分给新节点的 key 改变归属
+    assert all(after.get(key) == 'd' for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.4
+
+
+def test_merge():
+    assert merge([[1, 4, 7], [2, 3, 9]], start=1, stop=4) == [2, 3, 4]
+    assert merge([[9, 3], [8, 1]], reverse=True) == [9, 8, 3, 1]
+
+
+def test_list_merges_shards(sharded_app):
+    client = sharded_app.test_client()
+    authors = authors_on_both_shards(client)
+    titles = []
+    for i in range(12):
+        key, headers = authors[i % len(authors)]
+        titles.append(create_post(client, headers, title=f'P{i:02d}')['title'])
+
+    with sharded_app.app_context():
+        for key in SHARDS:
+            with shards.use(key):
+                assert db.session.scalar(db.select(db.func.count()).select_from(Post)) > 0
+
+    # 逐页读取：各分片取前 N 条归并后，顺序和未分片时一致，不重复也不遗漏
+    pages = []
+    for page in (1, 2, 3):
+        data = client.get('/api/posts', query_string={
+            'sort': 'title', 'order': 'asc', 'page': page, 'per_page': 5, 'count': 'exact'
+        }).get_json()['data']
+        pages.append([post['title'] for post in data['posts']])
+        assert data['pagination']['total'] == 12
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert sum(pages, []) == sorted(titles)
+
+    newest = [post['created_at'] for post in client.get('/api/posts?per_page=12').get_json()['data']['posts']]
+    assert newest == sorted(newest, reverse=True)
+
+
+def test_commit_shard_before_main(sharded_app):
+    client = sharded_app.test_client()
+    key, headers = authors_on_both_shards(client)[0]
+    with sharded_app.app_context():
+        engines = {shards.engine(None): 'main', **{shards.engine(name): name for name in SHARDS}}
+    commits = []
+
+    def recorder(name):
+        return lambda conn: commits.append(name)
+
+    listeners = [(engine, recorder(name)) for engine, name in engines.items()]
+    for engine, listener in listeners:
+        event.listen(engine, 'commit', listener)
+    try:
+        create_post(client, headers)
+    finally:
+        for engine, listener in listeners:
+            event.remove(engine, 'commit', listener)
+    # 创建文章同时写分片（文章）和主库（目录、变更记录），分片先提交
+    assert commits == [key, 'main']
+
+
+def test_main_commit_failure_leaves_no_dangling_log(sharded_app):
+    client = sharded_app.test_client()
+    user_id, _ = register(client, 'alice')
+
+    with sharded_app.app_context():
+        main = shards.engine(None)
+
+        def fail(conn):
+            raise RuntimeError('主库提交失败')
+
+        with shards.use(shards.for_author(user_id)):
+            post = Post(title='孤立', content='内容', author_id=user_id)
+            db.session.add(post)
+            db.session.flush()
+            post_id = post.id
+            event.listen(main, 'commit', fail)
+            try:
+                with pytest.raises(RuntimeError):
+                    db.session.commit()
+            finally:
+                event.remove(main, 'commit', fail)
+            db.session.rollback()
+
+            # 分片上的文章已经提交，主库的目录没有指向它（按ID访问不到）
+            assert db.session.get(Post, post_id) is not None
+            assert db.session.get(PostDirectory, post_id) is None
+
+
+def test_rollback_discards_shard_writes(sharded_app):
+    client = sharded_app.test_client()
+    user_id, _ = register(client, 'alice')
+
+    with sharded_app.app_context(), shards.use(shards.for_author(user_id)):
+        assert isinstance(db.session(), ShardedSession)
+        post = Post(title='回滚', content='内容', author_id=user_id)
+        db.session.add(post)
+        db.session.flush()
+        post_id = post.id
+        db.session.rollback()
+        assert db.session.get(Post, post_id) is None
+
+
+def test_unsharded_app_uses_default_session(app):
+    # 未配置 SHARD_BINDS 时不换用分片会话
+    with app.app_context():
+        assert not isinstance(db.session(), ShardedSession)
+
+
+def test_missing_rows_are_tolerated(sharded_app):
+    client = sharded_app.test_client()
+    key, headers = authors_on_both_shards(client)[0]
+    post = create_post(client, headers)
+    response = client.post(f"/api/posts/{post['id']}/comments", json={'content': '评论'}, headers=headers)
+    comment = response.get_json()['data']['comment']
+
+    with sharded_app.app_context():
+        # 分片上的数据已经不在，主库的变更记录还在（例如之后的删除只提交了分片）
+        with shards.use(key):
+            db.session.execute(db.delete(Comment).where(Comment.id == comment['id']))
+            db.session.execute(db.delete(Post).where(Post.id == post['id']))
+            db.session.commit()
+
+        data = change_feed.fetch_changes(0, 100)
+        assert [(c['type'], c['action'], c['data']) for c in data['changes']] == [
+            ('post', 'create', None), ('comment', 'create', None)
+        ]
+        rows = db.session.execute(db.select(ChangeLog).order_by(ChangeLog.id)).scalars().all()
+        # 评论推送跳过已经不存在的评论
+        assert CommentEvents._build_events(rows) == []
@@ -0,0 +1,77 @@
+"""SQLite 单机部署配置（sqlite_profile.py）"""
+import threading
+
+from sqlalchemy import event
+
+from models import db
+from sqlite_profile import write_transaction
+from conftest import register, create_post
+
+
+def test_pragmas_applied(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+            assert conn.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+            assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+
+
+def test_write_requests_begin_immediate(app, client):
+    _, headers = register(client, 'alice')
+    with app.app_context():
+        engine = db.engine
+    begins = []
+
+    def capture(conn, cursor, statement, *args):
+        if statement.startswith('BEGIN'):
+            begins.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        create_post(client, headers)
+        writes, begins[:] = list(begins), []
+        client.get('/api/posts', headers=headers)
+        reads = list(begins)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert writes and set(writes) == {'BEGIN IMMEDIATE'}
+    assert reads and set(reads) == {'BEGIN'}
+
+
+def test_concurrent_writers_do_not_fail(app):
+    clients = [app.test_client() for _ in range(4)]
+    headers = [register(client, f'user{i}')[1] for i, client in enumerate(clients)]
+    statuses = []
+
+    def write(client, auth):
+        for i in range(5):
+            response = client.post('/api/posts', json={'title': f'T{i}', 'content': '内容'}, headers=auth)
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=write, args=pair) for pair in zip(clients, headers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [201] * 20
+
+
+def test_background_write_transaction(app):
+    with app.app_context():
+        engine = db.engine
+    begins = []
+
+    def capture(conn, cursor, statement, *args):
+        if statement.startswith('BEGIN'):
+            begins.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        # 请求之外：默认普通 BEGIN，声明为写事务后使用 BEGIN IMMEDIATE
+        with engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1')
+        with write_transaction(), engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1')
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert begins == ['BEGIN', 'BEGIN IMMEDIATE']
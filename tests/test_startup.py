@@ -0,0 +1,90 @@
+"""冷启动：表结构版本检查、延迟导入与耗时统计（startup.py）"""
+import contextlib
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app, ensure_schema
+from config import Config
+from models import db, SchemaVersion
+from startup import StartupTimer
+from conftest import ROOT
+
+
+def test_timer_phases_and_summary():
+    timer = StartupTimer()
+    timer.mark('导入框架')
+    with timer.phase('初始化数据库'):
+        pass
+    assert [name for name, _ in timer.phases] == ['导入框架', '初始化数据库']
+    assert timer.summary().endswith('ms')
+    assert '总计' in timer.summary()
+
+
+def test_create_app_does_not_touch_schema(tmp_path, monkeypatch):
+    path = tmp_path / 'empty.db'
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    monkeypatch.setattr(Config, 'SQLALCHEMY_BINDS', {})
+    monkeypatch.setattr(Config, 'SHARD_BINDS', {})
+    app = create_app()
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+        db.engine.dispose()
+
+
+def test_optional_modules_are_imported_lazily():
+    code = (
+        'import sys, app; '
+        'print(",".join(m for m in ("jwt", "markdown_render", "backup") if m in sys.modules))'
+    )
+    env = dict(os.environ, DATABASE_URL='sqlite://')
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
+
+
+def test_first_request_is_timed(client):
+    timer = client.application.extensions['startup_timer']
+    timer.first_request_ms = None
+    client.get('/api/health')
+    assert timer.first_request_ms is not None
+
+
+def quiet_ensure_schema(app):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ensure_schema(app)
+
+
+def test_ensure_schema_skips_up_to_date_database(app):
+    assert quiet_ensure_schema(app) is False
+
+
+def test_ensure_schema_migrates_stale_database(app):
+    with app.app_context():
+        db.session.execute(db.update(SchemaVersion).values(fingerprint='旧版本'))
+        db.session.commit()
+    assert quiet_ensure_schema(app) is True
+    assert quiet_ensure_schema(app) is False
+
+
+def test_ensure_schema_on_empty_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'empty.db'}")
+    monkeypatch.setattr(Config, 'SQLALCHEMY_BINDS', {})
+    monkeypatch.setattr(Config, 'SHARD_BINDS', {})
+    app = create_app()
+    try:
+        app.config['SCHEMA_AUTO_MIGRATE'] = False
+        with pytest.raises(RuntimeError):
+            quiet_ensure_schema(app)
+
+        app.config['SCHEMA_AUTO_MIGRATE'] = True
+        assert quiet_ensure_schema(app) is True
+        with app.app_context():
+            assert 'posts' in inspect(db.engine).get_table_names()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
@@ -0,0 +1,47 @@
+"""文章标题自动补全（suggest.py）"""
+from suggest import normalize, title_keys
+from conftest import register, create_post
+
+
+def suggestions(client, q, **params):
+    response = client.get('/api/posts/suggest', query_string={'q': q, **params})
+    return [item['title'] for item in response.get_json()['data']['suggestions']]
+
+
+def test_keys_cover_every_word_start():
+    assert normalize('  ＦＬＡＳＫ   入门 ') == 'flask 入门'
+    assert title_keys('Python Flask-入门') == ['python flask-入门', 'flask-入门', '入门']
+
+
+def test_prefix_matches_any_word(client):
+    _, headers = register(client, 'alice')
+    create_post(client, headers, title='Python Flask 入门')
+    create_post(client, headers, title='Flask 进阶')
+    create_post(client, headers, title='深入理解 Python')
+
+    assert sorted(suggestions(client, 'fla')) == ['Flask 进阶', 'Python Flask 入门']
+    assert suggestions(client, 'PYTHON F') == ['Python Flask 入门']
+    assert suggestions(client, '深入') == ['深入理解 Python']
+    assert suggestions(client, 'py', limit=1) == ['深入理解 Python']  # 按匹配的 key 字典序
+    assert suggestions(client, '') == []
+
+
+def test_index_follows_writes(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, title='旧标题')
+    assert suggestions(client, '旧') == ['旧标题']
+
+    client.put(f"/api/posts/{post['id']}", json={'title': '新标题', 'content': '内容'}, headers=headers)
+    assert suggestions(client, '旧') == []
+    assert suggestions(client, '新') == ['新标题']
+
+    client.delete(f"/api/posts/{post['id']}", headers=headers)
+    assert suggestions(client, '新') == []
+
+
+def test_oldest_titles_evicted(make_app):
+    client = make_app(SUGGEST_MAX_TITLES=2).test_client()
+    _, headers = register(client, 'alice')
+    for i in range(3):
+        create_post(client, headers, title=f'标题{i}')
+    assert sorted(suggestions(client, '标题')) == ['标题1', '标题2']
@@ -0,0 +1,45 @@
+"""文章标签与增量计数（tags.py）"""
+from conftest import register, create_post
+
+
+def tag_cloud(client):
+    return {tag['name']: tag['post_count'] for tag in client.get('/api/tags').get_json()['data']['tags']}
+
+
+def titles(response):
+    return sorted(post['title'] for post in response.get_json()['data']['posts'])
+
+
+def test_tags_are_normalized(client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers, tags=[' Flask', 'flask', '入门'])
+    assert post['tags'] == ['flask', '入门']
+
+
+def test_counts_follow_updates_and_deletes(client):
+    _, headers = register(client, 'alice')
+    first = create_post(client, headers, title='P1', tags=['flask', 'python'])
+    create_post(client, headers, title='P2', tags=['python'])
+    assert tag_cloud(client) == {'python': 2, 'flask': 1}
+
+    url = f"/api/posts/{first['id']}"
+    client.put(url, json={'title': 'P1', 'content': '内容', 'tags': ['python', 'sql']}, headers=headers)
+    assert tag_cloud(client) == {'python': 2, 'sql': 1}
+
+    # 不传 tags 时保留原有标签
+    client.put(url, json={'title': 'P1', 'content': '改过的内容'}, headers=headers)
+    assert tag_cloud(client) == {'python': 2, 'sql': 1}
+
+    client.delete(f"/api/posts/{first['id']}", headers=headers)
+    assert tag_cloud(client) == {'python': 1}
+
+
+def test_filter_by_tags_all_and_any(client):
+    _, headers = register(client, 'alice')
+    create_post(client, headers, title='A', tags=['flask', 'python'])
+    create_post(client, headers, title='B', tags=['python'])
+    create_post(client, headers, title='C', tags=['go'])
+
+    assert titles(client.get('/api/posts?tag=flask,python')) == ['A']
+    assert titles(client.get('/api/posts?tag=flask&tag=go&tag_mode=any')) == ['A', 'C']
+    assert titles(client.get('/api/posts?tag=missing')) == []
@@ -0,0 +1,92 @@
+"""关注与首页时间线（timeline.py）"""
+import pytest
+
+import timeline
+from exceptions import ConflictError
+from models import db, User, Post
+from conftest import register, create_post
+
+
+def timeline_titles(client, headers, **params):
+    response = client.get('/api/timeline', query_string=params, headers=headers)
+    assert response.status_code == 200
+    return [post['title'] for post in response.get_json()['data']['posts']]
+
+
+def follow(client, headers, user_id):
+    return client.post(f'/api/users/{user_id}/follow', headers=headers)
+
+
+def test_push_pull_and_own_posts(make_app):
+    client = make_app(TIMELINE_FANOUT_LIMIT=1).test_client()
+    star_id, star = register(client, 'star')
+    _, fan1 = register(client, 'fan1')
+    _, fan2 = register(client, 'fan2')
+    follow(client, fan1, star_id)
+    create_post(client, star, title='推送')
+    follow(client, fan2, star_id)  # 粉丝数 2 > 1，之后改为拉模式
+    create_post(client, star, title='拉取')
+    create_post(client, fan1, title='自己的')
+
+    assert timeline_titles(client, fan1) == ['自己的', '拉取', '推送']
+    assert timeline_titles(client, fan2) == ['拉取', '推送']
+
+
+@pytest.mark.parametrize('sharded', [False, True])
+def test_posts_survive_crossing_the_limit(make_app, tmp_path, sharded):
+    binds = {name: f"sqlite:///{tmp_path / name}.db" for name in ('s1', 's2')} if sharded else {}
+    client = make_app(TIMELINE_FANOUT_LIMIT=1, SHARD_BINDS=binds, SQLALCHEMY_BINDS=binds).test_client()
+    star_id, star = register(client, 'star')
+    fan1_id, fan1 = register(client, 'fan1')
+    _, fan2 = register(client, 'fan2')
+    follow(client, fan1, star_id)
+    create_post(client, star, title='P1')  # 推送
+
+    follow(client, fan2, star_id)
+    create_post(client, star, title='P2')  # 拉取
+    assert timeline_titles(client, fan1) == ['P2', 'P1']
+
+    # 掉粉回到上限以内：之前拉取的文章仍然可见，新文章重新推送
+    client.delete(f'/api/users/{star_id}/follow', headers=fan2)
+    create_post(client, star, title='P3')
+    assert timeline_titles(client, fan1) == ['P3', 'P2', 'P1']
+
+    # 分页跨越推送和拉取的文章时不重复、不遗漏
+    first = client.get('/api/timeline?limit=2', headers=fan1).get_json()['data']
+    second = timeline_titles(client, fan1, limit=2, cursor=first['next_cursor'])
+    assert [post['title'] for post in first['posts']] + second == ['P3', 'P2', 'P1']
+
+
+def test_double_follow_returns_conflict(app, client):
+    star_id, _ = register(client, 'star')
+    fan_id, fan = register(client, 'fan')
+    assert follow(client, fan, star_id).status_code == 201
+    assert follow(client, fan, star_id).status_code == 409
+
+    # 两个请求同时通过了“是否已关注”的检查：后插入的一方由唯一约束拦下
+    with app.test_request_context():
+        star = db.session.get(User, star_id)
+        with pytest.raises(ConflictError):
+            timeline.follow(fan_id, star)
+        db.session.rollback()
+        assert db.session.get(User, star_id).follower_count == 1
+
+
+def test_backfill_marks_old_celebrity_posts(make_app):
+    app = make_app(TIMELINE_FANOUT_LIMIT=1)
+    client = app.test_client()
+    star_id, star = register(client, 'star')
+    _, fan1 = register(client, 'fan1')
+    _, fan2 = register(client, 'fan2')
+    follow(client, fan1, star_id)
+    follow(client, fan2, star_id)
+    create_post(client, star, title='旧文章')
+
+    # 模拟加列之前的数据：文章没有推送，却被默认值标记为已推送
+    with app.app_context():
+        db.session.execute(db.update(Post).values(fanned_out=True))
+        db.session.execute(db.update(User).values(timeline_pull=False))
+        db.session.commit()
+        assert timeline.backfill() == 1
+        assert timeline.backfill() == 0
+    assert timeline_titles(client, fan1) == ['旧文章']
@@ -0,0 +1,83 @@
+"""Token 版本表与跨进程撤销（token_epochs.py）"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, TokenRevocation
+from token_epochs import TokenEpochs, token_epochs
+from conftest import register
+
+
+def change_password(client, headers):
+    return client.put('/api/users/password', json={'old_password': 'secret1', 'new_password': 'secret2'},
+                      headers=headers)
+
+
+def test_password_change_revokes_old_token(client):
+    _, headers = register(client, 'alice')
+    response = change_password(client, headers)
+    assert response.status_code == 200
+
+    assert client.get('/api/users/me', headers=headers).status_code == 401
+    new_headers = {'Authorization': f"Bearer {response.get_json()['data']['token']}"}
+    assert client.get('/api/users/me', headers=new_headers).status_code == 200
+
+
+def test_revocation_visible_to_another_worker(app, client):
+    user_id, headers = register(client, 'alice')
+    # 另一个进程的版本表：只能通过轮询 token_revocations 得知撤销
+    worker = TokenEpochs(poll_interval=0)
+    with app.app_context():
+        assert worker.is_current(user_id, 0)
+
+    change_password(client, headers)
+
+    with app.app_context():
+        assert not worker.is_current(user_id, 0)
+        assert worker.is_current(user_id, 1)
+
+
+def test_late_commit_with_smaller_id_is_not_skipped(app):
+    register(app.test_client(), 'alice')
+    register(app.test_client(), 'bob')
+    worker = TokenEpochs(poll_interval=0, settle_seconds=5)
+    now = datetime.now()
+    with app.app_context():
+        alice, bob = (db.session.execute(db.select(User).filter_by(username=name)).scalar_one()
+                      for name in ('alice', 'bob'))
+        # bob 的撤销先提交并被读到，此时更小的 ID 3 还在别的事务里
+        db.session.add(TokenRevocation(id=5, user_id=bob.id, token_version=1, created_at=now))
+        db.session.commit()
+        worker.refresh()
+        assert not worker.is_current(bob.id, 0)
+
+        db.session.add(TokenRevocation(id=3, user_id=alice.id, token_version=1, created_at=now))
+        db.session.commit()
+        assert not worker.is_current(alice.id, 0)
+
+        # 超过等待时间的记录之后，轮询位置才会前进
+        db.session.execute(db.update(TokenRevocation).values(created_at=now - timedelta(seconds=10)))
+        db.session.commit()
+        worker.refresh()
+        assert worker._last_id == 5
+
+
+def test_failed_commit_does_not_revoke(app, client):
+    user_id, _ = register(client, 'alice')
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        token_epochs.bump(user, commit=False)
+        # 提交之前本进程的版本表不变，回滚后也不变
+        assert token_epochs._versions.get(user_id, 0) == 0
+        db.session.rollback()
+        assert token_epochs.is_current(user_id, 0)
+
+        user = db.session.get(User, user_id)
+        db.session.add(User(username='alice', email='dup@example.com', password='x'))
+        token_epochs.bump(user, commit=False)
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+        token_epochs.refresh(force=True)
+        assert token_epochs.is_current(user_id, 0)
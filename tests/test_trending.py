@@ -0,0 +1,85 @@
+"""热门文章排行（trending.py）"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db
+from trending import TrendingRanker, trending
+from conftest import register, create_post
+
+
+def comment(client, headers, post_id, times=1):
+    for _ in range(times):
+        client.post(f'/api/posts/{post_id}/comments', json={'content': '评论'}, headers=headers)
+
+
+def trending_titles(client):
+    response = client.get('/api/posts?sort=trending')
+    return [post['title'] for post in response.get_json()['data']['posts']]
+
+
+def test_ranked_by_comment_activity(client):
+    _, headers = register(client, 'alice')
+    quiet = create_post(client, headers, title='冷门')
+    busy = create_post(client, headers, title='热门')
+    create_post(client, headers, title='没有评论')
+    comment(client, headers, quiet['id'])
+    comment(client, headers, busy['id'], times=3)
+
+    assert trending_titles(client) == ['热门', '冷门']
+
+    client.delete(f"/api/posts/{busy['id']}", headers=headers)
+    assert trending_titles(client) == ['冷门']
+
+
+def test_older_comments_weigh_less():
+    # 只测内存排行榜：没有 init_app，不启动同步线程
+    ranker = TrendingRanker(half_life_hours=24)
+    ranker._base = ranker.current_base()
+    now = datetime.now()
+    ranker.record_comment(1, now - timedelta(hours=24))
+    ranker.record_comment(1, now - timedelta(hours=24))
+    ranker.record_comment(2, now)
+    ranker.record_comment(2, now - timedelta(hours=48))
+
+    # 两个一天前的评论 = 2 × 0.5；一个新评论 + 一个两天前的评论 = 1 + 0.25
+    assert ranker.ranked_ids() == [2, 1]
+    assert abs(ranker._scores[1] / ranker._scores[2] - 1.0 / 1.25) < 1e-9
+
+
+def test_scores_shared_across_workers(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    comment(client, headers, post['id'], times=2)
+    trending.flush()
+
+    # 另一个进程：从 post_trending 表读回排行榜
+    worker = TrendingRanker()
+    with app.app_context():
+        worker.sync()
+        assert worker.ranked_ids() == [post['id']]
+        assert abs(worker._scores[post['id']] - trending._scores[post['id']]) < 1e-9
+
+
+def test_comment_requests_only_touch_memory(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    trending_titles(client)  # 首次读取：等待后台线程加载
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        if 'post_trending' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        # 同步线程的下一个周期还早（默认 10 秒），请求中不写 post_trending
+        comment(client, headers, post['id'], times=2)
+        assert trending_titles(client) == ['标题']
+        assert trending.ranked_ids() == [post['id']]
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert statements == []
@@ -0,0 +1,82 @@
+"""浏览量 write-behind 计数（view_counter.py）"""
+from sqlalchemy import event, inspect
+from werkzeug.datastructures import MultiDict
+
+from models import db, Post
+from queries import parse_post_list_args, build_post_list_query
+from view_counter import view_counter
+from conftest import register, create_post
+
+
+def load(app, post_id):
+    with app.app_context():
+        return db.session.execute(
+            db.select(Post.view_count, Post.updated_at).where(Post.id == post_id)
+        ).one()
+
+
+def test_views_are_buffered_then_flushed(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+
+    for _ in range(3):
+        assert client.get(f"/api/posts/{post['id']}").status_code == 200
+    assert load(app, post['id']).view_count == 0
+
+    assert view_counter.flush() == 1
+    assert load(app, post['id']).view_count == 3
+    assert view_counter.flush() == 0
+
+
+def test_flush_keeps_updated_at(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    before = load(app, post['id']).updated_at
+
+    client.get(f"/api/posts/{post['id']}")
+    view_counter.flush()
+
+    after = load(app, post['id'])
+    assert after.view_count == 1
+    assert after.updated_at == before
+
+
+def test_failed_flush_keeps_increments(app, client):
+    _, headers = register(client, 'alice')
+    post = create_post(client, headers)
+    client.get(f"/api/posts/{post['id']}")
+    with app.app_context():
+        engine = db.engine
+
+    def broken(*args):
+        raise RuntimeError('数据库不可用')
+
+    event.listen(engine, 'before_cursor_execute', broken)
+    try:
+        assert view_counter.flush() == 0
+    finally:
+        event.remove(engine, 'before_cursor_execute', broken)
+
+    assert view_counter.flush() == 1
+    assert load(app, post['id']).view_count == 1
+
+
+def test_sort_by_view_count_uses_index(app, client):
+    _, headers = register(client, 'alice')
+    ids = [create_post(client, headers, title=f'T{i}')['id'] for i in range(3)]
+    for post_id, views in zip(ids, (2, 5, 1)):
+        view_counter.incr(post_id, views)
+    view_counter.flush()
+
+    response = client.get('/api/posts?sort=view_count&order=desc')
+    assert [p['view_count'] for p in response.get_json()['data']['posts']] == [5, 2, 1]
+
+    with app.app_context():
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('posts')}
+        assert 'ix_posts_view_count' in indexes
+
+        stmt = build_post_list_query(parse_post_list_args(MultiDict({'sort': 'view_count'})))
+        sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+        assert 'ix_posts_view_count' in plan
+        assert 'TEMP B-TREE' not in plan
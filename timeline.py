@@ -0,0 +1,286 @@
+"""
+关注与首页时间线模块
+
+功能：
+    1. 推模式（fan-out-on-write）：作者发文时用一条 INSERT ... SELECT
+       把文章写入所有粉丝的时间线，读时间线只是一次索引范围扫描
+    2. 拉模式（fan-out-on-read）：粉丝数超过 TIMELINE_FANOUT_LIMIT 的大 V 发文不再推送，
+       读时间线时再从 posts 表按 (author_id, fanned_out, id) 索引拉取，和推模式的结果归并
+    3. 游标分页：以文章ID为游标（ID 随发文时间递增），翻页不受新文章插入影响
+
+说明：
+    推还是拉在发文时按作者当时的粉丝数决定，并记录在文章上（posts.fanned_out），
+    读时间线只拉取没有推送过的文章（作者有这类文章时 users.timeline_pull 为真）。
+    作者的粉丝数越过上限（涨粉或掉粉）之后，之前的文章仍按发文时的方式读到，不会消失或重复。
+    自己发的文章也在读时间线时拉取，不写入自己的时间线。
+    启用分片时（见 sharding.py），时间线记录跟随文章存放在作者所在的分片上，
+    读时间线并行查询各分片后按文章ID归并。
+"""
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
+from exceptions import ConflictError
+from models import db, User, Post, Follow, TimelineEntry
+from sharding import shards
+
+
+def fanout_limit():
+    """推模式的粉丝数上限，超过即视为大 V，改为拉模式"""
+    return current_app.config.get('TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def pushes_to_followers(author_id):
+    """
+    作者现在发文是否走推模式（创建文章时调用，结果记入 Post.fanned_out）
+
+    参数:
+        author_id: 作者ID
+
+    返回:
+        bool: 粉丝数不超过上限时返回 True
+    """
+    follower_count = db.session.scalar(db.select(User.follower_count).where(User.id == author_id))
+    return (follower_count or 0) <= fanout_limit()
+
+
+def fanout_post(post):
+    """
+    发文时把文章推送到粉丝时间线（调用方负责提交事务）
+
+    post.fanned_out 为假时不推送，只给作者打上 timeline_pull 标记，粉丝读时间线时拉取。
+    启用分片时粉丝列表在主库、时间线在分片上，先查出粉丝再批量插入。
+
+    参数:
+        post: 已 flush（有 id）的 Post 对象
+    """
+    if not post.fanned_out:
+        db.session.execute(
+            db.update(User)
+            .where(User.id == post.author_id, User.timeline_pull == db.false())
+            .values(timeline_pull=True, updated_at=User.updated_at),  # 不是用户资料的修改
+            execution_options={'synchronize_session': False}
+        )
+        return
+    followers = (
+        db.select(
+            Follow.follower_id,
+            db.literal(post.id),
+            db.literal(post.author_id),
+            db.literal(post.created_at)
+        )
+        .where(Follow.followee_id == post.author_id)
+    )
+    columns = ['user_id', 'post_id', 'author_id', 'created_at']
+    if shards.enabled:
+        rows = db.session.execute(followers).all()
+        if rows:
+            db.session.execute(db.insert(TimelineEntry), [dict(zip(columns, row)) for row in rows])
+        return
+    db.session.execute(db.insert(TimelineEntry).from_select(columns, followers))
+
+
+def remove_post(post_id):
+    """删除文章时清理所有时间线中的该文章（调用方负责提交事务）"""
+    db.session.execute(db.delete(TimelineEntry).where(TimelineEntry.post_id == post_id))
+
+
+def follow(follower_id, followee):
+    """
+    关注用户，并把对方最近推送过的文章补进自己的时间线（调用方负责提交事务）
+
+    未推送的文章读时间线时实时拉取，不需要回填。
+
+    参数:
+        follower_id: 粉丝ID
+        followee:    被关注的 User 对象
+
+    异常:
+        ConflictError: 已经关注过（包括并发的重复关注）
+    """
+    try:
+        # 使用 SAVEPOINT：两个请求同时关注时，后插入的一方只回滚这一条
+        with db.session.begin_nested():
+            db.session.add(Follow(follower_id=follower_id, followee_id=followee.id))
+    except IntegrityError:
+        raise ConflictError('已经关注过该用户')
+    _adjust_follow_counts(follower_id, followee.id, 1)
+
+    backfill = current_app.config.get('TIMELINE_BACKFILL', 20)
+    recent = (
+        db.select(db.literal(follower_id), Post.id, Post.author_id, Post.created_at)
+        .where(Post.author_id == followee.id)
+        .where(Post.fanned_out == db.true())
+        .order_by(Post.id.desc())
+        .limit(backfill)
+    )
+    db.session.execute(
+        db.insert(TimelineEntry).from_select(
+            ['user_id', 'post_id', 'author_id', 'created_at'], recent
+        )
+    )
+
+
+def backfill():
+    """
+    旧数据补齐拉模式标记（init_db 时调用）
+
+    posts.fanned_out 是后加的列，已有的文章默认视为推送过；
+    粉丝数超过上限、还没有 timeline_pull 标记的作者的文章当时并没有推送，改为拉取。
+    推送过的文章被误标为拉取只会在读时间线时多读一次（按文章ID去重），不会重复或丢失。
+
+    返回:
+        int: 补标记的作者数
+    """
+    authors = db.session.execute(
+        db.select(User.id)
+        .where(User.follower_count > fanout_limit())
+        .where(User.timeline_pull == db.false())
+    ).scalars().all()
+    if not authors:
+        return 0
+
+    groups = {}
+    for author_id in authors:
+        groups.setdefault(shards.for_author(author_id) if shards.enabled else None, []).append(author_id)
+    for key, author_ids in groups.items():
+        with shards.use(key):
+            db.session.execute(
+                db.update(Post).where(Post.author_id.in_(author_ids))
+                .values(fanned_out=False, updated_at=Post.updated_at),
+                execution_options={'synchronize_session': False}
+            )
+    db.session.execute(
+        db.update(User).where(User.id.in_(authors))
+        .values(timeline_pull=True, updated_at=User.updated_at),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return len(authors)
+
+
+def unfollow(follower_id, followee_id):
+    """取消关注，并从时间线中移除对方的文章（调用方负责提交事务）"""
+    db.session.execute(
+        db.delete(Follow)
+        .where(Follow.follower_id == follower_id)
+        .where(Follow.followee_id == followee_id)
+    )
+    _adjust_follow_counts(follower_id, followee_id, -1)
+    db.session.execute(
+        db.delete(TimelineEntry)
+        .where(TimelineEntry.user_id == follower_id)
+        .where(TimelineEntry.author_id == followee_id)
+    )
+
+
+def _adjust_follow_counts(follower_id, followee_id, delta):
+    """增量维护关注数和粉丝数"""
+    db.session.execute(
+        db.update(User).where(User.id == follower_id)
+        .values(following_count=User.following_count + delta),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        db.update(User).where(User.id == followee_id)
+        .values(follower_count=User.follower_count + delta),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def _timeline_ids(user_id, pulled_authors, cursor, limit):
+    """
+    在当前数据库（分片）上取推模式和拉模式的文章ID，各最多 limit + 1 条
+
+    参数:
+        pulled_authors: 拉模式的文章过滤条件（None 表示不拉取）
+    """
+    # ---- 推模式：物化的时间线 ----
+    pushed = db.select(TimelineEntry.post_id).where(TimelineEntry.user_id == user_id)
+    if cursor:
+        pushed = pushed.where(TimelineEntry.post_id < cursor)
+    pushed = pushed.order_by(TimelineEntry.post_id.desc()).limit(limit + 1)
+    ids = set(db.session.execute(pushed).scalars())
+
+    # ---- 拉模式：关注的作者未推送的文章 + 自己的文章 ----
+    if pulled_authors is not None:
+        pulled = db.select(Post.id).where(pulled_authors)
+        if cursor:
+            pulled = pulled.where(Post.id < cursor)
+        pulled = pulled.order_by(Post.id.desc()).limit(limit + 1)
+        ids.update(db.session.execute(pulled).scalars())
+    return ids
+
+
+def _load_posts(post_ids):
+    """按ID倒序加载文章"""
+    return db.session.execute(
+        db.select(Post).where(Post.id.in_(post_ids)).options(undefer(Post.content_blob))
+        .order_by(Post.id.desc())
+    ).scalars().all()
+
+
+def read_timeline(user_id, cursor=None, limit=20):
+    """
+    读取首页时间线（推模式结果 + 未推送的文章 / 自己的文章归并）
+
+    启用分片时每个分片分别取推模式的记录和该分片上需要拉取的文章，再统一归并。
+
+    参数:
+        user_id: 当前用户ID
+        cursor:  上一页最后一篇文章的ID（不传表示第一页）
+        limit:   每页数量
+
+    返回:
+        (list, int|None): (文章列表, 下一页游标，没有更多时为 None)
+    """
+    # 关注的作者中有未推送文章的（当前或曾经的大 V）
+    pull_authors = (
+        db.select(Follow.followee_id)
+        .join(User, User.id == Follow.followee_id)
+        .where(Follow.follower_id == user_id)
+        .where(User.timeline_pull == db.true())
+    )
+    located = None
+    if not shards.enabled:
+        pulled = db.or_(
+            Post.author_id == user_id,
+            db.and_(Post.author_id.in_(pull_authors), Post.fanned_out == db.false())
+        )
+        ids = _timeline_ids(user_id, pulled, cursor, limit)
+    else:
+        # 关注关系在主库：先查出需要拉取的作者，按所在分片分组
+        pulled_by_shard = {}
+        for author_id in db.session.execute(pull_authors).scalars():
+            pulled_by_shard.setdefault(shards.for_author(author_id), []).append(author_id)
+        own_shard = shards.for_author(user_id)
+
+        def collect():
+            conditions = []
+            if shards.current == own_shard:
+                conditions.append(Post.author_id == user_id)
+            authors = pulled_by_shard.get(shards.current)
+            if authors:
+                conditions.append(db.and_(Post.author_id.in_(authors), Post.fanned_out == db.false()))
+            pulled = db.or_(*conditions) if conditions else None
+            return shards.current, _timeline_ids(user_id, pulled, cursor, limit)
+
+        located = {post_id: key for key, found in shards.fan_out(collect) for post_id in found}
+        ids = set(located)
+
+    # ---- 归并：按文章ID倒序取 limit + 1 条，多出的一条用来判断是否还有下一页 ----
+    page_ids = sorted(ids, reverse=True)[:limit + 1]
+    has_more = len(page_ids) > limit
+    page_ids = page_ids[:limit]
+
+    posts = []
+    if page_ids and located is None:
+        posts = _load_posts(page_ids)
+    elif page_ids:
+        groups = {}
+        for post_id in page_ids:
+            groups.setdefault(located[post_id], []).append(post_id)
+        results = shards.fan_out(lambda: _load_posts(groups[shards.current]), list(groups))
+        posts = sorted((post for rows in results for post in rows), key=lambda post: post.id, reverse=True)
+
+    next_cursor = page_ids[-1] if has_more else None
+    return posts, next_cursor
@@ -0,0 +1,146 @@
+"""
+Token 版本（epoch）模块
+
+功能：
+    1. 每个用户有一个 token_version，签发 Token 时写入 JWT 的 ver 字段
+    2. 用户修改密码后 token_version +1，版本号小于当前版本的旧 Token 立即失效
+    3. 每个进程在内存中维护一张 {user_id: 当前版本} 的表，校验 Token 时只查这张表（O(1)）
+    4. 多进程之间通过轮询 token_revocations 表同步：按自增 ID 只取新增的行，
+       每个轮询周期最多一次轻量查询，撤销在几秒内对所有进程生效
+
+提交顺序：
+    MySQL 等数据库的并发事务可能先分配到小 ID 却后提交。轮询位置只越过插入超过
+    TOKEN_EPOCH_SETTLE_SECONDS 秒的记录，最近的记录每次轮询都重新读一遍，
+    在这段时间内提交的撤销不会被跳过（更晚提交的会）；应用版本号是幂等的，重复读到没有影响。
+    本进程的撤销在事务提交成功后才生效，提交失败时旧 Token 仍然有效。
+
+配置项（config.py）：
+    TOKEN_EPOCH_POLL_INTERVAL  - 轮询周期（秒）
+    TOKEN_EPOCH_SETTLE_SECONDS - 等待并发事务提交的时间（秒）
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from models import db, TokenRevocation
+from flask_sqlalchemy.session import Session
+
+
+class TokenEpochs:
+    """进程内的用户 Token 版本表"""
+
+    def __init__(self, poll_interval=2, settle_seconds=None):
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self._versions = {}
+        self._last_id = 0  # 轮询位置：这之前的记录都已提交并读到
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """读取配置"""
+        self.poll_interval = app.config.get('TOKEN_EPOCH_POLL_INTERVAL', self.poll_interval)
+        self.settle_seconds = app.config.get('TOKEN_EPOCH_SETTLE_SECONDS', self.settle_seconds)
+        app.extensions['token_epochs'] = self
+
+    def settle(self):
+        """等待并发事务提交的时间（未配置时 SQLite 为 0，写事务串行；其他数据库为 2 秒）"""
+        if self.settle_seconds is None:
+            return 0 if db.engine.dialect.name == 'sqlite' else 2
+        return self.settle_seconds
+
+    def is_current(self, user_id, version):
+        """
+        判断 Token 中的版本号是否仍然有效
+
+        参数:
+            user_id: Token 中的用户ID
+            version: Token 中的版本号（旧 Token 没有该字段时按 0 处理）
+
+        返回:
+            bool: 有效返回 True
+        """
+        self.refresh()
+        return version >= self._versions.get(user_id, 0)
+
+    def bump(self, user, commit=True):
+        """
+        让某个用户的所有旧 Token 失效（调用方负责之后签发新 Token）
+
+        本进程在事务提交成功后立即生效（commit=False 时由调用方之后的提交触发），
+        其他进程在下一个轮询周期生效。
+
+        参数:
+            user:   User 对象
+            commit: 是否立即提交事务
+
+        返回:
+            int: 新的 Token 版本
+        """
+        user.token_version = (user.token_version or 0) + 1
+        db.session.add(TokenRevocation(user_id=user.id, token_version=user.token_version))
+        db.session.info.setdefault('token_epochs', []).append((user.id, user.token_version))
+        if commit:
+            db.session.commit()
+        return user.token_version
+
+    def refresh(self, force=False):
+        """
+        增量拉取 token_revocations 中的新记录
+
+        同一时间只有一个线程执行轮询，其他线程直接使用当前的版本表。
+        轮询位置只前进到已过等待时间的记录，之后的记录下次轮询再读一遍。
+        """
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_poll = now
+            # 不触发 autoflush：当前事务里还没提交的撤销不能被当成已生效
+            with db.session.no_autoflush:
+                rows = db.session.execute(
+                    db.select(TokenRevocation.id, TokenRevocation.user_id,
+                              TokenRevocation.token_version, TokenRevocation.created_at)
+                    .where(TokenRevocation.id > self._last_id)
+                    .order_by(TokenRevocation.id)
+                ).all()
+            cutoff = datetime.now() - timedelta(seconds=self.settle())
+            settled = True
+            for row_id, user_id, version, created_at in rows:
+                self._apply(user_id, version)
+                # 遇到还没到时间的记录就停止前进：比它小的 ID 可能还没提交
+                settled = settled and created_at is not None and created_at <= cutoff
+                if settled:
+                    self._last_id = row_id
+        except Exception as e:
+            # 轮询失败时继续使用已有的版本表，下个周期重试
+            db.session.rollback()
+            current_app.logger.error(f'刷新 Token 版本表失败: {str(e)}')
+        finally:
+            self._lock.release()
+
+    def _apply(self, user_id, version):
+        """只会把版本号往大了改"""
+        if version > self._versions.get(user_id, 0):
+            self._versions[user_id] = version
+
+
+# 全局单例，在 create_app 中调用 token_epochs.init_app(app)
+token_epochs = TokenEpochs()
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session):
+    """bump() 所在的事务提交成功后，本进程的版本表才生效"""
+    for user_id, version in session.info.pop('token_epochs', ()):
+        token_epochs._apply(user_id, version)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back(session, previous_transaction):
+    """事务回滚：丢弃还没生效的版本（SAVEPOINT 回滚不影响）"""
+    if previous_transaction.parent is None:
+        session.info.pop('token_epochs', None)
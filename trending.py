@@ -0,0 +1,309 @@
+"""
+热门文章排行模块（按时间衰减的评论活跃度）
+
+算法：
+    每条评论对文章热度的贡献随时间指数衰减，半衰期为 TRENDING_HALF_LIFE_HOURS：
+        热度(now) = Σ exp(-λ (now - t_i))，λ = ln2 / 半衰期
+    改写成相对固定基准时间 base 的形式：
+        热度(now) = exp(-λ (now - base)) × Σ exp(λ (t_i - base))
+    前面的系数对所有文章相同，所以排序只取决于 score = Σ exp(λ (t_i - base))。
+    新增评论只需 score += exp(λ (t - base))，删除评论 score -= exp(λ (t_c - base))，
+    时间流逝本身不会改变排名，不需要定时重算。
+
+    score 随时间指数增长，为了不溢出，base 每隔 32 个半衰期前移一次（整体乘以一个缩放系数）。
+
+存储与同步：
+    1. 每个进程在内存中累加评论事件产生的增量，并立即更新本进程的排行榜（请求中只改内存）
+    2. 后台线程每隔 TRENDING_SYNC_INTERVAL 秒把增量批量写入 post_trending 表（score = score + delta），
+       再从表中按 score 索引读回前 TRENDING_TOP_K 名，各进程的排行榜由此保持一致
+    3. 热度衰减到 TRENDING_MIN_SCORE 以下的记录会被清理，表和内存都有上限
+    4. 进程第一次读取排行榜时等待后台线程完成首次加载（最多 LOAD_TIMEOUT 秒），之后读取只访问内存
+
+读取：
+    排行榜是内存中按热度排好序的文章ID列表，分页就是列表切片（常数时间）。
+
+分片：
+    启用分片时 post_trending 跟随文章存放在各分片上，同步时逐个分片写入增量、清理，
+    再从每个分片读回前 TRENDING_TOP_K 名按 score 归并。
+"""
+import atexit
+import math
+import os
+import threading
+import time
+from sqlalchemy import bindparam
+from models import db, Post, PostTrending
+from sharding import shards, merge
+from sqlite_profile import write_transaction
+
+# 首次读取排行榜时等待后台线程加载的最长时间（秒）
+LOAD_TIMEOUT = 5
+
+
+class TrendingRanker:
+    """热门文章排行榜（进程内）"""
+
+    def __init__(self, half_life_hours=24, top_k=1000, sync_interval=10, min_score=0.01):
+        self.half_life_hours = half_life_hours
+        self.top_k = top_k
+        self.sync_interval = sync_interval
+        self.min_score = min_score
+        self.app = None
+        self._pending = {}     # {base: {post_id: delta}}
+        self._scores = {}      # 排行榜中文章的 score（相对 self._base）
+        self._ranked = []      # 按 score 降序排列的文章ID
+        self._base = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """读取配置，并注册进程退出时的最后一次同步"""
+        self.app = app
+        self.half_life_hours = app.config.get('TRENDING_HALF_LIFE_HOURS', self.half_life_hours)
+        self.top_k = app.config.get('TRENDING_TOP_K', self.top_k)
+        self.sync_interval = app.config.get('TRENDING_SYNC_INTERVAL', self.sync_interval)
+        self.min_score = app.config.get('TRENDING_MIN_SCORE', self.min_score)
+        app.extensions['trending'] = self
+        atexit.register(self.flush)
+
+    # ==================== 时间与分数换算 ====================
+
+    @property
+    def decay_rate(self):
+        """衰减系数 λ（每秒）"""
+        return math.log(2) / (self.half_life_hours * 3600)
+
+    def current_base(self, now=None):
+        """当前基准时间：每 32 个半衰期前移一次，保证 score 不超过 2^32 量级"""
+        now = time.time() if now is None else now
+        era = self.half_life_hours * 3600 * 32
+        return int(now // era * era)
+
+    def _weight(self, timestamp, base):
+        """一条评论相对基准时间的权重 exp(λ (t - base))"""
+        return math.exp(self.decay_rate * (timestamp - base))
+
+    # ==================== 评论事件 ====================
+
+    def record_comment(self, post_id, created_at=None):
+        """新增评论：文章热度增加"""
+        self._add(post_id, created_at, 1)
+
+    def remove_comment(self, post_id, created_at):
+        """删除评论：扣除该评论当初的贡献"""
+        self._add(post_id, created_at, -1)
+
+    def forget(self, post_id):
+        """删除文章：从排行榜和持久化表中移除（调用方负责提交事务）"""
+        with self._lock:
+            for deltas in self._pending.values():
+                deltas.pop(post_id, None)
+            if self._scores.pop(post_id, None) is not None:
+                self._ranked.remove(post_id)
+        db.session.execute(db.delete(PostTrending).where(PostTrending.post_id == post_id))
+
+    def _add(self, post_id, created_at, sign):
+        timestamp = created_at.timestamp() if created_at else time.time()
+        base = self.current_base()
+        delta = sign * self._weight(timestamp, base)
+
+        with self._lock:
+            deltas = self._pending.setdefault(base, {})
+            deltas[post_id] = deltas.get(post_id, 0.0) + delta
+            # 本进程立即生效
+            if self._base == base:
+                self._update_local(post_id, self._scores.get(post_id, 0.0) + delta)
+
+        self._ensure_thread()
+
+    def _update_local(self, post_id, score):
+        """更新内存排行榜中一篇文章的分数（调用方持有锁）"""
+        if post_id in self._scores:
+            self._ranked.remove(post_id)
+            del self._scores[post_id]
+        if score <= 0:
+            return
+        if len(self._ranked) >= self.top_k and score <= self._scores[self._ranked[-1]]:
+            return
+        self._scores[post_id] = score
+        # 排行榜长度有上限（top_k），线性查找插入位置即可
+        index = 0
+        while index < len(self._ranked) and self._scores[self._ranked[index]] >= score:
+            index += 1
+        self._ranked.insert(index, post_id)
+        if len(self._ranked) > self.top_k:
+            del self._scores[self._ranked.pop()]
+
+    # ==================== 读取排行 ====================
+
+    def ranked_ids(self):
+        """
+        当前排行榜（按热度降序的文章ID列表，最多 top_k 个）
+
+        返回的是副本，调用方可以直接切片分页。
+        """
+        self._ensure_thread()
+        if self._base is None and self._thread is not None:
+            # 本进程还没有加载过排行榜：等待后台线程的首次加载（线程启动后立即同步一次，不需要唤醒）
+            self._loaded.wait(LOAD_TIMEOUT)
+        with self._lock:
+            return list(self._ranked)
+
+    # ==================== 持久化与多进程同步 ====================
+
+    def _ensure_thread(self):
+        """按需启动后台同步线程（fork 出的子进程会重新启动自己的线程）"""
+        pid = os.getpid()
+        if self.app is None or (self._thread is not None and self._pid == pid):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # 子进程不应重复写入父进程 fork 前累积的增量
+                self._pending = {}
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='trending-sync', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """后台线程：启动时和之后每个周期同步一次"""
+        while self._thread is threading.current_thread():
+            try:
+                with self.app.app_context(), write_transaction():
+                    self.sync()
+            except Exception as e:
+                # 失败的只是本线程自己的会话（应用上下文结束时回滚），增量已放回，下个周期重试
+                self.app.logger.error(f'热门排行同步失败: {str(e)}')
+            # 首次加载失败也不再让读取方等待（返回当前内存中的排行榜）
+            self._loaded.set()
+            self._wakeup.wait(self.sync_interval)
+            self._wakeup.clear()
+
+    def sync(self):
+        """写入增量并重新加载排行榜（需要应用上下文，同一时间只有一个线程执行）"""
+        with self._sync_lock:
+            self._sync()
+
+    def flush(self):
+        """把内存中的增量写入数据库并重新加载排行榜（进程退出时调用）"""
+        if self.app is None or not any(self._pending.values()):
+            return
+        with self.app.app_context(), write_transaction():
+            self.sync()
+
+    def _sync(self):
+        """写入增量 -> 必要时前移基准时间 -> 清理过期记录 -> 读回前 top_k 名（启用分片时逐个分片执行）"""
+        base = self.current_base()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        totals = self._totals(pending, base)
+        groups = {None: totals}  # 分组失败时整体放回
+        try:
+            groups = self._group_by_shard(totals)
+            # 热度 = score × exp(-λ (now - base))，低于 min_score 的记录删除
+            threshold = self.min_score * self._weight(time.time(), base)
+            for key in shards.targets:
+                with shards.use(key):
+                    self._rebase(base)
+                    self._write(groups.get(key), base)
+                    db.session.execute(db.delete(PostTrending).where(PostTrending.score < threshold))
+                    db.session.commit()
+                groups.pop(key, None)
+        except Exception:
+            # 写入失败：把还没提交的增量放回去（已换算到当前基准时间），下次重试
+            with self._lock:
+                merged = self._pending.setdefault(base, {})
+                for totals in groups.values():
+                    for post_id, delta in totals.items():
+                        merged[post_id] = merged.get(post_id, 0.0) + delta
+            raise
+
+        results = []
+        for key in shards.targets:
+            with shards.use(key):
+                results.append(db.session.execute(
+                    db.select(PostTrending.post_id, PostTrending.score)
+                    .order_by(PostTrending.score.desc())
+                    .limit(self.top_k)
+                ).all())
+        rows = merge(results, key=lambda row: row[1], reverse=True, stop=self.top_k)
+
+        with self._lock:
+            self._base = base
+            self._scores = {post_id: score for post_id, score in rows}
+            self._ranked = [post_id for post_id, _ in rows]
+            # 同步期间新产生的增量也叠加上，避免本进程的事件“闪退”
+            for post_id, delta in self._pending.get(base, {}).items():
+                self._update_local(post_id, self._scores.get(post_id, 0.0) + delta)
+
+    def _rebase(self, base):
+        """把旧基准时间的记录换算到新基准（各进程重复执行也只会生效一次）"""
+        old_bases = db.session.execute(
+            db.select(PostTrending.base).where(PostTrending.base < base).distinct()
+        ).scalars().all()
+        for old_base in old_bases:
+            db.session.execute(
+                db.update(PostTrending)
+                .where(PostTrending.base == old_base)
+                .values(score=PostTrending.score * self._weight(old_base, base), base=base)
+            )
+
+    def _totals(self, pending, base):
+        """把各基准时间下的增量换算到当前基准并按文章合并：{post_id: delta}"""
+        totals = {}
+        for old_base, deltas in pending.items():
+            factor = self._weight(old_base, base)
+            for post_id, delta in deltas.items():
+                totals[post_id] = totals.get(post_id, 0.0) + delta * factor
+        return totals
+
+    @staticmethod
+    def _group_by_shard(totals):
+        """按文章所在的分片分组：{分片: {post_id: delta}}（未启用分片时只有主库一组）"""
+        if not shards.enabled or not totals:
+            return {None: totals} if totals else {}
+        groups = {}
+        for post_id, key in shards.post_shards(list(totals)).items():
+            groups.setdefault(key, {})[post_id] = totals[post_id]
+        return groups
+
+    def _write(self, totals, base):
+        """批量写入增量：已有记录 score = score + delta，新记录直接插入"""
+        if not totals:
+            return
+
+        existing = set(db.session.execute(
+            db.select(PostTrending.post_id).where(PostTrending.post_id.in_(list(totals)))
+        ).scalars())
+        # 同步周期内被删除的文章不再插入
+        live = set(db.session.execute(
+            db.select(Post.id).where(Post.id.in_(list(totals)))
+        ).scalars())
+
+        updates = [{'pid': post_id, 'delta': delta} for post_id, delta in totals.items() if post_id in existing]
+        if updates:
+            table = PostTrending.__table__
+            db.session.execute(
+                db.update(table)
+                .where(table.c.post_id == bindparam('pid'))
+                .values(score=table.c.score + bindparam('delta')),
+                updates
+            )
+
+        inserts = [
+            {'post_id': post_id, 'score': delta, 'base': base}
+            for post_id, delta in totals.items()
+            if post_id not in existing and post_id in live and delta > 0
+        ]
+        if inserts:
+            db.session.execute(db.insert(PostTrending), inserts)
+
+
+# 全局单例，在 create_app 中调用 trending.init_app(app)
+trending = TrendingRanker()
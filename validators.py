@@ -1,139 +1,283 @@
 """
 输入验证工具模块
+
+字段规则（Text / TagList / Integer / Raw）在导入时编译一次：正则预编译、错误信息预先拼好，
+请求时只做一次类型检查、一次 strip 和长度/格式比较。
+schemas.py 用这些规则声明各个写接口的请求体；下面的 validate_* 函数保留原来的
+(是否合法, 错误信息) 接口，内部复用同一套规则，错误信息完全一致。
 """
 import re
+from exceptions import BadRequestError
+
+# 以下正则用 fullmatch 匹配整个字符串（不需要 ^ $）
+
+# 只允许字母、数字、下划线、中文
+USERNAME_PATTERN = re.compile(r'[\w\u4e00-\u9fff]+')
+
+# 简单但实用的邮箱正则验证
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+# 标签：字母、数字、下划线、中划线、中文
+TAG_PATTERN = re.compile(r'[\w\-\u4e00-\u9fff]+')
+
+# 请求体中没有这个字段（区别于显式传 null）
+MISSING = object()
+
+
+# ==================== 字段规则 ====================
+
+class Text:
+    """
+    必填字符串字段
+
+    校验顺序：为空 → 类型 → 去首尾空格后为空 → 最短长度 → 最长长度 → 格式
+
+    参数:
+        label:           字段名称（用于拼接错误信息）
+        min_length:      最短长度（0 表示不限）
+        max_length:      最长长度（None 表示不限）
+        pattern:         预编译的正则（None 表示不校验格式）
+        pattern_message: 格式不正确时的错误信息
+        strip:           是否去掉首尾空格（密码不去）
+        type_message:    不是字符串时的错误信息
+        fast_accept:     可选的快速判断（如 str.isalnum），返回 True 时一定符合 pattern，跳过正则
+    """
+
+    def __init__(self, label, min_length=0, max_length=None, pattern=None, pattern_message=None,
+                 strip=True, type_message=None, fast_accept=None):
+        self.label = label
+        self.check = self._compile(
+            min_length, max_length, pattern, pattern_message, strip, fast_accept,
+            empty_message=f'{label}不能为空',
+            type_message=type_message or f'{label}必须是字符串',
+            min_message=f'{label}至少需要{min_length}个字符',
+            max_message=f'{label}不能超过{max_length}个字符'
+        )
+
+    @staticmethod
+    def _compile(min_length, max_length, pattern, pattern_message, strip, fast_accept,
+                 empty_message, type_message, min_message, max_message):
+        """生成校验函数：配置都绑定在闭包里，请求时不再查找实例属性"""
+        fullmatch = pattern.fullmatch if pattern is not None else None
+        if max_length is None:
+            max_length = float('inf')
+
+        def check(value):
+            """校验并返回规范化后的值，不合法时抛出 BadRequestError"""
+            if value is MISSING or not value:
+                raise BadRequestError(empty_message)
+            if not isinstance(value, str):
+                raise BadRequestError(type_message)
+            if strip:
+                value = value.strip()
+                if not value:
+                    raise BadRequestError(empty_message)
+            length = len(value)
+            if length < min_length:
+                raise BadRequestError(min_message)
+            if length > max_length:
+                raise BadRequestError(max_message)
+            if fullmatch is not None and not (fast_accept and fast_accept(value)) and fullmatch(value) is None:
+                raise BadRequestError(pattern_message)
+            return value
+
+        return check
+
+
+class TagList:
+    """
+    可选的字符串列表字段：没传时返回 None，传了（包括 null）就必须是合法列表
+
+    参数:
+        item:         每个元素的规则
+        max_items:    最多几个元素
+        type_message: 不是列表时的错误信息
+        max_message:  元素过多时的错误信息
+    """
+
+    def __init__(self, item, max_items, type_message, max_message):
+        self.item = item
+        self.check = self._compile(item.check, max_items, type_message, max_message)
+
+    @staticmethod
+    def _compile(check_item, max_items, type_message, max_message):
+        """生成校验函数（同 Text._compile）"""
+        def check(value):
+            """校验并返回去掉首尾空格后的列表，不合法时抛出 BadRequestError"""
+            if value is MISSING:
+                return None
+            if not isinstance(value, list):
+                raise BadRequestError(type_message)
+            if len(value) > max_items:
+                raise BadRequestError(max_message)
+            return [check_item(item) for item in value]
+
+        return check
+
+
+class Integer:
+    """可选的整数字段：没传或传 null 时返回 None（布尔值不算整数）"""
+
+    def __init__(self, message):
+        self.message = message
+
+    def check(self, value):
+        """校验并返回整数，不合法时抛出 BadRequestError"""
+        if value is MISSING or value is None:
+            return None
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise BadRequestError(self.message)
+        return value
+
+
+class Raw:
+    """
+    原样取值的字段（登录凭据、修改密码时的新旧密码等，不去空格）
+
+    参数:
+        required_message: 必填时为空的错误信息（None 表示可选，为空时返回 None）
+    """
+
+    def __init__(self, required_message=None):
+        self.required_message = required_message
+
+    def check(self, value):
+        """返回原值，空值返回 None"""
+        if value is MISSING or not value:
+            if self.required_message:
+                raise BadRequestError(self.required_message)
+            return None
+        return value
+
+
+# ==================== 预编译的字段规则 ====================
 
+# 全是字母数字（str.isalnum）的字符串一定匹配 \w，大部分用户名和标签不需要走正则
+USERNAME = Text('用户名', min_length=2, max_length=50, pattern=USERNAME_PATTERN,
+                pattern_message='用户名只能包含字母、数字、下划线和中文', fast_accept=str.isalnum)
+
+EMAIL = Text('邮箱', max_length=100, pattern=EMAIL_PATTERN, pattern_message='邮箱格式不正确')
+
+PASSWORD = Text('密码', min_length=6, max_length=128, strip=False)
+
+POST_TITLE = Text('文章标题', max_length=200)
+
+POST_CONTENT = Text('文章内容')
+
+POST_TAGS = TagList(
+    Text('标签', max_length=30, pattern=TAG_PATTERN,
+         pattern_message='标签只能包含字母、数字、下划线、中划线和中文', type_message='标签不能为空',
+         fast_accept=str.isalnum),
+    max_items=10,
+    type_message='标签必须是字符串列表',
+    max_message='标签不能超过10个'
+)
+
+COMMENT_CONTENT = Text('评论内容', max_length=1000)
+
+
+def _validate(rule, value):
+    """把规则的异常转换成 (是否合法, 错误信息)"""
+    try:
+        rule.check(value)
+    except BadRequestError as e:
+        return False, e.message
+    return True, ''
+
+
+# ==================== 兼容的校验函数 ====================
 
 def validate_username(username):
     """
     验证用户名
-    
+
     规则：
     - 不能为空
     - 长度 2~50 字符
     - 只能包含字母、数字、下划线、中文
-    
+
     返回:
         (bool, str): (是否合法, 错误信息)
     """
-    if not username or not username.strip():
-        return False, '用户名不能为空'
-    
-    username = username.strip()
-    
-    if len(username) < 2:
-        return False, '用户名至少需要2个字符'
-    
-    if len(username) > 50:
-        return False, '用户名不能超过50个字符'
-    
-    # 只允许字母、数字、下划线、中文
-    if not re.match(r'^[\w\u4e00-\u9fff]+$', username):
-        return False, '用户名只能包含字母、数字、下划线和中文'
-    
-    return True, ''
+    return _validate(USERNAME, username)
 
 
 def validate_email(email):
     """
     验证邮箱格式
-    
+
     返回:
         (bool, str): (是否合法, 错误信息)
     """
-    if not email or not email.strip():
-        return False, '邮箱不能为空'
-    
-    email = email.strip()
-    
-    if len(email) > 100:
-        return False, '邮箱不能超过100个字符'
-    
-    # 简单但实用的邮箱正则验证
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(email_pattern, email):
-        return False, '邮箱格式不正确'
-    
-    return True, ''
+    return _validate(EMAIL, email)
 
 
 def validate_password(password):
     """
     验证密码强度
-    
+
     规则：
     - 不能为空
     - 长度 6~128 字符
-    
+
     返回:
         (bool, str): (是否合法, 错误信息)
     """
-    if not password:
-        return False, '密码不能为空'
-    
-    if len(password) < 6:
-        return False, '密码至少需要6个字符'
-    
-    if len(password) > 128:
-        return False, '密码不能超过128个字符'
-    
-    return True, ''
+    return _validate(PASSWORD, password)
 
 
 def validate_post_title(title):
     """
     验证文章标题
-    
+
     规则：
     - 不能为空
     - 长度 1~200 字符
-    
+
     返回:
         (bool, str): (是否合法, 错误信息)
     """
-    if not title or not title.strip():
-        return False, '文章标题不能为空'
-    
-    title = title.strip()
-    
-    if len(title) > 200:
-        return False, '文章标题不能超过200个字符'
-    
-    return True, ''
+    return _validate(POST_TITLE, title)
 
 
 def validate_post_content(content):
     """
     验证文章内容
-    
+
     规则：
     - 不能为空
     - 长度至少1个字符
-    
+
     返回:
         (bool, str): (是否合法, 错误信息)
     """
-    if not content or not content.strip():
-        return False, '文章内容不能为空'
-    
-    return True, ''
+    return _validate(POST_CONTENT, content)
+
+
+def validate_post_tags(tags):
+    """
+    验证文章标签
+
+    规则：
+    - 必须是字符串列表
+    - 最多 10 个标签
+    - 每个标签 1~30 字符，只能包含字母、数字、下划线、中划线、中文
+
+    返回:
+        (bool, str): (是否合法, 错误信息)
+    """
+    return _validate(POST_TAGS, tags)
 
 
 def validate_comment_content(content):
     """
     验证评论内容
-    
+
     规则：
     - 不能为空
     - 长度 1~1000 字符
-    
+
     返回:
         (bool, str): (是否合法, 错误信息)
     """
-    if not content or not content.strip():
-        return False, '评论内容不能为空'
-    
-    if len(content.strip()) > 1000:
-        return False, '评论内容不能超过1000个字符'
-    
-    return True, ''
+    return _validate(COMMENT_CONTENT, content)
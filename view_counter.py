@@ -0,0 +1,128 @@
+"""
+文章浏览量计数模块（write-behind 批量写回）
+
+功能：
+    1. 每次浏览只在内存里累加（不写数据库），避免热点文章变成热点行写入
+    2. 后台线程定时把累加值批量 UPDATE 回数据库：
+       UPDATE posts SET view_count = view_count + :n WHERE id = :id（updated_at 保持不变）
+    3. 进程退出时再刷一次，崩溃最多丢失一个刷新周期内的浏览量
+    4. 写回失败时把增量放回内存，下个周期重试
+
+说明：
+    计数是每个进程各自累加的，多进程部署时各进程分别刷回，数据库里的值就是总和。
+    启用分片时按文章所在的分片分组，每个分片一次 executemany。
+
+配置项（config.py）：
+    VIEW_FLUSH_INTERVAL  - 刷新周期（秒），也就是崩溃时最多丢失的时间窗口
+    VIEW_FLUSH_THRESHOLD - 内存中待写回的文章数超过该值时提前刷新
+"""
+import atexit
+import os
+import threading
+from sqlalchemy import bindparam, update
+from models import Post
+from sharding import shards
+
+
+class ViewCounter:
+    """进程内浏览量累加器"""
+
+    def __init__(self, flush_interval=5, flush_threshold=1000):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.app = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """读取配置，并注册进程退出时的最后一次刷新"""
+        self.app = app
+        self.flush_interval = app.config.get('VIEW_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_threshold = app.config.get('VIEW_FLUSH_THRESHOLD', self.flush_threshold)
+        app.extensions['view_counter'] = self
+        atexit.register(self.flush)
+
+    def incr(self, post_id, n=1):
+        """记录一次浏览（只写内存）"""
+        self._ensure_thread()
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + n
+            too_many = len(self._pending) >= self.flush_threshold
+        if too_many:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        把内存中的增量批量写回数据库
+
+        返回:
+            int: 本次写回的文章数
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch or self.app is None:
+            return 0
+
+        posts = Post.__table__
+        stmt = (
+            update(posts)
+            .where(posts.c.id == bindparam('pid'))
+            # 显式保持 updated_at 不变（否则会触发 onupdate），浏览不算修改文章
+            .values(view_count=posts.c.view_count + bindparam('n'), updated_at=posts.c.updated_at)
+        )
+        remaining = {None: batch}  # 还没写回的增量 {分片: {post_id: n}}
+        written = 0
+
+        try:
+            with self.app.app_context():
+                if shards.enabled:
+                    groups = {}
+                    for post_id, key in shards.post_shards(list(batch)).items():
+                        groups.setdefault(key, {})[post_id] = batch[post_id]
+                    remaining = groups
+                # 使用独立连接执行 executemany，不影响请求中的 session
+                for key in list(remaining):
+                    rows = [{'pid': post_id, 'n': n} for post_id, n in remaining[key].items()]
+                    with shards.engine(key).begin() as conn:
+                        conn.execute(stmt, rows)
+                    written += len(rows)
+                    del remaining[key]
+        except Exception as e:
+            # 写回失败：把没写成功的增量合并回去，下个周期重试
+            with self._lock:
+                for counts in remaining.values():
+                    for post_id, n in counts.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + n
+            self.app.logger.error(f'浏览量写回失败: {str(e)}')
+            return written
+
+        return written
+
+    def _ensure_thread(self):
+        """按需启动后台刷新线程（fork 出的子进程会重新启动自己的线程）"""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # 子进程不应重复写回父进程 fork 前累积的增量
+                self._pending = {}
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """后台线程：每个周期（或累积过多时）刷新一次"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+# 全局单例，在 create_app 中调用 view_counter.init_app(app)
+view_counter = ViewCounter()
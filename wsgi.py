@@ -0,0 +1,15 @@
+"""
+生产环境 WSGI 入口
+
+启动方式：
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+说明：
+    gunicorn 开启 preload_app 时，主进程导入本模块创建一次应用，
+    worker 进程 fork 后直接复用，不需要每个进程重复初始化。
+    表结构检查（ensure_schema）也只在主进程执行一次。
+"""
+from app import create_app, ensure_schema
+
+app = create_app()
+ensure_schema(app)